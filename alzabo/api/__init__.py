@@ -2,13 +2,15 @@
 Alzabo API
 """
 
+import concurrent.futures
+
 import aiohttp_cors
 import redis
 from aiohttp import web
 from aiohttp_apispec import setup_aiohttp_apispec
 
 from ..config import config
-from ..core import s3
+from ..core import cache, s3
 from ..core.ast import load_model
 from ..worker import create_app as create_celery_app
 from .audio import create_audio_app
@@ -22,9 +24,13 @@ def create_app() -> web.Application:
         app["celery"] = create_celery_app()
         app["s3"] = await s3.create_async_s3_client().__aenter__()
         app["redis"] = redis.from_url(str(config.redis.url))
+        app["query_cache"] = cache.QueryCache(config.api.query_cache_size)
+        # Shared by every request's blocking queries and analyses
+        app["executor"] = concurrent.futures.ThreadPoolExecutor()
 
     async def on_shutdown(app: web.Application) -> None:
         await app["s3"].__aexit__(None, None, None)
+        app["executor"].shutdown()
 
     app = web.Application()
     # routes
@@ -4,24 +4,70 @@ AST query routes
 
 import asyncio
 import base64
-import concurrent.futures
+import json
 from functools import partial
-from pathlib import Path
-from tempfile import TemporaryDirectory
+from typing import Any, Sequence, cast
 
-import aiofiles
 import ujson
 from aiohttp import web
 from aiohttp_apispec import json_schema, response_schema
 from marshmallow import Schema, fields, validate
-from typing_extensions import TypedDict
+from typing_extensions import NotRequired, TypedDict
 
 from ..config import config
-from ..core import ast, milvus, utils
+from ..core import ast, audio, cache, milvus, utils
 
 routes = web.RouteTableDef()
 
 
+async def query_many(
+    request: web.Request,
+    *,
+    lengths: Sequence[Sequence[int] | None],
+    limit: int,
+    partitions: Sequence[Sequence[str] | None],
+    search_params: dict[str, Any] | None,
+    vectors: Sequence[Sequence[float]],
+) -> tuple[list[list[milvus.Entry]], dict[str, float]]:
+    """
+    Query Milvus for many vectors, via the query result cache when enabled.
+
+    Returns the entries of each vector, and timing including cache hits and
+    misses.
+    """
+
+    def query(indices: list[int]) -> list[list[milvus.Entry]]:
+        return ast.query_ast_collection_many(
+            [vectors[i] for i in indices],
+            lengths=[lengths[i] for i in indices],
+            limit=limit,
+            partition_names=[partitions[i] for i in indices],
+            search_params=search_params,
+        )
+
+    search_params_ = json.dumps(search_params or {}, sort_keys=True)
+    return await cache.query_many(
+        executor=request.config_dict["executor"],
+        keys=[
+            (
+                "ast",
+                cache.quantize_vector(vector, config.api.query_cache_quantum),
+                limit,
+                tuple(lengths_ or ()),
+                tuple(partitions_ or ()),
+                search_params_,
+            )
+            for vector, lengths_, partitions_ in zip(vectors, lengths, partitions)
+        ],
+        logger=request.app.logger,
+        query=query,
+        query_cache=(
+            request.config_dict["query_cache"] if config.api.query_cache_size else None
+        ),
+        redis=request.config_dict["redis"],
+    )
+
+
 class QueryAstItemSchema(Schema):
     count = fields.Integer()
     digest = fields.String()
@@ -30,8 +76,12 @@ class QueryAstItemSchema(Schema):
 
 
 class QueryAstRequestSchema(Schema):
+    lengths = fields.List(fields.Integer, allow_none=True)
     limit = fields.Integer(load_default=10)
     partitions = fields.List(fields.String, allow_none=True)
+    search_params = fields.Dict(
+        keys=fields.String(), values=fields.Raw(), allow_none=True
+    )
     vector = fields.List(
         fields.Float(),
         required=True,
@@ -56,29 +106,84 @@ async def query_ast(request: web.Request) -> web.Response:
     if not config.ast.enabled:
         return web.json_response({"message": "AST not enabled"}, status=400)
     data = QueryAstRequestSchema().load(await request.json(loads=ujson.loads))
-    with utils.timer(request.app.logger, "Milvus time: {time}") as get_time:
-        with concurrent.futures.ThreadPoolExecutor() as pool:
-            entries = await asyncio.get_running_loop().run_in_executor(
-                pool,
-                partial(
-                    ast.query_ast_collection,
-                    limit=data["limit"],
-                    partition_names=data.get("partitions") or None,
-                    vector=data["vector"],
-                ),
-            )
-    milvus_time = get_time()
-    response_body: QueryAstResponseType = {
-        "entries": list(entries),
-        "timing": {"milvus": milvus_time},
-    }
+    entries, timing = await query_many(
+        request,
+        lengths=[data.get("lengths") or None],
+        limit=data["limit"],
+        partitions=[data.get("partitions") or None],
+        search_params=data.get("search_params"),
+        vectors=[data["vector"]],
+    )
+    response_body: QueryAstResponseType = {"entries": entries[0], "timing": timing}
+    return web.json_response(response_body)
+
+
+class QueryAstBatchItemSchema(Schema):
+    lengths = fields.List(fields.Integer, allow_none=True)
+    partitions = fields.List(fields.String, allow_none=True)
+    vector = fields.List(
+        fields.Float(),
+        required=True,
+        validate=[validate.Length(equal=ast.get_vector_size())],
+    )
+
+
+class QueryAstBatchRequestSchema(Schema):
+    limit = fields.Integer(load_default=10)
+    queries = fields.List(
+        fields.Nested(QueryAstBatchItemSchema),
+        required=True,
+        validate=[validate.Length(min=1, max=config.api.query_batch_size)],
+    )
+    search_params = fields.Dict(
+        keys=fields.String(), values=fields.Raw(), allow_none=True
+    )
+
+
+class QueryAstBatchResponseSchema(Schema):
+    entries = fields.List(fields.List(fields.Nested(QueryAstItemSchema)))
+    timing = fields.Dict(keys=fields.Str(), values=fields.Float())
+
+
+class QueryAstBatchItemType(TypedDict):
+    lengths: NotRequired[list[int] | None]
+    partitions: NotRequired[list[str] | None]
+    vector: list[float]
+
+
+class QueryAstBatchResponseType(TypedDict):
+    entries: list[list[milvus.Entry]]
+    timing: dict[str, float]
+
+
+@routes.post("/ast/batch")
+@json_schema(QueryAstBatchRequestSchema)
+@response_schema(QueryAstBatchResponseSchema, 200)
+async def query_ast_batch(request: web.Request) -> web.Response:
+    if not config.ast.enabled:
+        return web.json_response({"message": "AST not enabled"}, status=400)
+    data = QueryAstBatchRequestSchema().load(await request.json(loads=ujson.loads))
+    queries = data["queries"]
+    entries, timing = await query_many(
+        request,
+        lengths=[query.get("lengths") or None for query in queries],
+        limit=data["limit"],
+        partitions=[query.get("partitions") or None for query in queries],
+        search_params=data.get("search_params"),
+        vectors=[query["vector"] for query in queries],
+    )
+    response_body: QueryAstBatchResponseType = {"entries": entries, "timing": timing}
     return web.json_response(response_body)
 
 
 class QueryAstUploadRequestSchema(Schema):
     file = fields.String(required=True)
+    lengths = fields.List(fields.Integer, allow_none=True)
     limit = fields.Integer(load_default=10)
     partitions = fields.List(fields.String, allow_none=True)
+    search_params = fields.Dict(
+        keys=fields.String(), values=fields.Raw(), allow_none=True
+    )
 
 
 class QueryAstUploadResponseSchema(Schema):
@@ -100,30 +205,52 @@ async def query_ast_upload(request: web.Request) -> web.Response:
     if not config.ast.enabled:
         return web.json_response({"message": "AST not enabled"}, status=400)
     data = QueryAstUploadRequestSchema().load(await request.json(loads=ujson.loads))
-    with TemporaryDirectory() as temp_directory:
-        target_path = Path(temp_directory) / "target.wav"
-        async with aiofiles.open(target_path, "wb") as file_handle:
-            await file_handle.write(base64.b64decode(data.pop("file")))
-        with concurrent.futures.ThreadPoolExecutor() as pool:
-            with utils.timer(request.app.logger, "AST time: {time}") as get_time:
-                vector = await asyncio.get_running_loop().run_in_executor(
-                    pool, partial(ast.analyze, target_path, request.config_dict["ast"])
-                )
-            ast_time = get_time()
-            with utils.timer(request.app.logger, "Milvus time: {time}") as get_time:
-                entries = await asyncio.get_running_loop().run_in_executor(
-                    pool,
-                    partial(
-                        ast.query_ast_collection,
-                        limit=data["limit"],
-                        partition_names=data.get("partitions") or None,
-                        vector=vector,
-                    ),
-                )
-            milvus_time = get_time()
+    file_bytes = base64.b64decode(data.pop("file"))
+    cache_key = cache.get_cache_key("ast", file_bytes, sample_rate=16000)
+    ast_time = 0.0
+    vector: Sequence[float]
+    if cached := (
+        cache.get_cached(
+            redis=request.config_dict["redis"],
+            key=cache_key,
+            ttl=config.api.upload_cache_ttl,
+        )
+        if config.api.upload_cache_size
+        else None
+    ):
+        vector = cast(list[float], cached)
+        cache_hits = 1.0
+    else:
+        cache_hits = 0.0
+        try:
+            samples = await audio.decode_audio_async(file_bytes, sample_rate=16000)
+        except ValueError:
+            return web.json_response({"message": "Could not decode audio"}, status=400)
+        with utils.timer(request.app.logger, "AST time: {time}") as get_time:
+            vector = await asyncio.get_running_loop().run_in_executor(
+                request.config_dict["executor"],
+                partial(ast.analyze_samples, samples, request.config_dict["ast"]),
+            )
+        ast_time = get_time()
+        if config.api.upload_cache_size:
+            cache.set_cached(
+                redis=request.config_dict["redis"],
+                key=cache_key,
+                value=vector,
+                ttl=config.api.upload_cache_ttl,
+                max_size=config.api.upload_cache_size,
+            )
+    entries, timing = await query_many(
+        request,
+        lengths=[data.get("lengths") or None],
+        limit=data["limit"],
+        partitions=[data.get("partitions") or None],
+        search_params=data.get("search_params"),
+        vectors=[vector],
+    )
     response_body: QueryAstUploadResponseType = {
-        "entries": list(entries),
-        "timing": {"ast": ast_time, "milvus": milvus_time},
+        "entries": entries[0],
+        "timing": {"ast": ast_time, "cache": cache_hits, **timing},
         "vector": list(vector),
     }
     return web.json_response(response_body)
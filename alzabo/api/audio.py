@@ -30,6 +30,7 @@ routes = web.RouteTableDef()
 
 class AudioBatchRequestSchema(Schema):
     urls = fields.List(fields.Str(), required=True)
+    wait_for_flush = fields.Bool(load_default=False)
 
 
 class AudioBatchResponseSchema(Schema):
@@ -43,10 +44,13 @@ async def batch(request: web.Request) -> web.Response:
     """
     Send a collection of URLs to be batch processed
     """
+    data = AudioBatchRequestSchema().load(await request.json())
     job_ids: list[str] = []
-    for url in (await request.json())["urls"]:
+    for url in data["urls"]:
         job_id = str(uuid4())
-        tasks.get_audio_processing_chain(job_id, url)()
+        tasks.get_audio_processing_chain(
+            job_id, url, wait_for_flush=data["wait_for_flush"]
+        )()
         job_ids.append(job_id)
     return web.json_response({"jobs": job_ids})
 
@@ -143,12 +147,18 @@ class UploadRequestSchema(Schema):
     file = fields.Field(required=True, metadata={"location": "form", "type": "file"})
 
 
+class UploadQuerySchema(Schema):
+    wait_for_flush = fields.Bool(load_default=False)
+
+
 @routes.post("/upload")
 @form_schema(UploadRequestSchema)
+@querystring_schema(UploadQuerySchema)
 async def upload(request: web.Request) -> web.Response:
     """
     Upload an audio sample
     """
+    query = UploadQuerySchema().load(request.query)
     job_id = str(uuid4())
     staging_id = str(uuid4())
     async for field in await request.multipart():
@@ -161,7 +171,9 @@ async def upload(request: web.Request) -> web.Response:
             while chunk := await field.read_chunk():
                 await uploader.write_async(chunk)
     tasks.get_audio_processing_chain(
-        job_id, f"s3://{config.s3.uploads_bucket}/{staging_id}"
+        job_id,
+        f"s3://{config.s3.uploads_bucket}/{staging_id}",
+        wait_for_flush=query["wait_for_flush"],
     )()
     return web.json_response({"job": job_id})
 
@@ -4,18 +4,23 @@ Query routes
 
 from aiohttp import web
 
-from ..core import milvus
+from ..core import ast, scsynth, vector_store
 from .ast import routes as ast_routes
 from .middleware import auth_middleware
 from .scsynth import routes as scsynth_routes
 
 
 def create_query_app() -> web.Application:
-    async def connect_to_milvus(app: web.Application) -> None:
-        milvus.connect()
+    async def connect_to_vector_store(app: web.Application) -> None:
+        vector_store.get_vector_store().connect(
+            [
+                ast.get_ast_spec(),
+                *(plan.spec for plan in scsynth.get_index_plans().values()),
+            ]
+        )
 
     query_app = web.Application(middlewares=[auth_middleware])
     query_app.add_routes(ast_routes)
     query_app.add_routes(scsynth_routes)
-    query_app.on_startup.append(connect_to_milvus)
+    query_app.on_startup.append(connect_to_vector_store)
     return query_app
@@ -2,23 +2,20 @@
 scsynth query routes
 """
 
-import asyncio
 import base64
-import concurrent.futures
+import io
 import json
-from functools import partial
-from pathlib import Path
-from tempfile import TemporaryDirectory
+from typing import Any, Sequence
 
-import aiofiles
+import numpy
 import ujson
 from aiohttp import web
 from aiohttp_apispec import json_schema, response_schema
-from marshmallow import Schema, fields
-from typing_extensions import TypedDict
+from marshmallow import Schema, fields, validate
+from typing_extensions import NotRequired, TypedDict
 
 from ..config import config
-from ..core import audio, milvus, scsynth, utils
+from ..core import audio, cache, features, milvus, scsynth, utils
 
 routes = web.RouteTableDef()
 
@@ -27,18 +24,36 @@ routes = web.RouteTableDef()
 async def get_data(request: web.Request) -> web.Response:
     digest = request.match_info["digest"]
     data = []
-    for entry in (
-        await request.config_dict["s3"].list_objects(
-            Bucket=config.s3.data_bucket,
-            Prefix=utils.make_data_key(digest) + "/scsynth-entries-",
-        )
-    ).get("Contents", []):
+    scaler = scsynth.get_whitener(redis=request.config_dict["redis"])
+    keys = [
+        entry["Key"]
+        for entry in (
+            await request.config_dict["s3"].list_objects(
+                Bucket=config.s3.data_bucket,
+                Prefix=utils.make_data_key(digest) + "/scsynth-entries-",
+            )
+        ).get("Contents", [])
+    ]
+    for key in keys:
+        # Skip legacy JSON entries superseded by their NPY counterparts
+        if key.endswith(".json") and key.removesuffix(".json") + ".npy" in keys:
+            continue
         body = (
             await request.config_dict["s3"].get_object(
-                Bucket=config.s3.data_bucket, Key=entry["Key"]
+                Bucket=config.s3.data_bucket, Key=key
             )
         )["Body"]
-        for entry in json.loads((await body.read()).decode())["entries"]:
+        if key.endswith(".npy"):
+            array = numpy.load(io.BytesIO(await body.read()))
+        else:
+            array = scsynth.aggregates_to_array(
+                json.loads((await body.read()).decode())["entries"]
+            )
+        # Entries are raw, whitened features being derived from the whitener
+        entries = scsynth.array_to_aggregates(
+            scsynth.derive_whitened_entries(array, scaler)
+        )
+        for entry in entries:
             data.append(
                 {
                     "count": entry[1],
@@ -72,6 +87,62 @@ async def get_data(request: web.Request) -> web.Response:
     return web.json_response({"digest": digest, "entries": data})
 
 
+async def query_many(
+    request: web.Request,
+    *,
+    index: str | None,
+    is_voiced: Sequence[bool | None],
+    lengths: Sequence[Sequence[int] | None],
+    limit: int,
+    partitions: Sequence[Sequence[str] | None],
+    search_params: dict[str, Any] | None,
+    vectors: Sequence[Sequence[float]],
+) -> tuple[list[list[milvus.Entry]], dict[str, float]]:
+    """
+    Query Milvus for many vectors, via the query result cache when enabled.
+
+    Returns the entries of each vector, and timing including cache hits and
+    misses.
+    """
+
+    def query(indices: list[int]) -> list[list[milvus.Entry]]:
+        return scsynth.query_scsynth_collection_many(
+            [vectors[i] for i in indices],
+            index_alias=index,
+            is_voiced=[is_voiced[i] for i in indices],
+            lengths=[lengths[i] for i in indices],
+            limit=limit,
+            partition_names=[partitions[i] for i in indices],
+            search_params=search_params,
+        )
+
+    search_params_ = json.dumps(search_params or {}, sort_keys=True)
+    return await cache.query_many(
+        executor=request.config_dict["executor"],
+        keys=[
+            (
+                "scsynth",
+                index,
+                cache.quantize_vector(vector, config.api.query_cache_quantum),
+                limit,
+                is_voiced_,
+                tuple(lengths_ or ()),
+                tuple(partitions_ or ()),
+                search_params_,
+            )
+            for vector, is_voiced_, lengths_, partitions_ in zip(
+                vectors, is_voiced, lengths, partitions
+            )
+        ],
+        logger=request.app.logger,
+        query=query,
+        query_cache=(
+            request.config_dict["query_cache"] if config.api.query_cache_size else None
+        ),
+        redis=request.config_dict["redis"],
+    )
+
+
 class QueryScsynthItemSchema(Schema):
     digest = fields.String()
     start = fields.Integer()
@@ -81,8 +152,12 @@ class QueryScsynthItemSchema(Schema):
 
 class QueryScsynthRequestSchema(Schema):
     index = fields.String(allow_none=True)
+    lengths = fields.List(fields.Integer, allow_none=True)
     limit = fields.Integer(load_default=10)
     partitions = fields.List(fields.String, allow_none=True)
+    search_params = fields.Dict(
+        keys=fields.String(), values=fields.Raw(), allow_none=True
+    )
     vector = fields.List(fields.Float(), required=True)
     voiced = fields.Boolean(allow_none=True)
 
@@ -108,28 +183,92 @@ async def query_scsynth(request: web.Request) -> web.Response:
         raise web.HTTPBadRequest()
     data = QueryScsynthRequestSchema().load(await request.json(loads=ujson.loads))
     try:
-        scsynth.get_index_config(data.get("index"))
+        index_plan = scsynth.get_index_plan(data.get("index"))
     except ValueError:
         raise web.HTTPBadRequest()
-    if len(data["vector"]) != scsynth.get_vector_size(data.get("index")):
+    if len(data["vector"]) != index_plan.dimension:
         raise web.HTTPBadRequest()
-    with utils.timer(request.app.logger, "Milvus time: {time}") as get_time:
-        with concurrent.futures.ThreadPoolExecutor() as pool:
-            entries = await asyncio.get_running_loop().run_in_executor(
-                pool,
-                partial(
-                    scsynth.query_scsynth_collection,
-                    index_alias=data.get("index", None),
-                    is_voiced=data.get("voiced"),
-                    limit=data["limit"],
-                    partition_names=data.get("partitions") or None,
-                    vector=data["vector"],
-                ),
-            )
-    milvus_time = get_time()
-    response_body: QueryScsynthResponseType = {
-        "entries": list(entries),
-        "timing": {"milvus": milvus_time},
+    entries, timing = await query_many(
+        request,
+        index=data.get("index"),
+        is_voiced=[data.get("voiced")],
+        lengths=[data.get("lengths") or None],
+        limit=data["limit"],
+        partitions=[data.get("partitions") or None],
+        search_params=data.get("search_params"),
+        vectors=[data["vector"]],
+    )
+    response_body: QueryScsynthResponseType = {"entries": entries[0], "timing": timing}
+    return web.json_response(response_body)
+
+
+class QueryScsynthBatchItemSchema(Schema):
+    lengths = fields.List(fields.Integer, allow_none=True)
+    partitions = fields.List(fields.String, allow_none=True)
+    vector = fields.List(fields.Float(), required=True)
+    voiced = fields.Boolean(allow_none=True)
+
+
+class QueryScsynthBatchRequestSchema(Schema):
+    index = fields.String(allow_none=True)
+    limit = fields.Integer(load_default=10)
+    queries = fields.List(
+        fields.Nested(QueryScsynthBatchItemSchema),
+        required=True,
+        validate=[validate.Length(min=1, max=config.api.query_batch_size)],
+    )
+    search_params = fields.Dict(
+        keys=fields.String(), values=fields.Raw(), allow_none=True
+    )
+
+
+class QueryScsynthBatchResponseSchema(Schema):
+    entries = fields.List(fields.List(fields.Nested(QueryScsynthItemSchema)))
+    timing = fields.Dict(keys=fields.Str(), values=fields.Float())
+
+
+class QueryScsynthBatchItemType(TypedDict):
+    lengths: NotRequired[list[int] | None]
+    partitions: NotRequired[list[str] | None]
+    vector: list[float]
+    voiced: NotRequired[bool | None]
+
+
+class QueryScsynthBatchResponseType(TypedDict):
+    entries: list[list[milvus.Entry]]
+    timing: dict[str, float]
+
+
+@routes.post("/scsynth/batch")
+@json_schema(QueryScsynthBatchRequestSchema)
+@response_schema(QueryScsynthBatchResponseSchema, 200)
+async def query_scsynth_batch(request: web.Request) -> web.Response:
+    """
+    Query against many scsynth-derived feature vectors at once.
+    """
+    if not config.scsynth.enabled:
+        raise web.HTTPBadRequest()
+    data = QueryScsynthBatchRequestSchema().load(await request.json(loads=ujson.loads))
+    try:
+        index_plan = scsynth.get_index_plan(data.get("index"))
+    except ValueError:
+        raise web.HTTPBadRequest()
+    queries = data["queries"]
+    if any(len(query["vector"]) != index_plan.dimension for query in queries):
+        raise web.HTTPBadRequest()
+    entries, timing = await query_many(
+        request,
+        index=data.get("index"),
+        is_voiced=[query.get("voiced") for query in queries],
+        lengths=[query.get("lengths") or None for query in queries],
+        limit=data["limit"],
+        partitions=[query.get("partitions") or None for query in queries],
+        search_params=data.get("search_params"),
+        vectors=[query["vector"] for query in queries],
+    )
+    response_body: QueryScsynthBatchResponseType = {
+        "entries": entries,
+        "timing": timing,
     }
     return web.json_response(response_body)
 
@@ -137,8 +276,12 @@ async def query_scsynth(request: web.Request) -> web.Response:
 class QueryScsynthUploadRequestSchema(Schema):
     file = fields.String(required=True)
     index = fields.String(allow_none=True)
+    lengths = fields.List(fields.Integer, allow_none=True)
     limit = fields.Integer(load_default=10)
     partitions = fields.List(fields.String, allow_none=True)
+    search_params = fields.Dict(
+        keys=fields.String(), values=fields.Raw(), allow_none=True
+    )
 
 
 class QueryScsynthUploadResponseSchema(Schema):
@@ -166,45 +309,70 @@ async def query_scsynth_upload(request: web.Request) -> web.Response:
         raise web.HTTPBadRequest()
     data = QueryScsynthUploadRequestSchema().load(await request.json(loads=ujson.loads))
     try:
-        scsynth.get_index_config(data.get("index"))
+        index_plan = scsynth.get_index_plan(data.get("index"))
     except ValueError:
         raise web.HTTPBadRequest()
-    with TemporaryDirectory() as temp_directory:
-        source_path = Path(temp_directory) / "source"
-        target_path = Path(temp_directory) / "target.wav"
-        async with aiofiles.open(source_path, "wb") as file_handle:
-            await file_handle.write(base64.b64decode(data.pop("file")))
+    file_bytes = base64.b64decode(data.pop("file"))
+    cache_key = cache.get_cache_key(
+        "scsynth", file_bytes, engine=config.analysis.scsynth_engine
+    )
+    ffmpeg_time = scsynth_time = 0.0
+    if aggregate := (
+        cache.get_cached(
+            redis=request.config_dict["redis"],
+            key=cache_key,
+            ttl=config.api.upload_cache_ttl,
+        )
+        if config.api.upload_cache_size
+        else None
+    ):
+        cache_hits = 1.0
+    else:
+        cache_hits = 0.0
         with utils.timer(request.app.logger, "FFMPEG time: {time}") as get_time:
-            await audio.transcode_audio_async(source_path, target_path)
+            try:
+                samples = await audio.decode_audio_async(file_bytes)
+            except ValueError:
+                raise web.HTTPBadRequest()
         ffmpeg_time = get_time()
         with utils.timer(request.app.logger, "Scsynth time: {time}") as get_time:
-            analysis = await scsynth.analyze(target_path)
+            if config.analysis.scsynth_engine == "numpy":
+                analysis = features.analyze(samples)
+            else:
+                analysis = await scsynth.analyze_samples(samples)
             aggregate = scsynth.aggregate(analysis)
-            vector = scsynth.aggregate_to_vector(
-                aggregate, index_alias=data.get("index")
-            )
         scsynth_time = get_time()
-        with utils.timer(request.app.logger, "Milvus time: {time}") as get_time:
-            with concurrent.futures.ThreadPoolExecutor() as pool:
-                entries = await asyncio.get_running_loop().run_in_executor(
-                    pool,
-                    partial(
-                        scsynth.query_scsynth_collection,
-                        index_alias=data.get("index", None),
-                        is_voiced=aggregate["is_voiced"],
-                        limit=data["limit"],
-                        partition_names=data.get("partitions") or None,
-                        vector=vector,
-                    ),
-                )
-        milvus_time = get_time()
+        if config.api.upload_cache_size:
+            cache.set_cached(
+                redis=request.config_dict["redis"],
+                key=cache_key,
+                value=aggregate,
+                ttl=config.api.upload_cache_ttl,
+                max_size=config.api.upload_cache_size,
+            )
+    # Cached aggregates are raw, so they survive re-whitening
+    aggregate = scsynth.derive_whitened_aggregate(
+        aggregate, scsynth.get_whitener(redis=request.config_dict["redis"])
+    )
+    vector = index_plan.vector(aggregate)
+    entries, timing = await query_many(
+        request,
+        index=data.get("index"),
+        is_voiced=[aggregate["is_voiced"]],
+        lengths=[data.get("lengths") or None],
+        limit=data["limit"],
+        partitions=[data.get("partitions") or None],
+        search_params=data.get("search_params"),
+        vectors=[vector],
+    )
     response_body: QueryScsynthUploadResponseType = {
         "analysis": aggregate,
-        "entries": list(entries),
+        "entries": entries[0],
         "timing": {
+            "cache": cache_hits,
             "ffmpeg": ffmpeg_time,
             "scsynth": scsynth_time,
-            "milvus": milvus_time,
+            **timing,
         },
         "vector": list(vector),
     }
@@ -1,17 +1,22 @@
 import asyncio
 import json
 import logging
+import uuid
 from pathlib import Path
+from typing import cast
 
 import aiohttp
 import click
 from botocore.exceptions import ClientError
-from pymilvus import utility
+from celery import chain
+from marshmallow import Schema, ValidationError
 from tqdm import tqdm
 
+from .api.ast import QueryAstBatchItemSchema, QueryAstBatchItemType
+from .api.scsynth import QueryScsynthBatchItemSchema, QueryScsynthBatchItemType
 from .client import APIClient, Application
 from .config import config
-from .core import ast, milvus, s3, scsynth
+from .core import ast, s3, scsynth, vector_store
 
 
 @click.group()
@@ -42,27 +47,83 @@ def ensure_buckets() -> None:
 
 @cli.command()
 def ensure_database() -> None:
-    milvus.connect()
-    ast.get_or_create_ast_collection().load()
-    for index_config in config.analysis.scsynth_indices:
-        if not utility.has_collection(
-            scsynth.get_scsynth_collection_name(index_config["alias"])
+    store = vector_store.get_vector_store()
+    store.connect(
+        [
+            ast.get_ast_spec(),
+            *(plan.spec for plan in scsynth.get_index_plans().values()),
+        ]
+    )
+    ast.ensure_ast_collection()
+    for index_plan in scsynth.get_index_plans().values():
+        if not store.has_collection(index_plan.spec):
+            store.create_collection(index_plan.spec)
+
+
+@cli.command()
+@click.confirmation_option(
+    prompt="Recreate outdated collections, and re-insert every digest into them?"
+)
+def migrate_database() -> None:
+    """
+    Migrate collections predating the digest partition key, the hop and
+    length fields, or integer entry ids.
+
+    Outdated collections are recreated empty, and every digest's entries are
+    re-inserted from S3 by the workers.
+    """
+    from .worker import create_app
+    from .worker.tasks import flush_milvus, insert_ast_entries, insert_scsynth_entries
+
+    create_app()
+    store = vector_store.get_vector_store()
+    ast_specs = [ast.get_ast_spec()]
+    scsynth_specs = [plan.spec for plan in scsynth.get_index_plans().values()]
+    store.connect([*ast_specs, *scsynth_specs])
+    tasks = []
+    for specs, task in [
+        (ast_specs, insert_ast_entries),
+        (scsynth_specs, insert_scsynth_entries),
+    ]:
+        if not any(
+            store.has_collection(spec) and store.needs_migration(spec) for spec in specs
         ):
-            scsynth.create_scsynth_collection(index_config["alias"]).load()
+            continue
+        # Recreate every collection an insert task writes to, so none of them
+        # end up with duplicates
+        for spec in specs:
+            if store.has_collection(spec):
+                store.drop_collection(spec)
+            store.create_collection(spec)
+        tasks.append(task)
+    if not tasks:
+        print("Nothing to migrate")
+        return
+    for digest in tqdm(list(s3.list_digests(s3.create_s3_client())), desc="digests"):
+        chain(
+            *(task.si([str(uuid.uuid4()), digest]) for task in tasks), flush_milvus.si()
+        ).delay()
 
 
 ### API CLIENT
 
 
-async def _audio_batch(urls: list[str]) -> str:
+async def _audio_batch(urls: list[str], *, wait_for_flush: bool = False) -> str:
     api_client = APIClient(api_url=str(config.api.url), api_key=config.api.key)
-    return json.dumps(await api_client.audio_batch(urls=urls), indent=4, sort_keys=True)
+    return json.dumps(
+        await api_client.audio_batch(urls=urls, wait_for_flush=wait_for_flush),
+        indent=4,
+        sort_keys=True,
+    )
 
 
 @cli.command()
+@click.option(
+    "--wait-for-flush", is_flag=True, help="flush entries once each job is done"
+)
 @click.argument("urls", nargs=-1)
-def audio_batch(urls: list[str]) -> None:
-    print(asyncio.run(_audio_batch(urls=urls)))
+def audio_batch(urls: list[str], wait_for_flush: bool = False) -> None:
+    print(asyncio.run(_audio_batch(urls=urls, wait_for_flush=wait_for_flush)))
 
 
 async def _audio_fetch(digest: str, start: int, count: int, path: Path) -> None:
@@ -83,7 +144,9 @@ def audio_fetch(digest: str, start: int, count: int, path: Path) -> None:
     asyncio.run(_audio_fetch(digest=digest, start=start, count=count, path=path))
 
 
-async def _audio_upload(paths: tuple[str], *, max_concurrency: int | None) -> str:
+async def _audio_upload(
+    paths: tuple[str], *, max_concurrency: int | None, wait_for_flush: bool = False
+) -> str:
     async def upload(paths: list[Path]) -> list[str]:
         tasks = [upload_task(path) for path in paths]
         return await asyncio.gather(*tasks)
@@ -97,6 +160,7 @@ async def _audio_upload(paths: tuple[str], *, max_concurrency: int | None) -> st
                 progress_callback=lambda size, current, total: progress_bar.update(
                     size
                 ),
+                wait_for_flush=wait_for_flush,
             )
             outer_progress_bar.update(1)
             return job_id
@@ -117,9 +181,22 @@ async def _audio_upload(paths: tuple[str], *, max_concurrency: int | None) -> st
 
 @cli.command()
 @click.option("--max-concurrency", type=int, help="optional upload concurrency limit")
+@click.option(
+    "--wait-for-flush", is_flag=True, help="flush entries once each job is done"
+)
 @click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True))
-def audio_upload(paths: tuple[str], max_concurrency: int | None = None) -> None:
-    print(asyncio.run(_audio_upload(max_concurrency=max_concurrency, paths=paths)))
+def audio_upload(
+    paths: tuple[str], max_concurrency: int | None = None, wait_for_flush: bool = False
+) -> None:
+    print(
+        asyncio.run(
+            _audio_upload(
+                max_concurrency=max_concurrency,
+                paths=paths,
+                wait_for_flush=wait_for_flush,
+            )
+        )
+    )
 
 
 async def _ping() -> str:
@@ -133,28 +210,80 @@ def ping() -> None:
 
 
 async def _query_ast(
-    limit: int, partition: list[str], vector: tuple[float, ...]
+    length: list[int], limit: int, partition: list[str], vector: tuple[float, ...]
 ) -> str:
     api_client = APIClient(api_url=str(config.api.url), api_key=config.api.key)
     return json.dumps(
-        await api_client.query_ast(limit=limit, partitions=partition, vector=vector),
+        await api_client.query_ast(
+            lengths=length, limit=limit, partitions=partition, vector=vector
+        ),
         indent=4,
         sort_keys=True,
     )
 
 
 @cli.command()
+@click.option("--length", multiple=True, default=[], type=int)
 @click.option("--limit", default=10, type=int)
 @click.option("--partition", multiple=True, default=[])
 @click.argument("vector", nargs=-1, type=float)
-def query_ast(limit: int, partition: list[str], vector: tuple[float, ...]) -> None:
-    print(asyncio.run(_query_ast(limit, partition, vector)))
+def query_ast(
+    length: list[int], limit: int, partition: list[str], vector: tuple[float, ...]
+) -> None:
+    print(asyncio.run(_query_ast(length, limit, partition, vector)))
+
+
+def load_queries(path: Path, schema: Schema) -> list[dict]:
+    """
+    Load batch queries from a JSON list of query objects or of bare vectors,
+    validating each against ``schema``.
+    """
+    try:
+        return [
+            schema.load(query if isinstance(query, dict) else {"vector": query})
+            for query in json.loads(Path(path).read_text())
+        ]
+    except ValidationError as e:
+        raise click.BadParameter(str(e.messages), param_hint="path") from e
+
+
+def load_ast_queries(path: Path) -> list[QueryAstBatchItemType]:
+    return cast(
+        list[QueryAstBatchItemType], load_queries(path, QueryAstBatchItemSchema())
+    )
+
+
+def load_scsynth_queries(path: Path) -> list[QueryScsynthBatchItemType]:
+    return cast(
+        list[QueryScsynthBatchItemType],
+        load_queries(path, QueryScsynthBatchItemSchema()),
+    )
+
+
+async def _query_ast_batch(limit: int, path: Path) -> str:
+    api_client = APIClient(api_url=str(config.api.url), api_key=config.api.key)
+    return json.dumps(
+        await api_client.query_ast_batch(limit=limit, queries=load_ast_queries(path)),
+        indent=4,
+        sort_keys=True,
+    )
+
+
+@cli.command()
+@click.argument("path", type=click.Path(exists=True))
+@click.option("--limit", default=10, type=int)
+def query_ast_batch(limit: int, path: Path) -> None:
+    print(asyncio.run(_query_ast_batch(limit=limit, path=path)))
 
 
-async def _query_ast_upload(limit: int, path: Path, partition: list[str]) -> str:
+async def _query_ast_upload(
+    length: list[int], limit: int, path: Path, partition: list[str]
+) -> str:
     api_client = APIClient(api_url=str(config.api.url), api_key=config.api.key)
     return json.dumps(
-        await api_client.query_ast_upload(path=path, limit=limit, partitions=partition),
+        await api_client.query_ast_upload(
+            path=path, lengths=length, limit=limit, partitions=partition
+        ),
         indent=4,
         sort_keys=True,
     )
@@ -162,19 +291,36 @@ async def _query_ast_upload(limit: int, path: Path, partition: list[str]) -> str
 
 @cli.command()
 @click.argument("path", type=click.Path(exists=True))
+@click.option("--length", multiple=True, default=[], type=int)
 @click.option("--limit", default=10, type=int)
 @click.option("--partition", multiple=True, default=[])
-def query_ast_upload(limit: int, path: Path, partition: list[str]) -> None:
-    print(asyncio.run(_query_ast_upload(limit=limit, path=path, partition=partition)))
+def query_ast_upload(
+    length: list[int], limit: int, path: Path, partition: list[str]
+) -> None:
+    print(
+        asyncio.run(
+            _query_ast_upload(
+                length=length, limit=limit, path=path, partition=partition
+            )
+        )
+    )
 
 
 async def _query_scsynth(
-    index: str | None, limit: int, partition: list[str], vector: tuple[float, ...]
+    index: str | None,
+    length: list[int],
+    limit: int,
+    partition: list[str],
+    vector: tuple[float, ...],
 ) -> str:
     api_client = APIClient(api_url=str(config.api.url), api_key=config.api.key)
     return json.dumps(
         await api_client.query_scsynth(
-            index=index, limit=limit, partitions=partition, vector=vector
+            index=index,
+            lengths=length,
+            limit=limit,
+            partitions=partition,
+            vector=vector,
         ),
         indent=4,
         sort_keys=True,
@@ -183,26 +329,56 @@ async def _query_scsynth(
 
 @cli.command()
 @click.option("--index", default=None, type=str)
+@click.option("--length", multiple=True, default=[], type=int)
 @click.option("--limit", default=10, type=int)
 @click.option("--partition", multiple=True, default=[])
 @click.argument("vector", nargs=-1, type=float)
 def query_scsynth(
-    index: str | None, limit: int, partition: list[str], vector: tuple[float, ...]
+    index: str | None,
+    length: list[int],
+    limit: int,
+    partition: list[str],
+    vector: tuple[float, ...],
 ) -> None:
     print(
         asyncio.run(
-            _query_scsynth(index=index, limit=limit, partition=partition, vector=vector)
+            _query_scsynth(
+                index=index,
+                length=length,
+                limit=limit,
+                partition=partition,
+                vector=vector,
+            )
         )
     )
 
 
+async def _query_scsynth_batch(index: str | None, limit: int, path: Path) -> str:
+    api_client = APIClient(api_url=str(config.api.url), api_key=config.api.key)
+    return json.dumps(
+        await api_client.query_scsynth_batch(
+            index=index, limit=limit, queries=load_scsynth_queries(path)
+        ),
+        indent=4,
+        sort_keys=True,
+    )
+
+
+@cli.command()
+@click.argument("path", type=click.Path(exists=True))
+@click.option("--index", default=None, type=str)
+@click.option("--limit", default=10, type=int)
+def query_scsynth_batch(index: str | None, limit: int, path: Path) -> None:
+    print(asyncio.run(_query_scsynth_batch(index=index, limit=limit, path=path)))
+
+
 async def _query_scsynth_upload(
-    index: str | None, limit: int, path: Path, partition: list[str]
+    index: str | None, length: list[int], limit: int, path: Path, partition: list[str]
 ) -> str:
     api_client = APIClient(api_url=str(config.api.url), api_key=config.api.key)
     return json.dumps(
         await api_client.query_scsynth_upload(
-            index=index, limit=limit, partitions=partition, path=path
+            index=index, lengths=length, limit=limit, partitions=partition, path=path
         ),
         indent=4,
         sort_keys=True,
@@ -212,15 +388,16 @@ async def _query_scsynth_upload(
 @cli.command()
 @click.argument("path", type=click.Path(exists=True))
 @click.option("--index", default=None, type=str)
+@click.option("--length", multiple=True, default=[], type=int)
 @click.option("--limit", default=10, type=int)
 @click.option("--partition", multiple=True, default=[])
 def query_scsynth_upload(
-    index: str | None, limit: int, path: Path, partition: list[str]
+    index: str | None, length: list[int], limit: int, path: Path, partition: list[str]
 ) -> None:
     print(
         asyncio.run(
             _query_scsynth_upload(
-                index=index, limit=limit, path=path, partition=partition
+                index=index, length=length, limit=limit, path=path, partition=partition
             )
         )
     )
@@ -1,14 +1,24 @@
 import base64
 from io import BufferedReader
 from pathlib import Path
-from typing import Callable, Sequence
+from typing import Any, Callable, Sequence
 
 import aiofiles
 import aiohttp
 import ujson
 
-from ..api.ast import QueryAstResponseType, QueryAstUploadResponseType
-from ..api.scsynth import QueryScsynthResponseType, QueryScsynthUploadResponseType
+from ..api.ast import (
+    QueryAstBatchItemType,
+    QueryAstBatchResponseType,
+    QueryAstResponseType,
+    QueryAstUploadResponseType,
+)
+from ..api.scsynth import (
+    QueryScsynthBatchItemType,
+    QueryScsynthBatchResponseType,
+    QueryScsynthResponseType,
+    QueryScsynthUploadResponseType,
+)
 
 
 class APIClient:
@@ -32,12 +42,14 @@ class APIClient:
             return {}
         return {"Authorization": f"Bearer {self.api_key}"}
 
-    async def audio_batch(self, *, urls: Sequence[str]) -> Sequence[str]:
+    async def audio_batch(
+        self, *, urls: Sequence[str], wait_for_flush: bool = False
+    ) -> Sequence[str]:
         async with aiohttp.ClientSession(connector=self.connector) as session:
             async with session.post(
                 f"{self.api_url}/audio/batch",
                 headers=self._headers(),
-                json=dict(urls=urls),
+                json=dict(urls=urls, wait_for_flush=wait_for_flush),
             ) as response:
                 response.raise_for_status()
                 return (await response.json(loads=ujson.loads))["jobs"]
@@ -59,6 +71,7 @@ class APIClient:
         *,
         path: Path,
         progress_callback: Callable[[float, float, float], None] | None = None,
+        wait_for_flush: bool = False,
     ) -> str:
         with ProgressFileReader(path, callback=progress_callback) as file_pointer:
             form_data = aiohttp.FormData()
@@ -68,6 +81,7 @@ class APIClient:
                     f"{self.api_url}/audio/upload",
                     data=form_data,
                     headers=self._headers(),
+                    params=dict(wait_for_flush=str(wait_for_flush).lower()),
                 ) as response:
                     response.raise_for_status()
                     return (await response.json(loads=ujson.loads))["job"]
@@ -81,16 +95,20 @@ class APIClient:
     async def query_ast(
         self,
         *,
+        lengths: Sequence[int] | None = None,
         limit: int = 10,
         partitions: Sequence[str] | None = None,
+        search_params: dict[str, Any] | None = None,
         vector: Sequence[float],
     ) -> QueryAstResponseType:
         async with aiohttp.ClientSession(connector=self.connector) as session:
             async with session.post(
                 f"{self.api_url}/query/ast",
                 json=dict(
+                    lengths=list(lengths) if lengths else None,
                     limit=limit,
                     partitions=list(partitions) if partitions else None,
+                    search_params=search_params,
                     vector=list(vector),
                 ),
                 headers=self._headers(),
@@ -98,8 +116,32 @@ class APIClient:
                 response.raise_for_status()
                 return await response.json(loads=ujson.loads)
 
+    async def query_ast_batch(
+        self,
+        *,
+        limit: int = 10,
+        queries: Sequence[QueryAstBatchItemType],
+        search_params: dict[str, Any] | None = None,
+    ) -> QueryAstBatchResponseType:
+        async with aiohttp.ClientSession(connector=self.connector) as session:
+            async with session.post(
+                f"{self.api_url}/query/ast/batch",
+                json=dict(
+                    limit=limit, queries=list(queries), search_params=search_params
+                ),
+                headers=self._headers(),
+            ) as response:
+                response.raise_for_status()
+                return await response.json(loads=ujson.loads)
+
     async def query_ast_upload(
-        self, *, path: Path, limit: int = 10, partitions: Sequence[str] | None = None
+        self,
+        *,
+        path: Path,
+        lengths: Sequence[int] | None = None,
+        limit: int = 10,
+        partitions: Sequence[str] | None = None,
+        search_params: dict[str, Any] | None = None,
     ) -> QueryAstUploadResponseType:
         async with aiofiles.open(path, "rb") as file_pointer:
             file_contents = await file_pointer.read()
@@ -108,8 +150,10 @@ class APIClient:
                 f"{self.api_url}/query/ast/upload",
                 json=dict(
                     file=base64.b64encode(file_contents).decode(),
+                    lengths=list(lengths) if lengths else None,
                     limit=limit,
                     partitions=list(partitions) if partitions else None,
+                    search_params=search_params,
                 ),
                 headers=self._headers(),
             ) as response:
@@ -120,8 +164,10 @@ class APIClient:
         self,
         *,
         index: str | None = None,
+        lengths: Sequence[int] | None = None,
         limit: int = 10,
         partitions: Sequence[str] | None = None,
+        search_params: dict[str, Any] | None = None,
         vector: Sequence[float],
         voiced: bool | None = None,
     ) -> QueryScsynthResponseType:
@@ -130,8 +176,10 @@ class APIClient:
                 f"{self.api_url}/query/scsynth",
                 json=dict(
                     index=index,
+                    lengths=list(lengths) if lengths else None,
                     limit=limit,
                     partitions=list(partitions) if partitions else None,
+                    search_params=search_params,
                     vector=list(vector),
                     voiced=voiced,
                 ),
@@ -140,13 +188,37 @@ class APIClient:
                 response.raise_for_status()
                 return await response.json(loads=ujson.loads)
 
+    async def query_scsynth_batch(
+        self,
+        *,
+        index: str | None = None,
+        limit: int = 10,
+        queries: Sequence[QueryScsynthBatchItemType],
+        search_params: dict[str, Any] | None = None,
+    ) -> QueryScsynthBatchResponseType:
+        async with aiohttp.ClientSession(connector=self.connector) as session:
+            async with session.post(
+                f"{self.api_url}/query/scsynth/batch",
+                json=dict(
+                    index=index,
+                    limit=limit,
+                    queries=list(queries),
+                    search_params=search_params,
+                ),
+                headers=self._headers(),
+            ) as response:
+                response.raise_for_status()
+                return await response.json(loads=ujson.loads)
+
     async def query_scsynth_upload(
         self,
         *,
         path: Path,
         index: str | None = None,
+        lengths: Sequence[int] | None = None,
         limit: int = 10,
         partitions: Sequence[str] | None = None,
+        search_params: dict[str, Any] | None = None,
     ) -> QueryScsynthUploadResponseType:
         async with aiofiles.open(path, "rb") as file_pointer:
             file_contents = await file_pointer.read()
@@ -156,8 +228,10 @@ class APIClient:
                 json=dict(
                     file=base64.b64encode(file_contents).decode(),
                     index=index,
+                    lengths=list(lengths) if lengths else None,
                     limit=limit,
                     partitions=list(partitions) if partitions else None,
+                    search_params=search_params,
                 ),
                 headers=self._headers(),
             ) as response:
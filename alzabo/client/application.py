@@ -10,7 +10,7 @@ from supriya import AsyncClock, AsyncServer, Bus, CalculationRate
 from supriya.patterns import PatternPlayer
 
 from ..config import config
-from ..core.scsynth import aggregate_to_vector
+from ..core.scsynth import get_index_plans
 from ..core.utils import import_class
 from .analyzer import OnlineScsynthAnalyzer
 from .api_client import APIClient
@@ -171,21 +171,20 @@ class Application:
             logger.warning("... analysis not primed!")
             return None
         # ... get index alias
-        index_aliases = [
-            index_config["alias"] for index_config in config.analysis.scsynth_indices
-        ]
-        index_alias = index_aliases[
+        index_plans = list(get_index_plans().values())
+        index_plan = index_plans[
             min(
-                int(self.performance_config.get("index", 0) * len(index_aliases)),
-                len(index_aliases) - 1,
+                int(self.performance_config.get("index", 0) * len(index_plans)),
+                len(index_plans) - 1,
             )
         ]
+        index_alias = index_plan.alias
         # ... get pattern factory
         pattern_factory = self.pattern_factory.emit(
             polyphony_limit=self.polyphony_limit, **self.performance_config
         )
         # ... query milvus
-        vector = aggregate_to_vector(aggregate, index_alias=index_alias)
+        vector = index_plan.vector(aggregate)
         logger.info(f"{index_alias=} {vector=}")
         if not (
             entries := (
@@ -2,7 +2,7 @@ import json
 import logging
 import os
 from pathlib import Path
-from typing import Literal
+from typing import Any, Literal
 
 import yaml
 from pydantic import AnyHttpUrl, Field, FilePath, RedisDsn
@@ -17,16 +17,30 @@ logger = logging.getLogger(__name__)
 ENV_PREFIX = "ALZABO"
 
 
+IndexType = Literal["DISKANN", "FLAT", "HNSW", "IVF_FLAT", "IVF_PQ", "IVF_SQ8"]
+
+MetricType = Literal["COSINE", "IP", "L2"]
+
+
 class ScsynthIndexConfig(TypedDict):
     alias: str | None
     features: list[ScsynthFeatures]
     pitched: bool
+    index_params: NotRequired[dict[str, Any]]
+    index_type: NotRequired[IndexType]
+    metric_type: NotRequired[MetricType]
+    search_params: NotRequired[dict[str, Any]]
 
 
 class AnalysisConfig(BaseSettings):
     model_config = SettingsConfigDict(env_prefix=f"{ENV_PREFIX}_ANALYSIS_")
 
     ast_collection_prefix: str = "ast"
+    scsynth_analysis_compressed: bool = False
+    scsynth_chunk_seconds: float = 600.0
+    scsynth_concurrency: int = 4
+    scsynth_engine: Literal["numpy", "scsynth"] = "scsynth"
+    scsynth_insert_concurrency: int = 4
     scsynth_collection_prefix: str = "scsynth"
     scsynth_indices: list[ScsynthIndexConfig] = Field(
         default_factory=lambda: [
@@ -54,6 +68,8 @@ class AnalysisConfig(BaseSettings):
     )
     hops: tuple[int, ...] = (500,)
     lengths: tuple[int, ...] = (500, 1250, 2500)
+    whitening_drift_threshold: float | None = 0.25
+    whitening_shard_size: int = 100
 
 
 class ApplicationConfig(BaseSettings):
@@ -69,6 +85,11 @@ class ApiConfig(BaseSettings):
     auth_enabled: bool = True
     auth_secret: str = "change-me"
     key: str | None = None
+    query_batch_size: int = 256
+    query_cache_quantum: float = 1e-4
+    query_cache_size: int = 4096
+    upload_cache_size: int = 1024
+    upload_cache_ttl: int = 60 * 60
     url: AnyHttpUrl = Url("http://api:8000")
 
 
@@ -77,7 +98,11 @@ class AstConfig(BaseSettings):
 
     checkpoint_path: FilePath = Path("data/ast/audioset_model.pth")
     enabled: bool = True
+    index_params: dict[str, Any] = Field(default_factory=dict)
+    index_type: IndexType = "IVF_FLAT"
     labels_path: FilePath = Path("data/ast/audioset_labels.csv")
+    metric_type: MetricType = "L2"
+    search_params: dict[str, Any] = Field(default_factory=dict)
 
 
 class MidiMapping(TypedDict):
@@ -97,6 +122,12 @@ class MidiConfig(BaseSettings):
 class MilvusConfig(BaseSettings):
     model_config = SettingsConfigDict(env_prefix=f"{ENV_PREFIX}_MILVUS_")
 
+    bulk_insert_bucket: str | None = None
+    bulk_insert_threshold: int = 1024 * 256
+    flush_interval: float = 30.0
+    flush_rows: int = 1024 * 64
+    insert_batch_bytes: int = 1024 * 1024 * 32
+    num_partitions: int = 64
     url: AnyHttpUrl = Url("http://milvus:19530")
 
 
@@ -151,6 +182,13 @@ class ScsynthConfig(BaseSettings):
     output_device: str | None = None
 
 
+class VectorStoreConfig(BaseSettings):
+    model_config = SettingsConfigDict(env_prefix=f"{ENV_PREFIX}_VECTOR_STORE_")
+
+    backend: Literal["local", "milvus"] = "milvus"
+    path: Path = Path("data/vectors")
+
+
 class AlzaboConfig(BaseSettings):
     analysis: AnalysisConfig = Field(default_factory=AnalysisConfig)
     api: ApiConfig = Field(default_factory=ApiConfig)
@@ -163,6 +201,7 @@ class AlzaboConfig(BaseSettings):
     redis: RedisConfig = Field(default_factory=RedisConfig)
     s3: S3Config = Field(default_factory=S3Config)
     scsynth: ScsynthConfig = Field(default_factory=ScsynthConfig)
+    vector_store: VectorStoreConfig = Field(default_factory=VectorStoreConfig)
 
 
 def _init_config():
@@ -3,9 +3,10 @@ from enum import StrEnum
 # File names
 AST_ENTRIES_FILENAME = "ast-entries-{hop}-{length}.json"
 AUDIO_FILENAME = "audio.wav"
-SCSYNTH_ANALYSIS_RAW_FILENAME = "scsynth-analysis-raw.json"
-SCSYNTH_ANALYSIS_WHITENED_FILENAME = "scsynth-analysis-whitened.json"
-SCSYNTH_ENTRIES_FILENAME = "scsynth-entries-{hop}-{length}.json"
+SCSYNTH_ANALYSIS_RAW_FILENAME = "scsynth-analysis-raw.npy"
+SCSYNTH_ANALYSIS_RAW_LEGACY_FILENAME = "scsynth-analysis-raw.json"
+SCSYNTH_ENTRIES_FILENAME = "scsynth-entries-{hop}-{length}.npy"
+SCSYNTH_ENTRIES_LEGACY_FILENAME = "scsynth-entries-{hop}-{length}.json"
 
 # Scsynth
 SCSYNTH_ANALYSIS_SIZE = 62
@@ -2,20 +2,22 @@ import csv
 import logging
 import tempfile
 from pathlib import Path
-from typing import Sequence
+from typing import Any, Sequence
 
+import numpy
 import timm
 import torch
 import torch.nn as nn
 import torchaudio
-from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, utility
+from pymilvus import Collection
 from timm.models.layers import to_2tuple, trunc_normal_
 from torch.cuda.amp import autocast
 
 from ..config import config
 from .audio import get_duration, transcode_audio
-from .milvus import Entry
+from .milvus import Entry, get_collection
 from .utils import timer
+from .vector_store import CollectionSpec, get_vector_store
 
 logger = logging.getLogger(__name__)
 
@@ -169,6 +171,18 @@ def extract_features(
             to_seconds=to_seconds,
         )
         waveform, sample_rate = torchaudio.load(output_path)
+    return extract_waveform_features(
+        waveform, sample_rate, mel_bins=mel_bins, target_length=target_length
+    )
+
+
+def extract_waveform_features(
+    waveform: torch.Tensor,
+    sample_rate: int,
+    *,
+    mel_bins: int = 128,
+    target_length: int = 1024,
+) -> torch.Tensor:
     fbank = torchaudio.compliance.kaldi.fbank(
         waveform,
         htk_compat=True,
@@ -194,11 +208,34 @@ def analyze(
     from_seconds: float | None = None,
     to_seconds: float | None = None,
 ) -> tuple[float, ...]:
-    model_: torch.nn.DataParallel = model or load_model()
     with timer(logger, "Extracted features in " + "{time:.03f} seconds"):
         features = extract_features(
             audio_path, mel_bins=128, from_seconds=from_seconds, to_seconds=to_seconds
-        ).expand(1, INPUT_TDIM, 128)
+        )
+    return analyze_features(features, model)
+
+
+def analyze_samples(
+    samples: numpy.ndarray, model: torch.nn.DataParallel | None
+) -> tuple[float, ...]:
+    """
+    Analyze mono 16kHz ``samples``, as decoded by
+    :py:func:`~alzabo.core.audio.decode_audio_async`.
+    """
+    with timer(logger, "Extracted features in " + "{time:.03f} seconds"):
+        features = extract_waveform_features(
+            torch.from_numpy(numpy.asarray(samples, dtype=numpy.float32))[None, :],
+            16000,
+            mel_bins=128,
+        )
+    return analyze_features(features, model)
+
+
+def analyze_features(
+    features: torch.Tensor, model: torch.nn.DataParallel | None
+) -> tuple[float, ...]:
+    model_: torch.nn.DataParallel = model or load_model()
+    features = features.expand(1, INPUT_TDIM, 128)
     with timer(logger, "Sent to device in " + "{time:.03f} seconds"):
         try:
             features = features.to(torch.device("cuda:0"))
@@ -246,100 +283,101 @@ def get_vector_size() -> int:
     return 527
 
 
-def create_ast_partition(digest: str) -> None:
-    collection = get_or_create_ast_collection()
-    if not utility.has_partition(collection.name, digest):
-        collection.create_partition(digest)
+def create_ast_collection() -> None:
+    get_vector_store().create_collection(get_ast_spec())
 
 
-def create_ast_collection() -> Collection:
-    collection = Collection(
-        name=get_ast_collection_name(),
-        schema=CollectionSchema(
-            auto_id=False,
-            fields=[
-                FieldSchema(
-                    name="id", dtype=DataType.VARCHAR, is_primary=True, max_length=256
-                ),
-                FieldSchema(name="digest", dtype=DataType.VARCHAR, max_length=256),
-                FieldSchema(name="start_frame", dtype=DataType.INT64),
-                FieldSchema(name="frame_count", dtype=DataType.INT64),
-                FieldSchema(
-                    name="vector", dtype=DataType.FLOAT_VECTOR, dim=get_vector_size()
-                ),
-            ],
-        ),
-    )
-    collection.create_index(
-        field_name="vector",
-        index_params=dict(
-            metric_type="L2", index_type="IVF_FLAT", params=dict(nlist=1024)
-        ),
-    )
-    return collection
+def ensure_ast_collection() -> None:
+    # TODO: Separate get and create! No implicit behavior.
+    if not get_vector_store().has_collection(get_ast_spec()):
+        create_ast_collection()
 
 
 def get_ast_collection() -> Collection:
-    collection_name = get_ast_collection_name()
-    if utility.has_collection(collection_name):
-        return Collection(name=collection_name)
-    raise ValueError
-
-
-def get_or_create_ast_collection() -> Collection:
-    # TODO: Separate get and create! No implicit behavior.
-    collection_name = get_ast_collection_name()
-    if utility.has_collection(collection_name):
-        return Collection(name=collection_name)
-    return create_ast_collection()
+    return get_collection(get_ast_collection_name())
 
 
 def get_ast_collection_name() -> str:
     return config.analysis.ast_collection_prefix
 
 
+def get_ast_spec() -> CollectionSpec:
+    return CollectionSpec(
+        name=get_ast_collection_name(),
+        dimension=get_vector_size(),
+        index_type=config.ast.index_type,
+        index_params=config.ast.index_params,
+        metric_type=config.ast.metric_type,
+        search_params=config.ast.search_params,
+    )
+
+
 def insert_ast_entries(
     digest: str,
     entries: Sequence[tuple[int, int, tuple[float, ...]]],
-    partition_name: str | None = None,
+    *,
+    hop_ms: int,
+    length_ms: int,
 ) -> None:
-    collection = get_or_create_ast_collection()
-    stride = 1024
-    for i in range(0, len(entries), stride):
-        data: dict[str, list] = {}
-        for start_frame, frame_count, vector in entries[i : i + stride]:
-            data.setdefault("id", []).append(f"{digest}-{start_frame}-{frame_count}")
-            data.setdefault("digest", []).append(digest)
-            data.setdefault("start_frame", []).append(start_frame)
-            data.setdefault("frame_count", []).append(frame_count)
-            data.setdefault("vector", []).append(vector)
-        collection.insert(data=list(data.values()), partition_name=partition_name),
+    """
+    Insert ``(start_frame, frame_count, vector)`` entries partitioned with
+    ``hop_ms`` and ``length_ms``, as columns, which the vector store batches.
+    """
+    ensure_ast_collection()
+    if not entries:
+        return
+    start_frames, frame_counts, vectors = zip(*entries)
+    get_vector_store().insert(
+        get_ast_spec(),
+        digest=digest,
+        start_frames=numpy.array(start_frames, dtype=numpy.int64),
+        frame_counts=numpy.array(frame_counts, dtype=numpy.int64),
+        hop_ms=hop_ms,
+        length_ms=length_ms,
+        vectors=numpy.array(vectors, dtype=numpy.float32),
+    )
 
 
 def query_ast_collection(
     vector: Sequence[float],
     limit: int = 10,
     partition_names: Sequence[str] | None = None,
+    search_params: dict[str, Any] | None = None,
+    lengths: Sequence[int] | None = None,
 ) -> Sequence[Entry]:
-    collection = get_or_create_ast_collection()
-    entries: list[Entry] = []
-    kwargs = dict(
-        anns_field="vector",
-        consistency_level=2,
-        data=[list(vector)],
+    return query_ast_collection_many(
+        [vector],
+        lengths=[lengths],
         limit=limit,
-        output_fields=["digest", "start_frame", "frame_count"],
-        param={"metric_type": "L2", "params": {"nprobe": 1}},
-    )
-    if partition_names:
-        kwargs["partition_names"] = partition_names
-    for x in collection.search(**kwargs)[0]:
-        entries.append(
-            dict(
-                digest=x.fields["digest"],
-                start_frame=x.fields["start_frame"],
-                frame_count=x.fields["frame_count"],
-                distance=round(x.distance, 3),
+        partition_names=[partition_names],
+        search_params=search_params,
+    )[0]
+
+
+def query_ast_collection_many(
+    vectors: Sequence[Sequence[float]],
+    limit: int = 10,
+    partition_names: Sequence[Sequence[str] | None] | None = None,
+    search_params: dict[str, Any] | None = None,
+    lengths: Sequence[Sequence[int] | None] | None = None,
+) -> list[list[Entry]]:
+    """
+    Query many vectors at once, each with their own window lengths and
+    partitions.
+
+    Partitions are digests, filtered on as the collection's partition key.
+    """
+    ensure_ast_collection()
+    return get_vector_store().search(
+        get_ast_spec(),
+        vectors,
+        filters=[
+            {"digests": partition_names_, "lengths": lengths_}
+            for lengths_, partition_names_ in zip(
+                lengths or [None] * len(vectors),
+                partition_names or [None] * len(vectors),
             )
-        )
-    return entries
+        ],
+        limit=limit,
+        search_params=search_params,
+    )
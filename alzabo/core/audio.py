@@ -1,10 +1,14 @@
 import asyncio
+import io
 import logging
 import subprocess
 import wave
 from pathlib import Path
 from typing import Sequence
 
+import numpy
+import soundfile
+
 logger = logging.getLogger(__name__)
 
 
@@ -67,3 +71,50 @@ async def transcode_audio_async(
     if process.returncode:
         for line in stdout.decode().splitlines():
             logger.warning(line)
+
+
+def get_decode_command(sample_rate: int = 48000) -> Sequence[str]:
+    return [
+        "ffmpeg",
+        "-i",
+        "pipe:0",
+        "-ac",
+        "1",
+        "-ar",
+        str(sample_rate),
+        "-f",
+        "f32le",
+        "pipe:1",
+    ]
+
+
+async def decode_audio_async(data: bytes, sample_rate: int = 48000) -> numpy.ndarray:
+    """
+    Decode audio bytes to mono ``sample_rate`` samples, without temp files.
+
+    Mono WAVs already at ``sample_rate`` are read directly, anything else is
+    piped through ffmpeg.
+    """
+    try:
+        info = soundfile.info(io.BytesIO(data))
+        if (
+            info.format == "WAV"
+            and info.channels == 1
+            and info.samplerate == sample_rate
+        ):
+            samples, _ = soundfile.read(io.BytesIO(data), dtype="float32")
+            return samples
+    except soundfile.LibsndfileError:
+        pass
+    process = await asyncio.create_subprocess_exec(
+        *get_decode_command(sample_rate=sample_rate),
+        stdin=subprocess.PIPE,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+    )
+    stdout, stderr = await process.communicate(data)
+    if process.returncode:
+        for line in stderr.decode().splitlines():
+            logger.warning(line)
+        raise ValueError("Could not decode audio")
+    return numpy.frombuffer(stdout, dtype=numpy.float32)
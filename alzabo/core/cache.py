@@ -0,0 +1,171 @@
+"""
+Content-addressed Redis cache for query-by-upload analyses, and in-process
+cache for query results.
+"""
+
+import asyncio
+import concurrent.futures
+import json
+import threading
+import time
+from collections import OrderedDict
+from hashlib import sha256
+from typing import Any, Callable, Hashable, Sequence, cast
+
+import numpy
+import redis
+
+from . import utils
+from .milvus import Entry
+
+CACHE_INDEX_KEY = "upload-cache:index"
+GENERATION_KEY = "milvus:generation"
+
+
+def get_cache_key(kind: str, data: bytes, **parameters: Any) -> str:
+    """
+    Key an upload by the SHA-256 of its bytes and the analysis parameters.
+    """
+    hash_ = sha256(data)
+    hash_.update(json.dumps(parameters, sort_keys=True).encode())
+    return f"upload-cache:{kind}:{hash_.hexdigest()}"
+
+
+def get_cached(*, redis: redis.Redis, key: str, ttl: int) -> Any | None:
+    """
+    Get a cached value, refreshing its recency and its ``ttl``, so eviction
+    and expiry both drop the least recently used entries.
+    """
+    if (value := redis.get(key)) is None:
+        return None
+    with redis.pipeline() as pipeline:
+        pipeline.expire(key, ttl)
+        pipeline.zadd(CACHE_INDEX_KEY, {key: time.time()})
+        pipeline.execute()
+    return json.loads(cast(str, value))
+
+
+def set_cached(
+    *, redis: redis.Redis, key: str, value: Any, ttl: int, max_size: int
+) -> None:
+    """
+    Cache ``value`` for ``ttl`` seconds, evicting the least recently used
+    entries beyond ``max_size``.
+    """
+    with redis.pipeline() as pipeline:
+        pipeline.set(key, json.dumps(value), ex=ttl)
+        pipeline.zadd(CACHE_INDEX_KEY, {key: time.time()})
+        # Drop index entries whose keys have already expired
+        pipeline.zremrangebyscore(CACHE_INDEX_KEY, "-inf", time.time() - ttl)
+        pipeline.execute()
+    if (overflow := cast(int, redis.zcard(CACHE_INDEX_KEY)) - max_size) > 0:
+        popped = cast(list, redis.zpopmin(CACHE_INDEX_KEY, overflow))
+        if evicted := [key_ for key_, _ in popped]:
+            redis.delete(*evicted)
+
+
+def get_generation(*, redis: redis.Redis) -> int:
+    return int(cast(str | None, redis.get(GENERATION_KEY)) or 0)
+
+
+def bump_generation(*, redis: redis.Redis) -> int:
+    """
+    Bump the corpus generation, invalidating every cached query result.
+    """
+    return cast(int, redis.incr(GENERATION_KEY))
+
+
+def quantize_vector(vector: Sequence[float], quantum: float) -> bytes:
+    """
+    Quantize a vector, so near-identical vectors share a cache key.
+    """
+    return (
+        numpy.round(numpy.asarray(vector, dtype=numpy.float64) / quantum)
+        .astype(numpy.int64)
+        .tobytes()
+    )
+
+
+class QueryCache:
+    """
+    A bounded LRU cache of query results, for a single corpus generation.
+
+    Results are dropped wholesale whenever the generation changes.
+    """
+
+    def __init__(self, max_size: int) -> None:
+        self.generation: int | None = None
+        self.lock = threading.Lock()
+        self.max_size = max_size
+        self.results: OrderedDict[Hashable, list[Entry]] = OrderedDict()
+
+    def query(
+        self,
+        *,
+        generation: int,
+        keys: Sequence[Hashable],
+        query: Callable[[list[int]], list[list[Entry]]],
+    ) -> tuple[list[list[Entry]], int]:
+        """
+        Answer queries by key from the cache, calling ``query`` with the indices
+        of the missing keys only.
+
+        Returns the results, and the number of cache hits.
+        """
+        results: list[list[Entry] | None] = [None] * len(keys)
+        with self.lock:
+            if generation != self.generation:
+                self.generation = generation
+                self.results.clear()
+            for i, key in enumerate(keys):
+                if (result := self.results.get(key)) is not None:
+                    self.results.move_to_end(key)
+                    results[i] = result
+        misses = [i for i, result in enumerate(results) if result is None]
+        if misses:
+            for i, result in zip(misses, query(misses)):
+                results[i] = result
+            with self.lock:
+                if generation == self.generation:
+                    for i in misses:
+                        self.results[keys[i]] = cast(list[Entry], results[i])
+                        self.results.move_to_end(keys[i])
+                    while len(self.results) > self.max_size:
+                        self.results.popitem(last=False)
+        return cast(list[list[Entry]], results), len(keys) - len(misses)
+
+
+async def query_many(
+    *,
+    executor: concurrent.futures.Executor | None = None,
+    keys: Sequence[Hashable],
+    logger: Any,
+    query: Callable[[list[int]], list[list[Entry]]],
+    query_cache: QueryCache | None,
+    redis: redis.Redis,
+) -> tuple[list[list[Entry]], dict[str, float]]:
+    """
+    Answer queries in ``executor``, or the event loop's default executor, via
+    ``query_cache`` when given, calling ``query`` with the indices of the
+    queries to run.
+
+    Returns the entries of each query, and timing including cache hits and
+    misses.
+    """
+
+    def query_cached() -> tuple[list[list[Entry]], int]:
+        if query_cache is None:
+            return query(list(range(len(keys)))), 0
+        return query_cache.query(
+            generation=get_generation(redis=redis), keys=keys, query=query
+        )
+
+    with utils.timer(logger, "Milvus time: {time}") as get_time:
+        entries, cache_hits = await asyncio.get_running_loop().run_in_executor(
+            executor, query_cached
+        )
+    return entries, {
+        "milvus": get_time(),
+        "query_cache_hits": float(cache_hits),
+        "query_cache_misses": float(len(keys) - cache_hits),
+    }
@@ -0,0 +1,330 @@
+"""
+In-process NumPy approximation of the scsynth analysis.
+
+Mirrors the column layout of
+:py:func:`~alzabo.core.scsynth.core_synthdef_analysis` (one row per 512
+samples at 48kHz) without rendering via NRT scsynth. Values approximate the
+UGens they stand in for, see :py:func:`calibrate` for measuring how closely.
+"""
+
+from pathlib import Path
+
+import numpy
+import soundfile
+from scipy.signal import butter, lfilter
+
+from ..constants import SCSYNTH_ANALYSIS_SIZE
+
+FRAME_SIZE = 512
+SAMPLE_RATE = 48000
+WINDOW_SIZE = 2048
+
+# What scsynth reports for digital silence
+SILENCE_DECIBELS = -764.6162109375
+SILENCE_FLATNESS = 0.8
+
+PEAK_ATTACK_TIME = 0.01
+
+PITCH_FREQUENCY_MAX = 3000.0
+PITCH_FREQUENCY_MIN = 60.0
+PITCH_INITIAL_FREQUENCY = 440.0
+PITCH_AMPLITUDE_THRESHOLD = 0.01
+PITCH_PEAK_THRESHOLD = 0.5
+
+ONSETS_FLOOR = 0.000001
+ONSETS_MEDIAN_SPAN = 11
+ONSETS_MIN_GAP = 10
+ONSETS_RELAX_TIME = 0.1
+ONSETS_THRESHOLD = 0.01
+
+MFCC_COUNT = 42
+CHROMA_COUNT = 12
+
+
+def amplitude_to_decibels(amplitude: numpy.ndarray) -> numpy.ndarray:
+    with numpy.errstate(divide="ignore"):
+        decibels = 20.0 * numpy.log10(amplitude)
+    return numpy.maximum(decibels, SILENCE_DECIBELS)
+
+
+def hz_to_midi(frequency: numpy.ndarray) -> numpy.ndarray:
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        midi = 69.0 + 12.0 * numpy.log2(frequency / 440.0)
+    # Sanitize, as the synthdef does
+    return numpy.where(numpy.isfinite(midi), midi, 0.0)
+
+
+def frame(samples: numpy.ndarray, frame_count: int) -> numpy.ndarray:
+    """
+    Get the ``WINDOW_SIZE`` windows of ``samples`` ending at each frame boundary.
+    """
+    padded = numpy.concatenate([numpy.zeros(WINDOW_SIZE - FRAME_SIZE), samples])
+    return numpy.lib.stride_tricks.sliding_window_view(padded, WINDOW_SIZE)[
+        ::FRAME_SIZE
+    ][:frame_count]
+
+
+def analyze_peak(samples: numpy.ndarray, frame_count: int) -> numpy.ndarray:
+    # Amplitude's attack and release default to the same 10ms, which makes it
+    # a one-pole lowpass over the rectified signal
+    coefficient = numpy.exp(numpy.log(0.1) / (PEAK_ATTACK_TIME * SAMPLE_RATE))
+    envelope = lfilter(
+        [1 - coefficient],
+        [1, -coefficient],
+        numpy.abs(samples[: frame_count * FRAME_SIZE]),
+    )
+    return amplitude_to_decibels(envelope[FRAME_SIZE - 1 :: FRAME_SIZE])
+
+
+def analyze_rms(samples: numpy.ndarray, frame_count: int) -> numpy.ndarray:
+    b, a = butter(2, 10.0, fs=SAMPLE_RATE)
+    power = lfilter(b, a, samples[: frame_count * FRAME_SIZE] ** 2)
+    # The lowpass can ring below zero, scsynth's sqrt is signed
+    return amplitude_to_decibels(
+        numpy.sqrt(numpy.abs(power[FRAME_SIZE - 1 :: FRAME_SIZE]))
+    )
+
+
+def analyze_pitch(windows: numpy.ndarray) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Track pitch via normalized autocorrelation, holding the last voiced
+    frequency through unvoiced frames as the Pitch UGen does.
+    """
+    spectra = numpy.fft.rfft(windows, n=WINDOW_SIZE * 2, axis=1)
+    autocorrelation = numpy.fft.irfft(numpy.abs(spectra) ** 2, axis=1)[:, :WINDOW_SIZE]
+    lags = numpy.arange(WINDOW_SIZE)
+    energy = autocorrelation[:, :1]
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        # Unbiased, so longer lags aren't penalized for their shorter overlap
+        clarity = (autocorrelation / energy) * (WINDOW_SIZE / (WINDOW_SIZE - lags))
+    clarity = numpy.nan_to_num(clarity)
+    min_lag = int(SAMPLE_RATE / PITCH_FREQUENCY_MAX)
+    max_lag = int(SAMPLE_RATE / PITCH_FREQUENCY_MIN)
+    candidates = clarity[:, min_lag : max_lag + 1]
+    is_peak = numpy.zeros_like(candidates, dtype=bool)
+    is_peak[:, 1:-1] = (candidates[:, 1:-1] >= candidates[:, :-2]) & (
+        candidates[:, 1:-1] > candidates[:, 2:]
+    )
+    best = numpy.where(is_peak, candidates, -numpy.inf).max(axis=1, keepdims=True)
+    # The shortest lag close to the best peak avoids octave errors
+    indices = numpy.argmax(is_peak & (candidates >= best * 0.9), axis=1)
+    rows = numpy.arange(len(windows))
+    # Parabolic interpolation around the chosen peak
+    left = candidates[rows, numpy.maximum(indices - 1, 0)]
+    center = candidates[rows, indices]
+    right = candidates[rows, numpy.minimum(indices + 1, candidates.shape[1] - 1)]
+    denominator = left - 2 * center + right
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        offset = numpy.where(denominator, 0.5 * (left - right) / denominator, 0.0)
+    frequency = SAMPLE_RATE / (min_lag + indices + numpy.clip(offset, -0.5, 0.5))
+    amplitude = numpy.sqrt(energy[:, 0] / WINDOW_SIZE)
+    is_voiced = (
+        numpy.isfinite(best[:, 0])
+        & (center >= PITCH_PEAK_THRESHOLD)
+        & (amplitude >= PITCH_AMPLITUDE_THRESHOLD)
+    )
+    last_voiced = numpy.maximum.accumulate(numpy.where(is_voiced, rows, -1), axis=0)
+    held = numpy.where(
+        last_voiced >= 0,
+        frequency[numpy.maximum(last_voiced, 0)],
+        PITCH_INITIAL_FREQUENCY,
+    )
+    return hz_to_midi(held), is_voiced.astype(numpy.float64)
+
+
+def analyze_onsets(spectra: numpy.ndarray) -> numpy.ndarray:
+    """
+    Detect onsets from the weighted phase deviation of adaptively whitened
+    spectra.
+    """
+    magnitudes = numpy.abs(spectra)
+    decay = 0.001 ** ((FRAME_SIZE / SAMPLE_RATE) / ONSETS_RELAX_TIME)
+    whitened = numpy.empty_like(magnitudes)
+    peaks = numpy.full(magnitudes.shape[1], ONSETS_FLOOR)
+    for i, row in enumerate(magnitudes):
+        peaks = numpy.maximum(numpy.maximum(row, ONSETS_FLOOR), peaks * decay)
+        whitened[i] = row / peaks
+    phases = numpy.angle(spectra)
+    deviation = numpy.zeros_like(phases)
+    deviation[2:] = phases[2:] - 2 * phases[1:-1] + phases[:-2]
+    deviation = numpy.abs(numpy.angle(numpy.exp(1j * deviation)))
+    odf = (whitened * deviation).mean(axis=1)
+    padded = numpy.concatenate([numpy.zeros(ONSETS_MEDIAN_SPAN - 1), odf])
+    medians = numpy.median(
+        numpy.lib.stride_tricks.sliding_window_view(padded, ONSETS_MEDIAN_SPAN)[:-1],
+        axis=1,
+    )
+    medians = numpy.concatenate([[0.0], medians])[: len(odf)]
+    rising = numpy.concatenate([[False], odf[1:] > odf[:-1]])
+    onsets = numpy.zeros(len(odf))
+    last_onset = -ONSETS_MIN_GAP
+    for frame in numpy.flatnonzero(rising & (odf - medians > ONSETS_THRESHOLD)):
+        if frame - last_onset >= ONSETS_MIN_GAP:
+            onsets[frame] = 1.0
+            last_onset = int(frame)
+    return onsets
+
+
+def analyze_spectral_shape(
+    magnitudes: numpy.ndarray,
+) -> tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]:
+    frequencies = numpy.fft.rfftfreq(WINDOW_SIZE, 1 / SAMPLE_RATE)
+    totals = magnitudes.sum(axis=1)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        centroid = (magnitudes * frequencies).sum(axis=1) / totals
+    power = magnitudes[:, 1:-1] ** 2
+    is_silent = power.sum(axis=1) == 0
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        flatness = numpy.exp(
+            numpy.log(numpy.maximum(power, 1e-30)).mean(axis=1)
+        ) / power.mean(axis=1)
+    flatness = numpy.where(is_silent, SILENCE_FLATNESS, flatness)
+    # Bin index where half the magnitude is reached, skipping DC
+    cumulative = numpy.cumsum(magnitudes[:, 1:], axis=1)
+    rolloff = frequencies[
+        1 + numpy.argmax(cumulative >= 0.5 * cumulative[:, -1:], axis=1)
+    ]
+    return hz_to_midi(centroid), flatness, hz_to_midi(rolloff)
+
+
+def get_mel_filterbank() -> numpy.ndarray:
+    def hz_to_mel(frequency):
+        return 2595.0 * numpy.log10(1.0 + frequency / 700.0)
+
+    def mel_to_hz(mel):
+        return 700.0 * (10.0 ** (mel / 2595.0) - 1.0)
+
+    frequencies = numpy.fft.rfftfreq(WINDOW_SIZE, 1 / SAMPLE_RATE)
+    edges = mel_to_hz(
+        numpy.linspace(hz_to_mel(0.0), hz_to_mel(SAMPLE_RATE / 2), MFCC_COUNT + 2)
+    )
+    lower, center, upper = edges[:-2, None], edges[1:-1, None], edges[2:, None]
+    return numpy.maximum(
+        0.0,
+        numpy.minimum(
+            (frequencies - lower) / (center - lower),
+            (upper - frequencies) / (upper - center),
+        ),
+    )
+
+
+def analyze_mfcc(magnitudes: numpy.ndarray) -> numpy.ndarray:
+    energies = (magnitudes**2) @ get_mel_filterbank().T
+    # Offset so digital silence lands on 0.25, as scsynth's MFCC does
+    logs = numpy.log10(energies + 1e-3) + 3.0
+    n = numpy.arange(MFCC_COUNT)
+    dct = numpy.cos(numpy.pi / MFCC_COUNT * (n[None, :] + 0.5) * n[:, None])
+    dct *= numpy.sqrt(2.0 / MFCC_COUNT)
+    dct[0] /= numpy.sqrt(2.0)
+    return 0.25 + 0.05 * (logs @ dct.T)
+
+
+def analyze_chroma(magnitudes: numpy.ndarray) -> numpy.ndarray:
+    frequencies = numpy.fft.rfftfreq(WINDOW_SIZE, 1 / SAMPLE_RATE)[1:]
+    pitch_classes = numpy.round(hz_to_midi(frequencies)).astype(int) % CHROMA_COUNT
+    mapping = numpy.zeros((len(frequencies), CHROMA_COUNT))
+    mapping[numpy.arange(len(frequencies)), pitch_classes] = 1.0
+    chroma = (magnitudes[:, 1:] ** 2) @ mapping
+    totals = chroma.sum(axis=1, keepdims=True)
+    with numpy.errstate(divide="ignore", invalid="ignore"):
+        return numpy.where(totals > 0, chroma / totals, 0.0)
+
+
+def analyze(samples: numpy.ndarray) -> numpy.ndarray:
+    """
+    Analyze mono 48kHz ``samples``, one row per 512 samples.
+    """
+    samples = numpy.asarray(samples, dtype=numpy.float64)
+    frame_count = len(samples) // FRAME_SIZE
+    analysis = numpy.zeros((frame_count, SCSYNTH_ANALYSIS_SIZE))
+    if not frame_count:
+        return analysis
+    windows = frame(samples, frame_count)
+    window = numpy.sin(numpy.pi * (numpy.arange(WINDOW_SIZE) + 0.5) / WINDOW_SIZE)
+    spectra = numpy.fft.rfft(windows * window, axis=1)
+    magnitudes = numpy.abs(spectra)
+    analysis[:, 0] = analyze_peak(samples, frame_count)
+    analysis[:, 1] = analyze_rms(samples, frame_count)
+    analysis[:, 2], analysis[:, 3] = analyze_pitch(windows)
+    analysis[:, 4] = analyze_onsets(spectra)
+    analysis[:, 5], analysis[:, 6], analysis[:, 7] = analyze_spectral_shape(magnitudes)
+    analysis[:, 8:50] = analyze_mfcc(magnitudes)
+    analysis[:, 50:62] = analyze_chroma(magnitudes)
+    return analysis
+
+
+def analyze_path(audio_path: Path) -> numpy.ndarray:
+    """
+    Analyze a mono 48kHz audio file.
+    """
+    samples, sample_rate = soundfile.read(audio_path, always_2d=True)
+    if sample_rate != SAMPLE_RATE or samples.shape[1] != 1:
+        raise ValueError(audio_path)
+    return analyze(samples[:, 0])
+
+
+def calibrate(
+    expected: numpy.ndarray, actual: numpy.ndarray, onset_tolerance: int = 2
+) -> dict[str, float]:
+    """
+    Quantify how far an analysis deviates from the scsynth analysis of the same
+    audio.
+
+    Continuous features report their mean absolute error, voicing its rate of
+    agreement, and onsets their precision, recall and F1 score, matching
+    onsets up to ``onset_tolerance`` frames apart.
+    """
+    if expected.shape != actual.shape:
+        raise ValueError((expected.shape, actual.shape))
+    audible = expected[:, 1] > SILENCE_DECIBELS
+    voiced = (expected[:, 3] > 0) & (actual[:, 3] > 0)
+
+    def error(columns: slice, mask: numpy.ndarray | None = None) -> float:
+        if mask is not None and not mask.any():
+            return 0.0
+        difference = numpy.abs(expected[:, columns] - actual[:, columns])
+        return float(difference[mask].mean() if mask is not None else difference.mean())
+
+    precision, recall = match_onsets(
+        numpy.flatnonzero(expected[:, 4]),
+        numpy.flatnonzero(actual[:, 4]),
+        onset_tolerance,
+    )
+    return {
+        "peak": error(slice(0, 1), audible),
+        "rms": error(slice(1, 2), audible),
+        "f0": error(slice(2, 3), voiced),
+        "is_voiced": float((expected[:, 3] == actual[:, 3]).mean()),
+        "onsets": (
+            2 * precision * recall / (precision + recall) if precision + recall else 0.0
+        ),
+        "onsets:precision": precision,
+        "onsets:recall": recall,
+        "centroid": error(slice(5, 6), audible),
+        "flatness": error(slice(6, 7), audible),
+        "rolloff": error(slice(7, 8), audible),
+        "mfcc": error(slice(8, 50), audible),
+        "chroma": error(slice(50, 62), audible),
+    }
+
+
+def match_onsets(
+    expected: numpy.ndarray, actual: numpy.ndarray, tolerance: int
+) -> tuple[float, float]:
+    """
+    Pair onsets frame indices up to ``tolerance`` frames apart, each at most
+    once, in order.
+
+    Returns the precision and recall of ``actual`` against ``expected``.
+    """
+    matches, i = 0, 0
+    for onset in actual:
+        while i < len(expected) and expected[i] < onset - tolerance:
+            i += 1
+        if i < len(expected) and expected[i] <= onset + tolerance:
+            matches += 1
+            i += 1
+    return (
+        matches / len(actual) if len(actual) else float(not len(expected)),
+        matches / len(expected) if len(expected) else float(not len(actual)),
+    )
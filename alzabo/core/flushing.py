@@ -0,0 +1,102 @@
+"""
+Coalesced vector store flushes, scheduled via Redis.
+
+Insert tasks mark collections dirty by the rows they insert. Flushes then run
+at most once per collection per interval, unless enough rows have accumulated,
+so bursts of ingests don't seal a segment apiece.
+"""
+
+import math
+import time
+from typing import Sequence, cast
+
+import redis
+from redis.client import Pipeline
+
+DIRTY_KEY = "milvus:dirty"
+FLUSHED_KEY = "milvus:flushed"
+SCHEDULED_KEY = "milvus:flush-scheduled"
+# Seconds a deferred flush's reservation outlives its delay, so it still holds
+# while the flush waits for a worker, yet lapses if the flush is lost
+SCHEDULED_MARGIN = 300.0
+
+
+def mark_dirty(*, redis: redis.Redis, names: Sequence[str], rows: int) -> None:
+    """
+    Count ``rows`` inserted into each of the collections ``names``.
+    """
+    with redis.pipeline() as pipeline:
+        for name in names:
+            pipeline.hincrby(DIRTY_KEY, name, rows)
+        pipeline.execute()
+
+
+def claim_flushes(
+    *,
+    redis: redis.Redis,
+    names: Sequence[str],
+    interval: float,
+    max_rows: int,
+    force: bool = False,
+) -> tuple[dict[str, int], float | None]:
+    """
+    Atomically claim the collections due a flush: those dirty and either not
+    flushed within ``interval`` seconds or with at least ``max_rows`` rows
+    inserted since, or every collection if ``force``-d.
+
+    Rows inserted after the claim keep their collections dirty. Concurrent
+    claims are retried via WATCH / MULTI, so each collection is claimed once.
+
+    Returns the claimed collections and their rows, and the seconds until the
+    next of the remaining dirty collections falls due, if any.
+    """
+    claimed: dict[str, int] = {}
+    delay = math.inf
+
+    def claim(pipeline: Pipeline) -> None:
+        nonlocal claimed, delay
+        now = time.time()
+        dirty = cast(list, pipeline.hmget(DIRTY_KEY, list(names)))
+        flushed = cast(list, pipeline.hmget(FLUSHED_KEY, list(names)))
+        claimed, delay = {}, math.inf
+        for name, rows, flushed_at in zip(names, dirty, flushed):
+            rows, elapsed = int(rows or 0), now - float(flushed_at or 0)
+            if force or (rows > 0 and (rows >= max_rows or elapsed >= interval)):
+                claimed[name] = rows
+            elif rows > 0:
+                delay = min(delay, interval - elapsed)
+        pipeline.multi()
+        for name, rows in claimed.items():
+            pipeline.hincrby(DIRTY_KEY, name, -rows)
+            pipeline.hset(FLUSHED_KEY, name, str(now))
+
+    redis.transaction(claim, DIRTY_KEY, FLUSHED_KEY)
+    return claimed, None if math.isinf(delay) else max(delay, 0.0)
+
+
+def unclaim_flushes(*, redis: redis.Redis, claimed: dict[str, int]) -> None:
+    """
+    Return the ``claimed`` rows of collections whose flushes failed, leaving
+    them due a flush immediately.
+    """
+    with redis.pipeline() as pipeline:
+        for name, rows in claimed.items():
+            pipeline.hincrby(DIRTY_KEY, name, rows)
+            pipeline.hdel(FLUSHED_KEY, name)
+        pipeline.execute()
+
+
+def schedule_flush(*, redis: redis.Redis, delay: float) -> bool:
+    """
+    Reserve the single deferred flush, ``delay`` seconds from now, until it
+    releases the reservation or ``SCHEDULED_MARGIN`` seconds after it's due.
+
+    Returns false if a deferred flush is already scheduled.
+    """
+    return bool(
+        redis.set(SCHEDULED_KEY, 1, nx=True, px=int((delay + SCHEDULED_MARGIN) * 1000))
+    )
+
+
+def release_scheduled_flush(*, redis: redis.Redis) -> None:
+    redis.delete(SCHEDULED_KEY)
@@ -1,7 +1,38 @@
-from pymilvus import connections
+import threading
+from typing import Any, Callable, Sequence, TypeVar
+
+import numpy
+from pymilvus import Collection, MilvusException, connections, utility
 from typing_extensions import TypedDict
 
-from ..config import config
+from ..config import IndexType, MetricType, config
+
+T = TypeVar("T")
+
+# Handles of known collections, keyed by name
+_collections: dict[str, Collection] = {}
+_lock = threading.Lock()
+
+# Build params of each index type, underneath any configured build params.
+# IVF_PQ's "m" must divide the vector dimension, so configure it explicitly.
+DEFAULT_INDEX_PARAMS: dict[str, dict[str, Any]] = {
+    "DISKANN": {},
+    "FLAT": {},
+    "HNSW": {"M": 16, "efConstruction": 256},
+    "IVF_FLAT": {"nlist": 1024},
+    "IVF_PQ": {"nlist": 1024, "nbits": 8},
+    "IVF_SQ8": {"nlist": 1024},
+}
+
+# Search params of each index type, underneath any configured search params
+DEFAULT_SEARCH_PARAMS: dict[str, dict[str, Any]] = {
+    "DISKANN": {"search_list": 100},
+    "FLAT": {},
+    "HNSW": {"ef": 64},
+    "IVF_FLAT": {"nprobe": 1},
+    "IVF_PQ": {"nprobe": 1},
+    "IVF_SQ8": {"nprobe": 1},
+}
 
 
 class Entry(TypedDict):
@@ -13,3 +44,134 @@ class Entry(TypedDict):
 
 def connect() -> None:
     connections.connect(host=config.milvus.url.host, port=config.milvus.url.port)
+
+
+def register_collection(collection: Collection) -> Collection:
+    """
+    Register a collection's handle.
+    """
+    with _lock:
+        _collections[collection.name] = collection
+    return collection
+
+
+def register_collections(names: Sequence[str]) -> None:
+    """
+    Register the handles of every existing collection in ``names``, e.g. at
+    startup.
+    """
+    for name in names:
+        if utility.has_collection(name):
+            register_collection(Collection(name=name))
+
+
+def forget_collection(name: str) -> None:
+    with _lock:
+        _collections.pop(name, None)
+
+
+def get_collection(name: str) -> Collection:
+    """
+    Get a collection's handle, registering it on first use.
+
+    Raise ``ValueError`` if the collection doesn't exist.
+    """
+    if (collection := _collections.get(name)) is not None:
+        return collection
+    if not utility.has_collection(name):
+        raise ValueError(name)
+    return register_collection(Collection(name=name))
+
+
+def with_collection(name: str, callback: Callable[[Collection], T]) -> T:
+    """
+    Call ``callback`` with a collection's handle.
+
+    On error, forget the handle, and retry once with a freshly-registered one.
+    """
+    try:
+        return callback(get_collection(name))
+    except MilvusException:
+        forget_collection(name)
+        return callback(get_collection(name))
+
+
+def get_index_params(
+    index_type: IndexType, metric_type: MetricType, params: dict[str, Any] | None = None
+) -> dict[str, Any]:
+    return dict(
+        index_type=index_type,
+        metric_type=metric_type,
+        params={**DEFAULT_INDEX_PARAMS[index_type], **(params or {})},
+    )
+
+
+def get_search_params(
+    index_type: IndexType,
+    metric_type: MetricType,
+    params: dict[str, Any] | None = None,
+    overrides: dict[str, Any] | None = None,
+    limit: int = 10,
+) -> dict[str, Any]:
+    """
+    Layer per-query overrides over configured and default search params.
+    """
+    params_ = {
+        **DEFAULT_SEARCH_PARAMS[index_type],
+        **(params or {}),
+        **(overrides or {}),
+    }
+    # HNSW and DiskANN candidate lists can't be shorter than the limit
+    for key in ("ef", "search_list"):
+        if key in params_:
+            params_[key] = max(params_[key], limit)
+    return {"metric_type": metric_type, "params": params_}
+
+
+def search_many(
+    collection: Collection,
+    vectors: Sequence[Sequence[float]] | numpy.ndarray,
+    *,
+    exprs: Sequence[str] | None = None,
+    limit: int = 10,
+    param: dict[str, Any],
+    partition_names: Sequence[Sequence[str] | None] | None = None,
+) -> list[list[Entry]]:
+    """
+    Search for many vectors, each with their own expression and partitions.
+
+    Vectors sharing the same filters are searched together, in one batched
+    search per distinct filter.
+    """
+    exprs = exprs or [""] * len(vectors)
+    partition_names = partition_names or [None] * len(vectors)
+    if not (len(vectors) == len(exprs) == len(partition_names)):
+        raise ValueError
+    groups: dict[tuple[str, tuple[str, ...]], list[int]] = {}
+    for i, (expr, partition_names_) in enumerate(zip(exprs, partition_names)):
+        groups.setdefault((expr, tuple(partition_names_ or ())), []).append(i)
+    results: list[list[Entry]] = [[] for _ in vectors]
+    for (expr, partition_names_), indices in groups.items():
+        kwargs: dict[str, Any] = dict(
+            anns_field="vector",
+            consistency_level=2,
+            data=[list(vectors[i]) for i in indices],
+            limit=limit,
+            output_fields=["digest", "start_frame", "frame_count"],
+            param=param,
+        )
+        if expr:
+            kwargs["expr"] = expr
+        if partition_names_:
+            kwargs["partition_names"] = list(partition_names_)
+        for i, hits in zip(indices, collection.search(**kwargs)):
+            results[i] = [
+                dict(
+                    digest=x.fields["digest"],
+                    start_frame=x.fields["start_frame"],
+                    frame_count=x.fields["frame_count"],
+                    distance=round(x.distance, 3),
+                )
+                for x in hits
+            ]
+    return results
@@ -1,16 +1,20 @@
+import asyncio
+import dataclasses
 import json
 import logging
 import math
 import wave
+from concurrent.futures import ThreadPoolExecutor
 from hashlib import md5
+from itertools import product
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import Literal, Sequence, TypedDict, cast
+from typing import Any, Literal, Sequence, TypedDict, cast
 
 import numpy
 import redis
 import soundfile
-from pymilvus import Collection, CollectionSchema, DataType, FieldSchema, utility
+from pymilvus import Collection
 from sklearn.preprocessing import StandardScaler
 from supriya import CalculationRate, Score, SynthDef, synthdef
 from supriya.ugens import (
@@ -34,9 +38,10 @@ from supriya.ugens import (
 )
 from supriya.ugens.core import UGen, param, ugen
 
-from ..config import ScsynthIndexConfig, config
+from ..config import IndexType, MetricType, ScsynthIndexConfig, config
 from ..constants import SCSYNTH_ANALYSIS_SIZE, ScsynthFeatures
-from .milvus import Entry
+from .milvus import Entry, get_collection
+from .vector_store import CollectionSpec, get_vector_store
 
 logger = logging.getLogger(__name__)
 
@@ -131,6 +136,35 @@ Aggregate = TypedDict(
 )
 
 
+def _build_aggregate_layout() -> dict[ScsynthFeatures, slice]:
+    layout: dict[ScsynthFeatures, slice] = {}
+    offset = 0
+    for feature in ScsynthFeatures:
+        if feature in (ScsynthFeatures.RAW_MFCC_13, ScsynthFeatures.WHITENED_MFCC_13):
+            continue  # views onto the full MFCC columns
+        elif feature in (ScsynthFeatures.RAW_CHROMA, ScsynthFeatures.WHITENED_CHROMA):
+            width = 12
+        elif feature in (ScsynthFeatures.RAW_MFCC, ScsynthFeatures.WHITENED_MFCC):
+            width = 42
+        else:
+            width = 1
+        layout[feature] = slice(offset, offset + width)
+        offset += width
+    return layout
+
+
+# Column layout of aggregates stored as arrays, one row per window
+AGGREGATE_LAYOUT = _build_aggregate_layout()
+AGGREGATE_SIZE = max(slice_.stop for slice_ in AGGREGATE_LAYOUT.values())
+AGGREGATE_DTYPE = numpy.dtype(
+    [
+        ("start_frame", numpy.int64),
+        ("frame_count", numpy.int64),
+        ("features", numpy.float32, (AGGREGATE_SIZE,)),
+    ]
+)
+
+
 def core_synthdef_analysis(
     source,
     executable: Literal["scsynth", "supernova"] = "scsynth",
@@ -277,6 +311,158 @@ async def analyze(audio_path: Path) -> numpy.ndarray:
     return analysis
 
 
+async def analyze_samples(samples: numpy.ndarray) -> numpy.ndarray:
+    """
+    Analyze mono 48kHz ``samples`` via NRT scsynth.
+    """
+    with TemporaryDirectory() as temp_directory:
+        audio_path = Path(temp_directory) / "audio.wav"
+        # PCM, so :py:func:`analyze` can read the header via ``wave``
+        soundfile.write(audio_path, samples, 48000, subtype="PCM_24")
+        return await analyze(audio_path)
+
+
+async def analyze_chunked(
+    audio_path: Path,
+    chunk_seconds: float = 600.0,
+    concurrency: int = 4,
+    preroll_frame_count: int = 100,
+) -> numpy.ndarray:
+    """
+    Analyze a long audio file as concurrent NRT renders of overlapping chunks.
+
+    Each chunk is rendered with ``preroll_frame_count`` analysis frames of the
+    preceding audio, enough to cover the FFT window and let pitch tracking,
+    onset detection and the RMS lowpass settle, which are discarded when
+    stitching the chunks back together.
+    """
+    with audio_path.open("rb") as audio_file:
+        with wave.open(audio_file) as wave_file:
+            audio_frame_count = wave_file.getnframes()
+    analysis_frame_count = audio_frame_count // 512
+    chunk_frame_count = max(1, int(chunk_seconds * 48000 / 512))
+    if analysis_frame_count <= chunk_frame_count:
+        return await analyze(audio_path)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def analyze_chunk(start: int, stop: int) -> numpy.ndarray:
+        preroll_start = max(0, start - preroll_frame_count)
+        async with semaphore:
+            with TemporaryDirectory() as temp_directory:
+                chunk_path = Path(temp_directory) / "chunk.wav"
+                samples, _ = soundfile.read(
+                    audio_path, start=preroll_start * 512, stop=stop * 512
+                )
+                # PCM, so :py:func:`analyze` can read the header via ``wave``
+                soundfile.write(chunk_path, samples, 48000, subtype="PCM_24")
+                analysis = await analyze(chunk_path)
+        return analysis[start - preroll_start :]
+
+    return numpy.concatenate(
+        await asyncio.gather(
+            *(
+                analyze_chunk(
+                    start, min(start + chunk_frame_count, analysis_frame_count)
+                )
+                for start in range(0, analysis_frame_count, chunk_frame_count)
+            )
+        )
+    )
+
+
+async def analyze_many(
+    audio_paths: Sequence[Path], gap_frame_count: int = 512 * 100
+) -> list[numpy.ndarray]:
+    """
+    Analyze many audio files in a single NRT render.
+
+    The files are concatenated, each padded out to a whole analysis frame and
+    followed by ``gap_frame_count`` frames of silence to let the analysis
+    settle, and the rendered analysis is split back apart at the known frame
+    offsets.
+    """
+    if gap_frame_count % 512:
+        raise ValueError(gap_frame_count)
+    offsets: list[tuple[int, int]] = []
+    with TemporaryDirectory() as temp_directory:
+        batch_path = Path(temp_directory) / "batch.wav"
+        # PCM, so :py:func:`analyze` can read the header via ``wave``
+        with soundfile.SoundFile(
+            batch_path, "w", samplerate=48000, channels=1, subtype="PCM_24"
+        ) as batch_file:
+            offset = 0
+            for audio_path in audio_paths:
+                samples, sample_rate = soundfile.read(
+                    audio_path, always_2d=True, dtype="float32"
+                )
+                if sample_rate != 48000 or samples.shape[1] != 1:
+                    raise ValueError(audio_path)
+                frame_count = len(samples) // 512
+                padded_frame_count = math.ceil(len(samples) / 512)
+                batch_file.write(samples[:, 0])
+                batch_file.write(
+                    numpy.zeros(
+                        padded_frame_count * 512 - len(samples) + gap_frame_count,
+                        dtype=numpy.float32,
+                    )
+                )
+                offsets.append((offset, frame_count))
+                offset += padded_frame_count + gap_frame_count // 512
+        analysis = await analyze(batch_path)
+    return [analysis[offset : offset + count] for offset, count in offsets]
+
+
+def load_analysis(path: Path, mmap: bool = False) -> numpy.ndarray:
+    """
+    Load an analysis array saved via :py:func:`save_analysis`.
+
+    Legacy JSON analyses are read as well. Only uncompressed analyses can be
+    memory-mapped.
+    """
+    with path.open("rb") as file_pointer:
+        magic = file_pointer.read(6)
+    if magic == b"\x93NUMPY":
+        return numpy.load(path, mmap_mode="r" if mmap else None)
+    elif magic.startswith(b"PK"):
+        with numpy.load(path) as archive:
+            return archive["analysis"]
+    return numpy.array(json.loads(path.read_text()))
+
+
+def save_analysis(path: Path, array: numpy.ndarray, compressed: bool = False) -> None:
+    """
+    Save an analysis array as float32 NPY, or as a compressed NPZ archive.
+    """
+    array = numpy.asarray(array, dtype=numpy.float32)
+    with path.open("wb") as file_pointer:
+        if compressed:
+            numpy.savez_compressed(file_pointer, analysis=array)
+        else:
+            numpy.save(file_pointer, array)
+
+
+def load_entries(path: Path) -> numpy.ndarray:
+    """
+    Load partitioned entries saved via :py:func:`save_entries` as a record
+    array of ``AGGREGATE_DTYPE``.
+
+    Legacy JSON entries are converted on load.
+    """
+    with path.open("rb") as file_pointer:
+        magic = file_pointer.read(6)
+    if magic == b"\x93NUMPY":
+        return numpy.load(path)
+    return aggregates_to_array(json.loads(path.read_text())["entries"])
+
+
+def save_entries(path: Path, array: numpy.ndarray) -> None:
+    """
+    Save partitioned entries as a record array of ``AGGREGATE_DTYPE``.
+    """
+    with path.open("wb") as file_pointer:
+        numpy.save(file_pointer, array.astype(AGGREGATE_DTYPE, copy=False))
+
+
 def partition(
     *,
     raw_analysis: numpy.ndarray,
@@ -286,25 +472,18 @@ def partition(
     sample_rate: int = 48000,
     frame_size: int = 512,
 ) -> Sequence[tuple[int, int, Aggregate]]:
-    if whitened_analysis is None:
-        whitened_analysis = raw_analysis
-    frame_ms = frame_size / sample_rate * 1000
-    indices_per_hop = math.ceil(hop_ms / frame_ms)
-    indices_per_entry = math.ceil(length_ms / frame_ms)
-    frame_count = raw_analysis.shape[0]
-    entries: list[tuple[int, int, Aggregate]] = []
-    for start_index in range(0, frame_count, indices_per_hop):
-        stop_index = start_index + indices_per_entry
-        if stop_index > frame_count:
-            break
-        entries.append(
-            (
-                start_index * frame_size,
-                (stop_index - start_index) * frame_size,
-                aggregate(raw_analysis[start_index:stop_index]),
-            )
-        )
-    return entries
+    """
+    Aggregate every window of the raw analysis.
+
+    ``whitened_analysis`` is accepted for compatibility but not aggregated, as
+    queries aggregate raw analyses only.
+    """
+    return AnalysisSums(raw_analysis).partition(
+        hop_ms=hop_ms,
+        length_ms=length_ms,
+        sample_rate=sample_rate,
+        frame_size=frame_size,
+    )
 
 
 def aggregate(
@@ -375,6 +554,516 @@ def aggregate(
     return data
 
 
+class _PrefixSums:
+    """
+    Cumulative sums and sums of squares over the rows of an array.
+
+    Rows are shifted by ``shift`` (typically their mean) before accumulating,
+    which keeps the variance calculation numerically stable over long
+    analyses.
+    """
+
+    def __init__(self, array: numpy.ndarray, shift: numpy.ndarray | float) -> None:
+        self.shift = shift
+        shifted = array - shift
+        self.sums = numpy.zeros((array.shape[0] + 1, *array.shape[1:]))
+        self.squares = numpy.zeros((array.shape[0] + 1, *array.shape[1:]))
+        numpy.cumsum(shifted, axis=0, out=self.sums[1:])
+        numpy.cumsum(shifted * shifted, axis=0, out=self.squares[1:])
+
+    def statistics(
+        self, starts: numpy.ndarray, stops: numpy.ndarray, counts: numpy.ndarray
+    ) -> tuple[numpy.ndarray, numpy.ndarray]:
+        """
+        Calculate the means and standard deviations of every window.
+        """
+        counts = counts.reshape(-1, *(1,) * (self.sums.ndim - 1))
+        sums = (self.sums[stops] - self.sums[starts]) / counts
+        squares = (self.squares[stops] - self.squares[starts]) / counts
+        return self.shift + sums, numpy.sqrt(numpy.maximum(squares - sums**2, 0.0))
+
+
+class AnalysisSums:
+    """
+    Prefix sums over a raw (and optionally whitened) analysis.
+
+    Aggregates any number of windows as whole-array operations, rather than
+    re-slicing the analysis once per window.
+    """
+
+    def __init__(
+        self,
+        raw_analysis: numpy.ndarray,
+        whitened_analysis: numpy.ndarray | None = None,
+    ) -> None:
+        if raw_analysis.shape[-1] != SCSYNTH_ANALYSIS_SIZE:
+            raise ValueError(raw_analysis.shape)
+        if whitened_analysis is None:
+            whitened_analysis = raw_analysis
+        if whitened_analysis.shape != raw_analysis.shape:
+            raise ValueError(whitened_analysis.shape)
+        self.raw_analysis = raw_analysis
+        self.whitened_analysis = whitened_analysis
+        self.frame_count = raw_analysis.shape[0]
+        # Non-finite values poison every subsequent prefix sum
+        self.is_finite = bool(
+            numpy.isfinite(raw_analysis).all()
+            and numpy.isfinite(whitened_analysis).all()
+        )
+        if not self.is_finite or not self.frame_count:
+            return
+        voicing = numpy.array(raw_analysis[:, 3], dtype=numpy.bool_)
+        self.voiced_counts = numpy.zeros(self.frame_count + 1, dtype=numpy.int64)
+        numpy.cumsum(voicing, out=self.voiced_counts[1:])
+        # Onsets are binary, so unshifted sums stay exact
+        self.onset_sums = numpy.zeros(self.frame_count + 1)
+        numpy.cumsum(raw_analysis[:, 4], out=self.onset_sums[1:])
+        self.raw = _PrefixSums(raw_analysis, raw_analysis.mean(axis=0))
+        self.whitened = _PrefixSums(whitened_analysis, whitened_analysis.mean(axis=0))
+        # Unvoiced frames are filled with the shift itself, so they contribute
+        # exactly nothing to the masked sums
+        self.raw_f0 = self._mask_f0(raw_analysis[:, 2], voicing)
+        self.whitened_f0 = self._mask_f0(whitened_analysis[:, 2], voicing)
+
+    @staticmethod
+    def _mask_f0(f0: numpy.ndarray, voicing: numpy.ndarray) -> _PrefixSums:
+        shift = float(f0[voicing].mean()) if voicing.any() else 0.0
+        return _PrefixSums(numpy.where(voicing, f0, shift), shift)
+
+    def aggregate_columns(
+        self, starts: numpy.ndarray, stops: numpy.ndarray
+    ) -> dict[ScsynthFeatures, numpy.ndarray]:
+        """
+        Aggregate the windows ``[start, stop)`` of the analysis, by feature.
+
+        Equivalent to calling :py:func:`aggregate` on each window, to within
+        floating-point rounding.
+        """
+        starts = numpy.asarray(starts, dtype=numpy.int64)
+        stops = numpy.asarray(stops, dtype=numpy.int64)
+        if not self.is_finite or not self.frame_count:
+            aggregates = [
+                aggregate(
+                    self.raw_analysis[start:stop], self.whitened_analysis[start:stop]
+                )
+                for start, stop in zip(starts.tolist(), stops.tolist())
+            ]
+            return {
+                feature: numpy.array(
+                    [cast(dict, aggregate_)[feature] for aggregate_ in aggregates],
+                    dtype=numpy.float64,
+                ).reshape(len(aggregates), slice_.stop - slice_.start)
+                for feature, slice_ in AGGREGATE_LAYOUT.items()
+            }
+        counts = (stops - starts).astype(numpy.float64)
+        voiced_counts = self.voiced_counts[stops] - self.voiced_counts[starts]
+        # The median of a binary flag is truthy when at least half are set
+        is_voiced = (voiced_counts * 2) >= (stops - starts)
+        # Guard against dividing by zero, those windows are discarded anyway
+        f0_counts = numpy.maximum(voiced_counts, 1).astype(numpy.float64)
+        raw_means, raw_stds = self.raw.statistics(starts, stops, counts)
+        whitened_means, whitened_stds = self.whitened.statistics(starts, stops, counts)
+        raw_f0_means, raw_f0_stds = self.raw_f0.statistics(starts, stops, f0_counts)
+        whitened_f0_means, whitened_f0_stds = self.whitened_f0.statistics(
+            starts, stops, f0_counts
+        )
+        raw_onsets = (self.onset_sums[stops] - self.onset_sums[starts]) / counts
+        columns = {
+            ScsynthFeatures.IS_VOICED: is_voiced.astype(numpy.float64),
+            ScsynthFeatures.RAW_CENTROID_MEAN: raw_means[:, 5],
+            ScsynthFeatures.RAW_CENTROID_STD: raw_stds[:, 5],
+            ScsynthFeatures.RAW_CHROMA: raw_means[:, -12:],
+            ScsynthFeatures.RAW_F0_MEAN: numpy.where(is_voiced, raw_f0_means, -1.0),
+            ScsynthFeatures.RAW_F0_STD: numpy.where(is_voiced, raw_f0_stds, 0.0),
+            ScsynthFeatures.RAW_FLATNESS_MEAN: raw_means[:, 6],
+            ScsynthFeatures.RAW_FLATNESS_STD: raw_stds[:, 6],
+            ScsynthFeatures.RAW_MFCC: raw_means[:, 8:-12],
+            ScsynthFeatures.RAW_ONSETS: raw_onsets,
+            ScsynthFeatures.RAW_PEAK_MEAN: raw_means[:, 0],
+            ScsynthFeatures.RAW_PEAK_STD: raw_stds[:, 0],
+            ScsynthFeatures.RAW_RMS_MEAN: raw_means[:, 1],
+            ScsynthFeatures.RAW_RMS_STD: raw_stds[:, 1],
+            ScsynthFeatures.RAW_ROLLOFF_MEAN: raw_means[:, 7],
+            ScsynthFeatures.RAW_ROLLOFF_STD: raw_stds[:, 7],
+            ScsynthFeatures.WHITENED_CENTROID_MEAN: whitened_means[:, 5],
+            ScsynthFeatures.WHITENED_CENTROID_STD: whitened_stds[:, 5],
+            ScsynthFeatures.WHITENED_CHROMA: whitened_means[:, -12:],
+            ScsynthFeatures.WHITENED_F0_MEAN: numpy.where(
+                is_voiced, whitened_f0_means, -1.0
+            ),
+            ScsynthFeatures.WHITENED_F0_STD: numpy.where(
+                is_voiced, whitened_f0_stds, 0.0
+            ),
+            ScsynthFeatures.WHITENED_FLATNESS_MEAN: whitened_means[:, 6],
+            ScsynthFeatures.WHITENED_FLATNESS_STD: whitened_stds[:, 6],
+            ScsynthFeatures.WHITENED_MFCC: whitened_means[:, 8:-12],
+            ScsynthFeatures.WHITENED_ONSETS: raw_onsets**0.25,
+            ScsynthFeatures.WHITENED_PEAK_MEAN: whitened_means[:, 0],
+            ScsynthFeatures.WHITENED_PEAK_STD: whitened_stds[:, 0],
+            ScsynthFeatures.WHITENED_RMS_MEAN: whitened_means[:, 1],
+            ScsynthFeatures.WHITENED_RMS_STD: whitened_stds[:, 1],
+            ScsynthFeatures.WHITENED_ROLLOFF_MEAN: whitened_means[:, 7],
+            ScsynthFeatures.WHITENED_ROLLOFF_STD: whitened_stds[:, 7],
+        }
+        return {
+            feature: columns[feature].reshape(len(starts), slice_.stop - slice_.start)
+            for feature, slice_ in AGGREGATE_LAYOUT.items()
+        }
+
+    def aggregate(self, starts: numpy.ndarray, stops: numpy.ndarray) -> list[Aggregate]:
+        """
+        Aggregate the windows ``[start, stop)`` of the analysis, by window.
+        """
+        return columns_to_aggregates(self.aggregate_columns(starts, stops))
+
+    def aggregate_array(
+        self, starts: numpy.ndarray, stops: numpy.ndarray
+    ) -> numpy.ndarray:
+        """
+        Aggregate the windows ``[start, stop)`` of the analysis, as one array row
+        per window laid out according to ``AGGREGATE_LAYOUT``.
+        """
+        return numpy.concatenate(
+            list(self.aggregate_columns(starts, stops).values()), axis=1
+        )
+
+    def _windows(
+        self,
+        resolutions: Sequence[tuple[int, int]],
+        sample_rate: int = 48000,
+        frame_size: int = 512,
+    ) -> dict[tuple[int, int], tuple[numpy.ndarray, int]]:
+        frame_ms = frame_size / sample_rate * 1000
+        windows: dict[tuple[int, int], tuple[numpy.ndarray, int]] = {}
+        for hop_ms, length_ms in resolutions:
+            indices_per_hop = math.ceil(hop_ms / frame_ms)
+            indices_per_entry = math.ceil(length_ms / frame_ms)
+            starts = numpy.arange(
+                0, self.frame_count - indices_per_entry + 1, indices_per_hop
+            )
+            windows[hop_ms, length_ms] = (starts, indices_per_entry)
+        return windows
+
+    def partition(
+        self,
+        *,
+        hop_ms: int,
+        length_ms: int,
+        sample_rate: int = 48000,
+        frame_size: int = 512,
+    ) -> Sequence[tuple[int, int, Aggregate]]:
+        return self.partition_many(
+            resolutions=[(hop_ms, length_ms)],
+            sample_rate=sample_rate,
+            frame_size=frame_size,
+        )[hop_ms, length_ms]
+
+    def partition_many(
+        self,
+        *,
+        resolutions: Sequence[tuple[int, int]],
+        sample_rate: int = 48000,
+        frame_size: int = 512,
+    ) -> dict[tuple[int, int], Sequence[tuple[int, int, Aggregate]]]:
+        """
+        Partition the analysis at every ``(hop_ms, length_ms)`` resolution.
+
+        The windows of every resolution are aggregated together in a single
+        pass over the shared prefix sums.
+        """
+        return {
+            key: array_to_aggregates(array)
+            for key, array in self.partition_many_arrays(
+                resolutions=resolutions,
+                sample_rate=sample_rate,
+                frame_size=frame_size,
+                dtype=numpy.float64,
+            ).items()
+        }
+
+    def partition_many_arrays(
+        self,
+        *,
+        resolutions: Sequence[tuple[int, int]],
+        sample_rate: int = 48000,
+        frame_size: int = 512,
+        dtype: numpy.dtype | type = numpy.float32,
+    ) -> dict[tuple[int, int], numpy.ndarray]:
+        """
+        Partition the analysis at every ``(hop_ms, length_ms)`` resolution, as
+        record arrays of ``AGGREGATE_DTYPE``.
+        """
+        windows = self._windows(resolutions, sample_rate, frame_size)
+        empty = numpy.zeros(0, dtype=numpy.intp)
+        features = self.aggregate_array(
+            numpy.concatenate([empty, *(starts for starts, _ in windows.values())]),
+            numpy.concatenate(
+                [empty, *(starts + count for starts, count in windows.values())]
+            ),
+        )
+        arrays: dict[tuple[int, int], numpy.ndarray] = {}
+        offset = 0
+        for key, (starts, count) in windows.items():
+            array = numpy.zeros(len(starts), dtype=get_aggregate_dtype(dtype))
+            array["start_frame"] = starts * frame_size
+            array["frame_count"] = count * frame_size
+            array["features"] = features[offset : offset + len(starts)]
+            arrays[key] = array
+            offset += len(starts)
+        return arrays
+
+
+# Analysis columns each raw feature aggregates, to derive whitened features
+RAW_FEATURE_COLUMNS: dict[ScsynthFeatures, slice] = {
+    ScsynthFeatures.RAW_CENTROID_MEAN: slice(5, 6),
+    ScsynthFeatures.RAW_CENTROID_STD: slice(5, 6),
+    ScsynthFeatures.RAW_CHROMA: slice(50, 62),
+    ScsynthFeatures.RAW_F0_MEAN: slice(2, 3),
+    ScsynthFeatures.RAW_F0_STD: slice(2, 3),
+    ScsynthFeatures.RAW_FLATNESS_MEAN: slice(6, 7),
+    ScsynthFeatures.RAW_FLATNESS_STD: slice(6, 7),
+    ScsynthFeatures.RAW_MFCC: slice(8, 50),
+    ScsynthFeatures.RAW_PEAK_MEAN: slice(0, 1),
+    ScsynthFeatures.RAW_PEAK_STD: slice(0, 1),
+    ScsynthFeatures.RAW_RMS_MEAN: slice(1, 2),
+    ScsynthFeatures.RAW_RMS_STD: slice(1, 2),
+    ScsynthFeatures.RAW_ROLLOFF_MEAN: slice(7, 8),
+    ScsynthFeatures.RAW_ROLLOFF_STD: slice(7, 8),
+}
+
+
+def derive_whitened_features(
+    features: numpy.ndarray, scaler: StandardScaler
+) -> numpy.ndarray:
+    """
+    Derive the whitened columns of aggregate rows from their raw columns.
+
+    Whitening is a per-column affine transform, so the means and standard
+    deviations of whitened frames follow exactly from those of raw frames.
+    Whitened onsets are already derived from raw onsets, and are kept as-is.
+    """
+    features = numpy.array(features, copy=True)
+    is_voiced = features[:, AGGREGATE_LAYOUT[ScsynthFeatures.IS_VOICED]] > 0
+    for raw_feature, columns in RAW_FEATURE_COLUMNS.items():
+        raw = features[:, AGGREGATE_LAYOUT[raw_feature]]
+        scale = scaler.scale_[columns]
+        if raw_feature.endswith(":std"):
+            whitened = raw / scale
+        else:
+            whitened = (raw - scaler.mean_[columns]) / scale
+        if raw_feature == ScsynthFeatures.RAW_F0_MEAN:
+            whitened = numpy.where(is_voiced, whitened, -1.0)
+        elif raw_feature == ScsynthFeatures.RAW_F0_STD:
+            whitened = numpy.where(is_voiced, whitened, 0.0)
+        whitened_feature = ScsynthFeatures("w:" + raw_feature.removeprefix("r:"))
+        features[:, AGGREGATE_LAYOUT[whitened_feature]] = whitened
+    return features
+
+
+def derive_whitened_entries(
+    array: numpy.ndarray, scaler: StandardScaler
+) -> numpy.ndarray:
+    """
+    Derive the whitened features of a record array of aggregates.
+    """
+    array = array.copy()
+    array["features"] = derive_whitened_features(array["features"], scaler)
+    return array
+
+
+def derive_whitened_aggregate(
+    aggregate: Aggregate, scaler: StandardScaler
+) -> Aggregate:
+    features = derive_whitened_features(aggregate_to_row(aggregate)[None], scaler)
+    return columns_to_aggregates(
+        {feature: features[:, slice_] for feature, slice_ in AGGREGATE_LAYOUT.items()}
+    )[0]
+
+
+def get_aggregate_dtype(dtype: numpy.dtype | type = numpy.float32) -> numpy.dtype:
+    """
+    Get the record dtype of an aggregate array, with features of ``dtype``.
+    """
+    if numpy.dtype(dtype) == numpy.float32:
+        return AGGREGATE_DTYPE
+    return numpy.dtype(
+        [
+            ("start_frame", numpy.int64),
+            ("frame_count", numpy.int64),
+            ("features", dtype, (AGGREGATE_SIZE,)),
+        ]
+    )
+
+
+def aggregate_to_row(aggregate: Aggregate) -> numpy.ndarray:
+    """
+    Lay out an aggregate as a single float64 row of ``AGGREGATE_SIZE`` columns.
+    """
+    row = numpy.empty(AGGREGATE_SIZE, dtype=numpy.float64)
+    for feature, slice_ in AGGREGATE_LAYOUT.items():
+        row[slice_] = cast(dict, aggregate)[feature]
+    return row
+
+
+def aggregates_to_array(
+    entries: Sequence[tuple[int, int, Aggregate]],
+    dtype: numpy.dtype | type = numpy.float32,
+) -> numpy.ndarray:
+    """
+    Convert ``(start_frame, frame_count, aggregate)`` entries to a record array.
+    """
+    array = numpy.zeros(len(entries), dtype=get_aggregate_dtype(dtype))
+    for i, (start_frame, frame_count, aggregate_) in enumerate(entries):
+        array[i] = (start_frame, frame_count, aggregate_to_row(aggregate_))
+    return array
+
+
+def columns_to_aggregates(
+    columns: dict[ScsynthFeatures, numpy.ndarray]
+) -> list[Aggregate]:
+    lists = {
+        feature.value: (
+            column.astype(numpy.bool_)[:, 0].tolist()
+            if feature == ScsynthFeatures.IS_VOICED
+            else column.tolist() if column.shape[1] > 1 else column[:, 0].tolist()
+        )
+        for feature, column in columns.items()
+    }
+    return [cast(Aggregate, dict(zip(lists, row))) for row in zip(*lists.values())]
+
+
+def array_to_aggregates(array: numpy.ndarray) -> list[tuple[int, int, Aggregate]]:
+    """
+    Convert a record array back to ``(start_frame, frame_count, aggregate)``
+    entries.
+    """
+    features = numpy.asarray(array["features"], dtype=numpy.float64)
+    aggregates = columns_to_aggregates(
+        {feature: features[:, slice_] for feature, slice_ in AGGREGATE_LAYOUT.items()}
+    )
+    return list(
+        zip(array["start_frame"].tolist(), array["frame_count"].tolist(), aggregates)
+    )
+
+
+def partition_many(
+    *,
+    raw_analysis: numpy.ndarray,
+    whitened_analysis: numpy.ndarray | None = None,
+    hops: Sequence[int],
+    lengths: Sequence[int],
+    sample_rate: int = 48000,
+    frame_size: int = 512,
+) -> dict[tuple[int, int], Sequence[tuple[int, int, Aggregate]]]:
+    """
+    Aggregate every window of the raw analysis at every resolution, ignoring
+    ``whitened_analysis`` as :py:func:`partition` does.
+    """
+    return AnalysisSums(raw_analysis).partition_many(
+        resolutions=list(product(hops, lengths)),
+        sample_rate=sample_rate,
+        frame_size=frame_size,
+    )
+
+
+@dataclasses.dataclass(frozen=True)
+class IndexPlan:
+    """
+    Everything derived from an index's config, computed once per index.
+    """
+
+    alias: str | None
+    features: tuple[ScsynthFeatures, ...]
+    columns: numpy.ndarray
+    collection_name: str
+    pitched: bool
+    index_type: IndexType = "IVF_FLAT"
+    index_params: dict[str, Any] = dataclasses.field(default_factory=dict)
+    metric_type: MetricType = "L2"
+    search_params: dict[str, Any] = dataclasses.field(default_factory=dict)
+
+    @classmethod
+    def from_config(cls, index_config: ScsynthIndexConfig, prefix: str) -> "IndexPlan":
+        features = tuple(sorted(index_config["features"]))
+        digest = md5("_".join(features).encode()).hexdigest()
+        return cls(
+            alias=index_config["alias"],
+            features=features,
+            columns=get_feature_columns(features),
+            collection_name=prefix + "_" + digest,
+            pitched=index_config["pitched"],
+            index_type=index_config.get("index_type", "IVF_FLAT"),
+            index_params=index_config.get("index_params", {}),
+            metric_type=index_config.get("metric_type", "L2"),
+            search_params=index_config.get("search_params", {}),
+        )
+
+    @property
+    def dimension(self) -> int:
+        return len(self.columns)
+
+    @property
+    def spec(self) -> CollectionSpec:
+        return CollectionSpec(
+            name=self.collection_name,
+            dimension=self.dimension,
+            scalar_fields=(
+                ("f0", "float32"),
+                ("rms", "float32"),
+                ("is_voiced", "bool"),
+            ),
+            index_type=self.index_type,
+            index_params=self.index_params,
+            metric_type=self.metric_type,
+            search_params=self.search_params,
+        )
+
+    def vector(self, aggregate: Aggregate) -> tuple[float, ...]:
+        return tuple(aggregate_to_row(aggregate)[self.columns].tolist())
+
+    def vectors(self, array: numpy.ndarray) -> numpy.ndarray:
+        return array["features"][:, self.columns]
+
+
+# (prefix, indices, plans) of the config the plans were compiled from
+_index_plans: (
+    tuple[str, list[ScsynthIndexConfig], dict[str | None, IndexPlan]] | None
+) = None
+
+
+def get_index_plans() -> dict[str | None, IndexPlan]:
+    """
+    Get the plans of every configured index, keyed by alias.
+
+    Plans are compiled on first use and recompiled only when the configured
+    collection prefix or index list is replaced.
+    """
+    global _index_plans
+    prefix = config.analysis.scsynth_collection_prefix
+    indices = config.analysis.scsynth_indices
+    if (
+        _index_plans is None
+        or _index_plans[0] != prefix
+        or _index_plans[1] is not indices
+    ):
+        _index_plans = (
+            prefix,
+            indices,
+            {
+                index_config["alias"]: IndexPlan.from_config(index_config, prefix)
+                for index_config in indices
+            },
+        )
+    return _index_plans[2]
+
+
+def get_index_plan(index_alias: str | None) -> IndexPlan:
+    try:
+        return get_index_plans()[index_alias]
+    except KeyError as e:
+        raise ValueError from e
+
+
 def get_index_config(index_alias: str | None) -> ScsynthIndexConfig:
     try:
         return [
@@ -386,171 +1075,105 @@ def get_index_config(index_alias: str | None) -> ScsynthIndexConfig:
         raise ValueError from e
 
 
+def get_feature_columns(features: Sequence[str]) -> numpy.ndarray:
+    """
+    Get the ``AGGREGATE_LAYOUT`` columns making up a vector of ``features``.
+    """
+    columns: list[int] = []
+    for feature in sorted(features):
+        if feature == ScsynthFeatures.RAW_MFCC_13:
+            slice_ = AGGREGATE_LAYOUT[ScsynthFeatures.RAW_MFCC]
+            slice_ = slice(slice_.start, slice_.start + 13)
+        elif feature == ScsynthFeatures.WHITENED_MFCC_13:
+            slice_ = AGGREGATE_LAYOUT[ScsynthFeatures.WHITENED_MFCC]
+            slice_ = slice(slice_.start, slice_.start + 13)
+        elif feature == ScsynthFeatures.WHITENED_ONSETS:
+            # Vectors have always carried the raw onsets here
+            slice_ = AGGREGATE_LAYOUT[ScsynthFeatures.RAW_ONSETS]
+        else:
+            slice_ = AGGREGATE_LAYOUT[ScsynthFeatures(feature)]
+        columns.extend(range(slice_.start, slice_.stop))
+    return numpy.array(columns, dtype=numpy.intp)
+
+
 def aggregate_to_vector(
     aggregate: Aggregate, index_alias: str | None
 ) -> tuple[float, ...]:
-    # This is really annoying, but MyPy cannot match a string variable to a
-    # TypedDict key
-    vector: list[float] = []
-    for feature in sorted(get_index_config(index_alias)["features"]):
-        if feature == ScsynthFeatures.RAW_CHROMA:
-            vector.extend(aggregate["r:chroma"])
-        elif feature == ScsynthFeatures.WHITENED_CHROMA:
-            vector.extend(aggregate["w:chroma"])
-        elif feature == ScsynthFeatures.RAW_MFCC:
-            vector.extend(aggregate["r:mfcc"])
-        elif feature == ScsynthFeatures.WHITENED_MFCC:
-            vector.extend(aggregate["w:mfcc"])
-        elif feature == "r:mfcc:13":
-            vector.extend(aggregate["r:mfcc"][:13])
-        elif feature == "w:mfcc:13":
-            vector.extend(aggregate["w:mfcc"][:13])
-        elif feature == ScsynthFeatures.IS_VOICED:
-            vector.append(aggregate["is_voiced"])
-        elif feature == ScsynthFeatures.RAW_CENTROID_MEAN:
-            vector.append(aggregate["r:centroid:mean"])
-        elif feature == ScsynthFeatures.RAW_CENTROID_STD:
-            vector.append(aggregate["r:centroid:std"])
-        elif feature == ScsynthFeatures.RAW_F0_MEAN:
-            vector.append(aggregate["r:f0:mean"])
-        elif feature == ScsynthFeatures.RAW_F0_STD:
-            vector.append(aggregate["r:f0:std"])
-        elif feature == ScsynthFeatures.RAW_FLATNESS_MEAN:
-            vector.append(aggregate["r:flatness:mean"])
-        elif feature == ScsynthFeatures.RAW_FLATNESS_STD:
-            vector.append(aggregate["r:flatness:std"])
-        elif feature == ScsynthFeatures.RAW_ONSETS:
-            vector.append(aggregate["r:onsets"])
-        elif feature == ScsynthFeatures.RAW_PEAK_MEAN:
-            vector.append(aggregate["r:peak:mean"])
-        elif feature == ScsynthFeatures.RAW_PEAK_STD:
-            vector.append(aggregate["r:peak:std"])
-        elif feature == ScsynthFeatures.RAW_RMS_MEAN:
-            vector.append(aggregate["r:rms:mean"])
-        elif feature == ScsynthFeatures.RAW_RMS_STD:
-            vector.append(aggregate["r:rms:std"])
-        elif feature == ScsynthFeatures.RAW_ROLLOFF_MEAN:
-            vector.append(aggregate["r:rolloff:mean"])
-        elif feature == ScsynthFeatures.RAW_ROLLOFF_STD:
-            vector.append(aggregate["r:rolloff:std"])
-        elif feature == ScsynthFeatures.WHITENED_CENTROID_MEAN:
-            vector.append(aggregate["w:centroid:mean"])
-        elif feature == ScsynthFeatures.WHITENED_CENTROID_STD:
-            vector.append(aggregate["w:centroid:std"])
-        elif feature == ScsynthFeatures.WHITENED_F0_MEAN:
-            vector.append(aggregate["w:f0:mean"])
-        elif feature == ScsynthFeatures.WHITENED_F0_STD:
-            vector.append(aggregate["w:f0:std"])
-        elif feature == ScsynthFeatures.WHITENED_FLATNESS_MEAN:
-            vector.append(aggregate["w:flatness:mean"])
-        elif feature == ScsynthFeatures.WHITENED_FLATNESS_STD:
-            vector.append(aggregate["w:flatness:std"])
-        elif feature == ScsynthFeatures.WHITENED_ONSETS:
-            vector.append(aggregate["r:onsets"])
-        elif feature == ScsynthFeatures.WHITENED_PEAK_MEAN:
-            vector.append(aggregate["w:peak:mean"])
-        elif feature == ScsynthFeatures.WHITENED_PEAK_STD:
-            vector.append(aggregate["w:peak:std"])
-        elif feature == ScsynthFeatures.WHITENED_RMS_MEAN:
-            vector.append(aggregate["w:rms:mean"])
-        elif feature == ScsynthFeatures.WHITENED_RMS_STD:
-            vector.append(aggregate["w:rms:std"])
-        elif feature == ScsynthFeatures.WHITENED_ROLLOFF_MEAN:
-            vector.append(aggregate["w:rolloff:mean"])
-        elif feature == ScsynthFeatures.WHITENED_ROLLOFF_STD:
-            vector.append(aggregate["w:rolloff:std"])
-    return tuple(vector)
+    return get_index_plan(index_alias).vector(aggregate)
+
+
+def aggregate_array_to_vectors(
+    array: numpy.ndarray, index_alias: str | None
+) -> numpy.ndarray:
+    """
+    Gather the vectors of ``index_alias`` from a record array of aggregates.
+    """
+    return get_index_plan(index_alias).vectors(array)
 
 
 def get_vector_size(index_alias: str | None = None) -> int:
-    size = 0
-    for feature in sorted(get_index_config(index_alias)["features"]):
-        if feature in (ScsynthFeatures.RAW_MFCC, ScsynthFeatures.WHITENED_MFCC):
-            size += 42
-        elif feature in (ScsynthFeatures.RAW_MFCC_13, ScsynthFeatures.WHITENED_MFCC_13):
-            size += 13
-        elif feature in (ScsynthFeatures.RAW_CHROMA, ScsynthFeatures.WHITENED_CHROMA):
-            size += 12
-        else:
-            size += 1
-    return size
-
-
-def create_scsynth_collection(index_alias: str | None = None) -> Collection:
-    collection = Collection(
-        name=get_scsynth_collection_name(index_alias),
-        schema=CollectionSchema(
-            auto_id=False,
-            fields=[
-                FieldSchema(
-                    name="id", dtype=DataType.VARCHAR, is_primary=True, max_length=256
-                ),
-                FieldSchema(name="digest", dtype=DataType.VARCHAR, max_length=256),
-                FieldSchema(name="start_frame", dtype=DataType.INT64),
-                FieldSchema(name="frame_count", dtype=DataType.INT64),
-                FieldSchema(name="f0", dtype=DataType.FLOAT),
-                FieldSchema(name="rms", dtype=DataType.FLOAT),
-                FieldSchema(name="is_voiced", dtype=DataType.BOOL),
-                FieldSchema(
-                    name="vector",
-                    dtype=DataType.FLOAT_VECTOR,
-                    dim=get_vector_size(index_alias),
-                ),
-            ],
-        ),
-    )
-    collection.create_index(
-        field_name="vector",
-        index_params=dict(
-            metric_type="L2", index_type="IVF_FLAT", params=dict(nlist=1024)
-        ),
-    )
-    return collection
+    return get_index_plan(index_alias).dimension
+
+
+def create_scsynth_collection(index_alias: str | None = None) -> None:
+    get_vector_store().create_collection(get_index_plan(index_alias).spec)
 
 
 def get_scsynth_collection(index_alias: str | None = None) -> Collection:
-    collection_name = get_scsynth_collection_name(index_alias)
-    if not utility.has_collection(collection_name):
-        raise ValueError
-    return Collection(name=collection_name)
+    return get_collection(get_scsynth_collection_name(index_alias))
 
 
 def get_scsynth_collection_name(index_alias: str | None) -> str:
-    features = sorted(get_index_config(index_alias)["features"])
-    digest = md5("_".join(features).encode()).hexdigest()
-    return config.analysis.scsynth_collection_prefix + "_" + digest
+    return get_index_plan(index_alias).collection_name
 
 
 def insert_scsynth_entries(
     digest: str,
-    entries: Sequence[tuple[int, int, Aggregate]],
-    partition_name: str | None = None,
+    entries: numpy.ndarray | Sequence[tuple[int, int, Aggregate]],
+    *,
+    hop_ms: int,
+    length_ms: int,
 ) -> None:
-    stride = 1024 * 16
-    for index_alias in [
-        index_config["alias"] for index_config in config.analysis.scsynth_indices
-    ]:
-        collection = get_scsynth_collection(index_alias)
-        if not utility.has_partition(collection.name, digest):
-            collection.create_partition(digest)
-        for i in range(0, len(entries), stride):
-            data: dict[str, list] = {}
-            for start_frame, frame_count, aggregate in entries[i : i + stride]:
-                data.setdefault("id", []).append(
-                    f"{digest}-{start_frame}-{frame_count}"
-                )
-                data.setdefault("digest", []).append(digest)
-                data.setdefault("start_frame", []).append(start_frame)
-                data.setdefault("frame_count", []).append(frame_count)
-                data.setdefault("f0", []).append(numpy.float32(aggregate["r:f0:mean"]))
-                data.setdefault("rms", []).append(
-                    numpy.float32(aggregate["r:rms:mean"])
-                )
-                data.setdefault("is_voiced", []).append(aggregate["is_voiced"])
-                data.setdefault("vector", []).append(
-                    aggregate_to_vector(aggregate, index_alias)
-                )
-            collection.insert(data=list(data.values()), partition_name=partition_name)
+    """
+    Insert aggregate entries partitioned with ``hop_ms`` and ``length_ms``,
+    either as a record array of ``AGGREGATE_DTYPE`` or as
+    ``(start_frame, frame_count, aggregate)`` tuples.
+
+    Every field is passed to the vector store as a column, which batches it.
+    Every index's vectors are gathered up front, then inserted into each
+    index's collection concurrently.
+    """
+    if not isinstance(entries, numpy.ndarray):
+        entries = aggregates_to_array(entries)
+    features = entries["features"]
+    scalars = {
+        "f0": features[:, AGGREGATE_LAYOUT[ScsynthFeatures.RAW_F0_MEAN].start],
+        "rms": features[:, AGGREGATE_LAYOUT[ScsynthFeatures.RAW_RMS_MEAN].start],
+        "is_voiced": features[:, AGGREGATE_LAYOUT[ScsynthFeatures.IS_VOICED].start] > 0,
+    }
+    index_plans = list(get_index_plans().values())
+    vectors = [features[:, index_plan.columns] for index_plan in index_plans]
+    store = get_vector_store()
+
+    def insert(index_plan: IndexPlan, vectors: numpy.ndarray) -> None:
+        store.insert(
+            index_plan.spec,
+            digest=digest,
+            start_frames=entries["start_frame"],
+            frame_counts=entries["frame_count"],
+            hop_ms=hop_ms,
+            length_ms=length_ms,
+            vectors=vectors,
+            scalars=scalars,
+        )
+
+    with ThreadPoolExecutor(
+        max_workers=max(
+            min(config.analysis.scsynth_insert_concurrency, len(vectors)), 1
+        )
+    ) as executor:
+        # Consume the results, re-raising any insert's exception
+        list(executor.map(insert, index_plans, vectors))
 
 
 def query_scsynth_collection(
@@ -558,53 +1181,81 @@ def query_scsynth_collection(
     *,
     index_alias: str | None = None,
     is_voiced: bool | None = None,
+    lengths: Sequence[int] | None = None,
     limit: int = 10,
     partition_names: Sequence[str] | None = None,
+    search_params: dict[str, Any] | None = None,
 ) -> Sequence[Entry]:
-    collection = get_scsynth_collection(index_alias)
-    expr: str = ""
-    if is_voiced is not None:
-        expr = "is_voiced == true" if is_voiced else "is_voiced == false"
-    entries: list[Entry] = []
-    kwargs = dict(
-        anns_field="vector",
-        consistency_level=2,
-        data=[list(vector)],
-        expr=expr,
+    return query_scsynth_collection_many(
+        [vector],
+        index_alias=index_alias,
+        is_voiced=[is_voiced],
+        lengths=[lengths],
         limit=limit,
-        output_fields=["digest", "start_frame", "frame_count"],
-        param={"metric_type": "L2", "params": {"nprobe": 1}},
-    )
-    if expr is not None:
-        kwargs["expr"] = expr
-    if partition_names:
-        kwargs["partition_names"] = partition_names
-    for x in collection.search(**kwargs)[0]:
-        entries.append(
-            dict(
-                digest=x.fields["digest"],
-                start_frame=x.fields["start_frame"],
-                frame_count=x.fields["frame_count"],
-                distance=round(x.distance, 3),
+        partition_names=[partition_names],
+        search_params=search_params,
+    )[0]
+
+
+def query_scsynth_collection_many(
+    vectors: Sequence[Sequence[float]] | numpy.ndarray,
+    *,
+    index_alias: str | None = None,
+    is_voiced: Sequence[bool | None] | None = None,
+    lengths: Sequence[Sequence[int] | None] | None = None,
+    limit: int = 10,
+    partition_names: Sequence[Sequence[str] | None] | None = None,
+    search_params: dict[str, Any] | None = None,
+) -> list[list[Entry]]:
+    """
+    Query many vectors at once, each with their own voicing, window lengths
+    and partitions.
+
+    Partitions are digests, filtered on as the collection's partition key.
+    """
+    return get_vector_store().search(
+        get_index_plan(index_alias).spec,
+        vectors,
+        filters=[
+            {"digests": partition_names_, "is_voiced": is_voiced_, "lengths": lengths_}
+            for is_voiced_, lengths_, partition_names_ in zip(
+                is_voiced or [None] * len(vectors),
+                lengths or [None] * len(vectors),
+                partition_names or [None] * len(vectors),
             )
-        )
-    return entries
+        ],
+        limit=limit,
+        search_params=search_params,
+    )
 
 
 class WhiteningConfig(TypedDict):
     mean_: list[float]
-    n_samples_seen_: int
+    # Per-column if any column skipped non-finite values
+    n_samples_seen_: int | list[int]
     var_: list[float]
     scale_: list[float]
 
 
+def get_whitener_key() -> str:
+    return config.analysis.scsynth_collection_prefix.replace("_", "-") + ":whitening"
+
+
+def has_whitener(*, redis: redis.Redis) -> bool:
+    return bool(redis.exists(get_whitener_key()))
+
+
 def deserialize_whitener(*, redis: redis.Redis) -> StandardScaler:
-    key = config.analysis.scsynth_collection_prefix.replace("_", "-") + ":whitening"
+    key = get_whitener_key()
     scaler = StandardScaler()
     if redis.exists(key):
         data: WhiteningConfig = json.loads(cast(str, redis.get(key)))
         scaler.mean_ = numpy.array(data["mean_"])
-        scaler.n_samples_seen_ = data["n_samples_seen_"]
+        scaler.n_samples_seen_ = (
+            numpy.array(data["n_samples_seen_"])
+            if isinstance(data["n_samples_seen_"], list)
+            else data["n_samples_seen_"]
+        )
         scaler.scale_ = numpy.array(data["scale_"])
         scaler.var_ = numpy.array(data["var_"])
     else:
@@ -616,17 +1267,41 @@ def deserialize_whitener(*, redis: redis.Redis) -> StandardScaler:
 
 
 def serialize_whitener(*, redis: redis.Redis, scaler: StandardScaler) -> None:
-    key = config.analysis.scsynth_collection_prefix.replace("_", "-") + ":whitening"
+    key = get_whitener_key()
     data: WhiteningConfig = dict(
         mean_=scaler.mean_.tolist(),
-        n_samples_seen_=int(scaler.n_samples_seen_),
+        n_samples_seen_=numpy.asarray(scaler.n_samples_seen_).tolist(),
         scale_=scaler.scale_.tolist(),
         var_=scaler.var_.tolist(),
     )
-    redis.set(key, json.dumps(data, indent=0, sort_keys=True))
+    # Bump the version alongside the whitener, invalidating cached whiteners
+    with redis.pipeline() as pipeline:
+        pipeline.set(key, json.dumps(data, indent=0, sort_keys=True))
+        pipeline.incr(key + ":version")
+        pipeline.execute()
+
+
+# (key, version, scaler) of the whitener last deserialized in this process
+_whitener: tuple[str, int, StandardScaler] | None = None
+
+
+def get_whitener(*, redis: redis.Redis) -> StandardScaler:
+    """
+    Get the current whitener.
+
+    Only the whitener's version is read from Redis, unless it changed since the
+    whitener was last deserialized in this process. Treat the returned scaler
+    as read-only, as it is shared.
+    """
+    global _whitener
+    key = get_whitener_key()
+    version = int(cast(str | None, redis.get(key + ":version")) or 0)
+    if _whitener is None or _whitener[:2] != (key, version):
+        _whitener = (key, version, deserialize_whitener(redis=redis))
+    return _whitener[2]
 
 
 def whiten(
     *, array: numpy.ndarray, redis: redis.Redis, scaler: StandardScaler | None = None
 ) -> numpy.ndarray:
-    return (scaler or deserialize_whitener(redis=redis)).transform(array)
+    return (scaler or get_whitener(redis=redis)).transform(array)
@@ -0,0 +1,996 @@
+"""
+Vector stores: where entries' vectors live, and how they're searched.
+
+Milvus is the default backend. The local backend embeds the store in-process,
+as memory-mapped NumPy matrices on disk, for development and single-node
+deployments.
+"""
+
+import abc
+import dataclasses
+import fcntl
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from functools import partial
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from typing import Any, Iterator, Literal, Sequence, cast
+
+import numpy
+from pymilvus import (
+    BulkInsertState,
+    Collection,
+    CollectionSchema,
+    DataType,
+    FieldSchema,
+    utility,
+)
+from typing_extensions import TypedDict
+
+from ..config import IndexType, MetricType, config
+from . import milvus
+from .milvus import Entry, get_index_params, get_search_params
+from .s3 import create_s3_client
+
+ScalarType = Literal["bool", "float32"]
+
+
+class Filter(TypedDict, total=False):
+    """
+    A query's filters: a voicing to match, and digests and window lengths to
+    search within.
+    """
+
+    digests: Sequence[str] | None
+    is_voiced: bool | None
+    lengths: Sequence[int] | None
+
+
+@dataclasses.dataclass(frozen=True)
+class CollectionSpec:
+    """
+    Everything a vector store needs to know to create and search a collection.
+
+    Besides its ``scalar_fields``, every collection holds each entry's id,
+    digest, start frame, frame count, hop and length, and is partitioned by
+    digest. Hops and lengths are indexed for filtering.
+    """
+
+    name: str
+    dimension: int
+    scalar_fields: tuple[tuple[str, ScalarType], ...] = ()
+    index_type: IndexType = "IVF_FLAT"
+    index_params: dict[str, Any] = dataclasses.field(default_factory=dict)
+    metric_type: MetricType = "L2"
+    search_params: dict[str, Any] = dataclasses.field(default_factory=dict)
+
+
+def get_filter_expr(filter_: Filter) -> str:
+    exprs: list[str] = []
+    if (is_voiced := filter_.get("is_voiced")) is not None:
+        exprs.append("is_voiced == true" if is_voiced else "is_voiced == false")
+    if digests := filter_.get("digests"):
+        exprs.append(f"digest in {json.dumps(list(digests))}")
+    if lengths := filter_.get("lengths"):
+        exprs.append(f"length_ms in {json.dumps([int(x) for x in lengths])}")
+    return " and ".join(exprs)
+
+
+def get_entry_ids(
+    digest: str,
+    start_frames: numpy.ndarray | Sequence[int],
+    frame_counts: numpy.ndarray | Sequence[int],
+    hop_ms: int,
+    length_ms: int,
+) -> numpy.ndarray:
+    """
+    Derive entries' primary keys from their digest, start frame, frame count,
+    hop and length, as non-negative 64-bit integers.
+
+    Hops and lengths are part of the key, as windows of different resolutions
+    can share a start frame and frame count. These don't fit losslessly beside
+    a digest prefix in 64 bits, so they're mixed with SplitMix64's finalizer
+    instead, making collisions vanishingly unlikely below billions of entries.
+    """
+    seed = numpy.array(
+        [int.from_bytes(hashlib.blake2b(digest.encode(), digest_size=8).digest())],
+        dtype=numpy.uint64,
+    )
+    seed = mix(mix(seed ^ numpy.uint64(hop_ms)) ^ numpy.uint64(length_ms))
+    ids = mix(
+        mix(seed ^ numpy.asarray(start_frames).astype(numpy.uint64))
+        ^ numpy.asarray(frame_counts).astype(numpy.uint64)
+    )
+    return (ids >> numpy.uint64(1)).astype(numpy.int64)
+
+
+def mix(x: numpy.ndarray) -> numpy.ndarray:
+    x = (x ^ (x >> numpy.uint64(30))) * numpy.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> numpy.uint64(27))) * numpy.uint64(0x94D049BB133111EB)
+    return x ^ (x >> numpy.uint64(31))
+
+
+class VectorStore(abc.ABC):
+    @abc.abstractmethod
+    def connect(self, specs: Sequence[CollectionSpec]) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def create_collection(self, spec: CollectionSpec) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def drop_collection(self, spec: CollectionSpec) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def flush(self, spec: CollectionSpec) -> None:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def has_collection(self, spec: CollectionSpec) -> bool:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def needs_migration(self, spec: CollectionSpec) -> bool:
+        """
+        Check if an existing collection predates the current layout.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def insert(
+        self,
+        spec: CollectionSpec,
+        *,
+        digest: str,
+        start_frames: numpy.ndarray,
+        frame_counts: numpy.ndarray,
+        hop_ms: int,
+        length_ms: int,
+        vectors: numpy.ndarray,
+        scalars: dict[str, numpy.ndarray] | None = None,
+    ) -> None:
+        """
+        Insert entries, replacing any already inserted with the same digest,
+        start frame, frame count, hop and length.
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def search(
+        self,
+        spec: CollectionSpec,
+        vectors: Sequence[Sequence[float]] | numpy.ndarray,
+        *,
+        filters: Sequence[Filter] | None = None,
+        limit: int = 10,
+        search_params: dict[str, Any] | None = None,
+    ) -> list[list[Entry]]:
+        """
+        Search for many vectors at once, each with their own filters.
+        """
+        raise NotImplementedError
+
+
+class MilvusVectorStore(VectorStore):
+    # Scalar fields indexed for filtering
+    INDEXED_FIELDS = ("hop_ms", "length_ms")
+    SCALAR_TYPES: dict[ScalarType, DataType] = {
+        "bool": DataType.BOOL,
+        "float32": DataType.FLOAT,
+    }
+
+    def connect(self, specs: Sequence[CollectionSpec]) -> None:
+        milvus.connect()
+        milvus.register_collections([spec.name for spec in specs])
+
+    def create_collection(self, spec: CollectionSpec) -> None:
+        collection = Collection(
+            name=spec.name,
+            schema=CollectionSchema(
+                auto_id=False,
+                fields=[
+                    FieldSchema(name="id", dtype=DataType.INT64, is_primary=True),
+                    FieldSchema(
+                        name="digest",
+                        dtype=DataType.VARCHAR,
+                        is_partition_key=True,
+                        max_length=256,
+                    ),
+                    FieldSchema(name="start_frame", dtype=DataType.INT64),
+                    FieldSchema(name="frame_count", dtype=DataType.INT64),
+                    FieldSchema(name="hop_ms", dtype=DataType.INT64),
+                    FieldSchema(name="length_ms", dtype=DataType.INT64),
+                    *(
+                        FieldSchema(name=name, dtype=self.SCALAR_TYPES[type_])
+                        for name, type_ in spec.scalar_fields
+                    ),
+                    FieldSchema(
+                        name="vector", dtype=DataType.FLOAT_VECTOR, dim=spec.dimension
+                    ),
+                ],
+            ),
+            num_partitions=config.milvus.num_partitions,
+        )
+        collection.create_index(
+            field_name="vector",
+            index_params=get_index_params(
+                spec.index_type, spec.metric_type, spec.index_params
+            ),
+            index_name="vector",
+        )
+        for field_name in self.INDEXED_FIELDS:
+            collection.create_index(
+                field_name=field_name,
+                index_params={"index_type": "STL_SORT"},
+                index_name=field_name,
+            )
+        collection.load()
+        milvus.register_collection(collection)
+
+    def drop_collection(self, spec: CollectionSpec) -> None:
+        utility.drop_collection(spec.name)
+        milvus.forget_collection(spec.name)
+
+    def flush(self, spec: CollectionSpec) -> None:
+        milvus.get_collection(spec.name).flush()
+
+    def has_collection(self, spec: CollectionSpec) -> bool:
+        try:
+            milvus.get_collection(spec.name)
+        except ValueError:
+            return False
+        return True
+
+    def needs_migration(self, spec: CollectionSpec) -> bool:
+        fields = {
+            field.name: field
+            for field in milvus.get_collection(spec.name).schema.fields
+        }
+        return (
+            "hop_ms" not in fields
+            or not fields["digest"].is_partition_key
+            or fields["id"].dtype != DataType.INT64
+        )
+
+    def insert(
+        self,
+        spec: CollectionSpec,
+        *,
+        digest: str,
+        start_frames: numpy.ndarray,
+        frame_counts: numpy.ndarray,
+        hop_ms: int,
+        length_ms: int,
+        vectors: numpy.ndarray,
+        scalars: dict[str, numpy.ndarray] | None = None,
+    ) -> None:
+        """
+        Upsert entries column-wise, in batches sized to stay under
+        ``config.milvus.insert_batch_bytes``, or via bulk insert from staged
+        files beyond ``config.milvus.bulk_insert_threshold`` rows.
+        """
+        collection = milvus.get_collection(spec.name)
+        columns = self.get_columns(
+            spec,
+            digest=digest,
+            start_frames=start_frames,
+            frame_counts=frame_counts,
+            hop_ms=hop_ms,
+            length_ms=length_ms,
+            vectors=vectors,
+            scalars=scalars,
+        )
+        if not (count := len(columns["id"])):
+            return
+        if (
+            config.milvus.bulk_insert_bucket
+            and count >= config.milvus.bulk_insert_threshold
+        ):
+            # Bulk inserts don't upsert, so drop any previous run's entries
+            collection.delete(
+                f"digest == {json.dumps(digest)} and hop_ms == {int(hop_ms)}"
+                f" and length_ms == {int(length_ms)}"
+            )
+            self.bulk_insert(spec, columns)
+            return
+        # Strings go over the wire as UTF-8, not as NumPy's UTF-32
+        row_size = (
+            sum(
+                column.nbytes // (4 if column.dtype.kind == "U" else 1)
+                for column in columns.values()
+            )
+            // count
+        )
+        batch_size = max(config.milvus.insert_batch_bytes // max(row_size, 1), 1)
+        for i in range(0, count, batch_size):
+            collection.upsert(
+                data=[column[i : i + batch_size] for column in columns.values()]
+            )
+
+    def bulk_insert(
+        self, spec: CollectionSpec, columns: dict[str, numpy.ndarray]
+    ) -> None:
+        """
+        Stage one ``.npy`` file per field in Milvus' bucket, bulk insert them,
+        and wait for the import to complete.
+        """
+        bucket = cast(str, config.milvus.bulk_insert_bucket)
+        client = create_s3_client()
+        prefix = f"bulk-insert/{spec.name}/{uuid.uuid4()}"
+        keys = [f"{prefix}/{name}.npy" for name in columns]
+        with TemporaryDirectory() as temp_directory:
+            for key, column in zip(keys, columns.values()):
+                path = Path(temp_directory) / key.rpartition("/")[-1]
+                numpy.save(path, column)
+                client.upload_file(Bucket=bucket, Filename=str(path), Key=key)
+        try:
+            task_id = utility.do_bulk_insert(collection_name=spec.name, files=keys)
+            while (state := utility.get_bulk_insert_state(task_id)).state not in (
+                BulkInsertState.ImportCompleted,
+                BulkInsertState.ImportFailed,
+                BulkInsertState.ImportFailedAndCleaned,
+            ):
+                time.sleep(1.0)
+            if state.state != BulkInsertState.ImportCompleted:
+                raise RuntimeError(state.failed_reason)
+        finally:
+            client.delete_objects(
+                Bucket=bucket, Delete={"Objects": [{"Key": key} for key in keys]}
+            )
+
+    def get_columns(
+        self,
+        spec: CollectionSpec,
+        *,
+        digest: str,
+        start_frames: numpy.ndarray,
+        frame_counts: numpy.ndarray,
+        hop_ms: int,
+        length_ms: int,
+        vectors: numpy.ndarray,
+        scalars: dict[str, numpy.ndarray] | None = None,
+    ) -> dict[str, numpy.ndarray]:
+        """
+        Build every field's column as an array, in schema order.
+        """
+        start_frames = numpy.asarray(start_frames, dtype=numpy.int64)
+        frame_counts = numpy.asarray(frame_counts, dtype=numpy.int64)
+        return {
+            "id": get_entry_ids(digest, start_frames, frame_counts, hop_ms, length_ms),
+            "digest": numpy.full(len(start_frames), digest),
+            "start_frame": start_frames,
+            "frame_count": frame_counts,
+            "hop_ms": numpy.full(len(start_frames), hop_ms, dtype=numpy.int64),
+            "length_ms": numpy.full(len(start_frames), length_ms, dtype=numpy.int64),
+            **{
+                name: numpy.asarray((scalars or {})[name]).astype(type_)
+                for name, type_ in spec.scalar_fields
+            },
+            "vector": numpy.asarray(vectors, dtype=numpy.float32).reshape(
+                len(start_frames), spec.dimension
+            ),
+        }
+
+    def search(
+        self,
+        spec: CollectionSpec,
+        vectors: Sequence[Sequence[float]] | numpy.ndarray,
+        *,
+        filters: Sequence[Filter] | None = None,
+        limit: int = 10,
+        search_params: dict[str, Any] | None = None,
+    ) -> list[list[Entry]]:
+        filters = filters or [{}] * len(vectors)
+        search = partial(
+            milvus.search_many,
+            vectors=vectors,
+            exprs=[get_filter_expr(filter_) for filter_ in filters],
+            limit=limit,
+            param=get_search_params(
+                spec.index_type,
+                spec.metric_type,
+                spec.search_params,
+                search_params,
+                limit,
+            ),
+        )
+        return milvus.with_collection(spec.name, search)
+
+
+class LocalVectorStore(VectorStore):
+    """
+    An embedded vector store, keeping one directory per collection and digest
+    under ``path``, digests being the partition key.
+
+    Each partition holds a float32 matrix of vectors and a record array of
+    entries, memory-mapped on search, in a generation directory named by the
+    partition's ``current`` pointer file. Appends extend the current
+    generation's files, while replacing entries writes a new generation and
+    swaps the pointer, so readers always see matching entries, vectors and
+    index. Search is exact and vectorized, unless
+    the collection has an IVF index type, in which case flushing clusters each
+    partition's vectors and searching probes the ``nprobe`` nearest clusters,
+    plus any rows inserted since. Other ANN index types search exactly.
+    """
+
+    CHUNK_SIZE = 1024 * 64
+    DIGEST_DTYPE = "U64"
+    # Arrays and indexes kept loaded, the least recently used being released
+    # first
+    MAX_LOADED = 1024 * 3
+    # Rows per cluster below which clustering isn't worth it
+    MIN_ROWS_PER_LIST = 39
+
+    def __init__(self, path: Path) -> None:
+        self.path = Path(path)
+        self.arrays: OrderedDict[Path, tuple[tuple[int, int, int], Any]] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def connect(self, specs: Sequence[CollectionSpec]) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+
+    def create_collection(self, spec: CollectionSpec) -> None:
+        path = self.path / spec.name
+        path.mkdir(parents=True, exist_ok=True)
+        (path / "collection.json").write_text(
+            json.dumps(
+                {
+                    **dataclasses.asdict(spec),
+                    "fields": list(self.get_entry_dtype(spec).names or ()),
+                },
+                sort_keys=True,
+            )
+        )
+
+    def drop_collection(self, spec: CollectionSpec) -> None:
+        shutil.rmtree(self.path / spec.name, ignore_errors=True)
+        with self.lock:
+            for path in [
+                path
+                for path in self.arrays
+                if path.is_relative_to(self.path / spec.name)
+            ]:
+                del self.arrays[path]
+
+    def flush(self, spec: CollectionSpec) -> None:
+        """
+        Cluster the vectors of every partition whose index is out-of-date.
+        """
+        if not spec.index_type.startswith("IVF"):
+            return
+        nlist = get_index_params(spec.index_type, spec.metric_type, spec.index_params)[
+            "params"
+        ]["nlist"]
+        for partition_path in self.get_partition_paths(spec):
+            with self.locked(partition_path):
+                if (path := self.get_generation_path(partition_path)) is None:
+                    continue
+                if (vectors := self.load(path / "vectors.npy")) is None:
+                    continue
+                index = self.load(path / "index.npz")
+                if index is not None and int(index["offsets"][-1]) == len(vectors):
+                    continue
+                if (nlist_ := min(nlist, len(vectors) // self.MIN_ROWS_PER_LIST)) < 2:
+                    continue
+                vectors_ = normalize(vectors, spec.metric_type)
+                centroids = kmeans(vectors_, nlist_)
+                assignments = assign(vectors_, centroids)
+                temp_path = path / "index.tmp.npz"
+                numpy.savez(
+                    temp_path,
+                    centroids=centroids,
+                    lists=numpy.argsort(assignments, kind="stable"),
+                    offsets=numpy.concatenate(
+                        [
+                            [0],
+                            numpy.cumsum(numpy.bincount(assignments, minlength=nlist_)),
+                        ]
+                    ),
+                )
+                os.replace(temp_path, path / "index.npz")
+
+    def has_collection(self, spec: CollectionSpec) -> bool:
+        return (self.path / spec.name / "collection.json").exists()
+
+    def needs_migration(self, spec: CollectionSpec) -> bool:
+        data = json.loads((self.path / spec.name / "collection.json").read_text())
+        return not {"hop_ms", "id"} <= set(data.get("fields", ()))
+
+    def insert(
+        self,
+        spec: CollectionSpec,
+        *,
+        digest: str,
+        start_frames: numpy.ndarray,
+        frame_counts: numpy.ndarray,
+        hop_ms: int,
+        length_ms: int,
+        vectors: numpy.ndarray,
+        scalars: dict[str, numpy.ndarray] | None = None,
+    ) -> None:
+        if not self.has_collection(spec):
+            raise ValueError(spec.name)
+        if len(digest) > int(self.DIGEST_DTYPE[1:]) or not digest.isalnum():
+            raise ValueError(digest)
+        if not (count := len(start_frames)):
+            return
+        entries = numpy.empty(count, dtype=self.get_entry_dtype(spec))
+        entries["id"] = get_entry_ids(
+            digest, start_frames, frame_counts, hop_ms, length_ms
+        )
+        entries["digest"] = digest
+        entries["start_frame"] = start_frames
+        entries["frame_count"] = frame_counts
+        entries["hop_ms"] = hop_ms
+        entries["length_ms"] = length_ms
+        for name, _ in spec.scalar_fields:
+            entries[name] = (scalars or {})[name]
+        vectors = numpy.asarray(vectors, dtype=numpy.float32).reshape(
+            count, spec.dimension
+        )
+        # Of duplicates within the batch, the last wins
+        _, last = numpy.unique(entries["id"][::-1], return_index=True)
+        if len(last) < count:
+            rows = numpy.sort(count - 1 - last)
+            entries, vectors = entries[rows], vectors[rows]
+        partition_path = self.get_partition_path(spec, digest)
+        partition_path.mkdir(parents=True, exist_ok=True)
+        with self.locked(partition_path):
+            if (path := self.get_generation_path(partition_path)) is None:
+                self.save_generation(partition_path, entries, vectors)
+                return
+            previous_entries = self.load(path / "entries.npy")
+            previous_vectors = self.load(path / "vectors.npy")
+            if previous_entries is not None and previous_vectors is not None:
+                previous_count = min(len(previous_entries), len(previous_vectors))
+                keep = ~numpy.isin(
+                    previous_entries["id"][:previous_count], entries["id"]
+                )
+                if not keep.all():
+                    # Replace the previous entries in a new generation, without
+                    # the now stale index
+                    self.save_generation(
+                        partition_path,
+                        numpy.concatenate(
+                            [previous_entries[:previous_count][keep], entries]
+                        ),
+                        numpy.concatenate(
+                            [previous_vectors[:previous_count][keep], vectors]
+                        ),
+                    )
+                    return
+            # Entries first, as searches only consider rows present in both
+            append(path / "entries.npy", entries)
+            append(path / "vectors.npy", vectors)
+
+    def search(
+        self,
+        spec: CollectionSpec,
+        vectors: Sequence[Sequence[float]] | numpy.ndarray,
+        *,
+        filters: Sequence[Filter] | None = None,
+        limit: int = 10,
+        search_params: dict[str, Any] | None = None,
+    ) -> list[list[Entry]]:
+        filters = filters or [{}] * len(vectors)
+        if len(vectors) != len(filters):
+            raise ValueError
+        params = get_search_params(
+            spec.index_type, spec.metric_type, spec.search_params, search_params, limit
+        )["params"]
+        groups: dict[
+            tuple[bool | None, tuple[str, ...] | None, tuple[int, ...] | None],
+            list[int],
+        ] = {}
+        for i, filter_ in enumerate(filters):
+            digests, lengths = filter_.get("digests"), filter_.get("lengths")
+            groups.setdefault(
+                (
+                    filter_.get("is_voiced"),
+                    tuple(digests) if digests else None,
+                    tuple(lengths) if lengths else None,
+                ),
+                [],
+            ).append(i)
+        queries = numpy.asarray(vectors, dtype=numpy.float64).reshape(
+            len(vectors), spec.dimension
+        )
+        results: list[list[Entry]] = [[] for _ in vectors]
+        for (is_voiced, digests, lengths), indices in groups.items():
+            # Per partition, per query, the nearest rows' scores and entries
+            hits = [
+                hit
+                for path in self.get_partition_paths(spec, digests)
+                if (
+                    hit := self.search_partition(
+                        spec,
+                        path,
+                        queries[indices],
+                        limit,
+                        params,
+                        is_voiced=is_voiced,
+                        lengths=lengths,
+                    )
+                )
+                is not None
+            ]
+            for i, index in enumerate(indices):
+                if not hits:
+                    continue
+                scores = numpy.concatenate([scores[i] for scores, _ in hits])
+                entries = numpy.concatenate([entries[i] for _, entries in hits])
+                order = numpy.argsort(scores, kind="stable")[:limit]
+                order = order[numpy.isfinite(scores[order])]
+                sign = 1 if spec.metric_type == "L2" else -1
+                results[index] = [
+                    dict(
+                        digest=str(entries["digest"][j]),
+                        start_frame=int(entries["start_frame"][j]),
+                        frame_count=int(entries["frame_count"][j]),
+                        distance=round(float(sign * scores[j]), 3),
+                    )
+                    for j in order
+                ]
+        return results
+
+    def search_partition(
+        self,
+        spec: CollectionSpec,
+        path: Path,
+        queries: numpy.ndarray,
+        limit: int,
+        params: dict[str, Any],
+        *,
+        is_voiced: bool | None = None,
+        lengths: Sequence[int] | None = None,
+    ) -> tuple[numpy.ndarray, numpy.ndarray] | None:
+        """
+        Search one partition, returning the scores and entries of each
+        query's nearest rows, padded with infinitely-far rows.
+        """
+        if (path_ := self.get_generation_path(path)) is None:
+            return None
+        entries = self.load(path_ / "entries.npy")
+        vectors = self.load(path_ / "vectors.npy")
+        if entries is None or vectors is None:
+            return None
+        count = min(len(entries), len(vectors))
+        mask = None
+        if is_voiced is not None:
+            mask = entries["is_voiced"][:count] == is_voiced
+        if lengths:
+            mask_ = numpy.isin(entries["length_ms"][:count], lengths)
+            mask = mask_ if mask is None else mask & mask_
+        index = None
+        if spec.index_type.startswith("IVF"):
+            index = self.load(path_ / "index.npz")
+        if index is None:
+            rows = None if mask is None else numpy.flatnonzero(mask)
+            scores, rows_ = search_exact(
+                queries, vectors, spec.metric_type, limit, rows=rows, count=count
+            )
+        else:
+            centroids = index["centroids"]
+            lists, offsets = index["lists"], index["offsets"]
+            probes = numpy.argsort(
+                score(normalize(queries, spec.metric_type), centroids, "L2"), axis=1
+            )[:, : params.get("nprobe", 1)]
+            # Rows inserted since clustering are searched exhaustively
+            tail = numpy.arange(int(offsets[-1]), count)
+            scores = numpy.full((len(queries), limit), numpy.inf)
+            rows_ = numpy.zeros((len(queries), limit), dtype=numpy.intp)
+            for i, probes_ in enumerate(probes):
+                rows = numpy.concatenate(
+                    [lists[offsets[j] : offsets[j + 1]] for j in probes_] + [tail]
+                )
+                if mask is not None:
+                    rows = rows[mask[rows]]
+                scores_, rows__ = search_exact(
+                    queries[i : i + 1], vectors, spec.metric_type, limit, rows=rows
+                )
+                scores[i, : scores_.shape[1]] = scores_[0]
+                rows_[i, : rows__.shape[1]] = rows__[0]
+        return scores, numpy.asarray(entries)[rows_]
+
+    def get_entry_dtype(self, spec: CollectionSpec) -> numpy.dtype:
+        return numpy.dtype(
+            [
+                ("id", numpy.int64),
+                ("digest", self.DIGEST_DTYPE),
+                ("start_frame", numpy.int64),
+                ("frame_count", numpy.int64),
+                ("hop_ms", numpy.int64),
+                ("length_ms", numpy.int64),
+                *((name, numpy.dtype(type_)) for name, type_ in spec.scalar_fields),
+            ]
+        )
+
+    def get_generation_path(self, path: Path) -> Path | None:
+        """
+        Get the directory of a partition's current generation, if any.
+        """
+        try:
+            return path / (path / "current").read_text()
+        except FileNotFoundError:
+            return None
+
+    def get_partition_path(self, spec: CollectionSpec, digest: str) -> Path:
+        return self.path / spec.name / digest
+
+    def get_partition_paths(
+        self, spec: CollectionSpec, digests: Sequence[str] | None = None
+    ) -> list[Path]:
+        if digests is not None:
+            paths = [
+                self.get_partition_path(spec, digest)
+                for digest in digests
+                if digest.isalnum()
+            ]
+            return [path for path in paths if path.is_dir()]
+        if not (path := self.path / spec.name).is_dir():
+            return []
+        return sorted(path_ for path_ in path.iterdir() if path_.is_dir())
+
+    def load(self, path: Path) -> Any | None:
+        """
+        Load an array memory-mapped, or an index, reusing handles until the
+        file is replaced or appended to.
+
+        Handles are keyed by partition rather than generation, so loading a
+        new generation releases the previous one's, and at most
+        ``MAX_LOADED`` are kept.
+        """
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        key = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        path_ = path.parent.parent / path.name
+        with self.lock:
+            if (cached := self.arrays.get(path_)) is not None and cached[0] == key:
+                self.arrays.move_to_end(path_)
+                return cached[1]
+        if path.suffix == ".npz":
+            with numpy.load(path) as archive:
+                array = {name: archive[name] for name in archive.files}
+        else:
+            array = numpy.load(path, mmap_mode="r")
+        with self.lock:
+            self.arrays[path_] = (key, array)
+            self.arrays.move_to_end(path_)
+            while len(self.arrays) > self.MAX_LOADED:
+                self.arrays.popitem(last=False)
+        return array
+
+    @contextmanager
+    def locked(self, path: Path) -> Iterator[None]:
+        """
+        Serialize writers to a partition, across processes.
+        """
+        with (path / ".lock").open("w") as file_pointer:
+            fcntl.flock(file_pointer, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(file_pointer, fcntl.LOCK_UN)
+
+    def save_generation(
+        self, path: Path, entries: numpy.ndarray, vectors: numpy.ndarray
+    ) -> None:
+        """
+        Write a partition's entries and vectors as a new generation, then
+        atomically point the partition at it.
+
+        Generations before the previous one are removed, giving readers still
+        on the previous generation until the next write to finish.
+        """
+        previous = self.get_generation_path(path)
+        generation = 0 if previous is None else int(previous.name) + 1
+        generation_path = path / str(generation)
+        # Clear any leftovers of an interrupted write
+        shutil.rmtree(generation_path, ignore_errors=True)
+        generation_path.mkdir()
+        numpy.save(generation_path / "entries.npy", entries)
+        numpy.save(generation_path / "vectors.npy", vectors)
+        temp_path = path / "current.tmp"
+        temp_path.write_text(str(generation))
+        os.replace(temp_path, path / "current")
+        for path_ in path.iterdir():
+            if path_.is_dir() and int(path_.name) < generation - 1:
+                shutil.rmtree(path_, ignore_errors=True)
+
+
+def append(path: Path, array: numpy.ndarray) -> None:
+    """
+    Append rows to an ``.npy`` file in place, writing them before growing the
+    header's shape, so readers see either the previous rows or every row, and
+    those holding the previous memory-map are unaffected.
+
+    Files whose header can't grow in place are rewritten instead.
+    """
+    if not path.exists():
+        save(path, array)
+        return
+    with path.open("r+b") as file_pointer:
+        version = numpy.lib.format.read_magic(file_pointer)
+        if version == (1, 0):
+            read, write = (
+                numpy.lib.format.read_array_header_1_0,
+                numpy.lib.format.write_array_header_1_0,
+            )
+        elif version == (2, 0):
+            read, write = (
+                numpy.lib.format.read_array_header_2_0,
+                numpy.lib.format.write_array_header_2_0,
+            )
+        else:
+            raise ValueError(path)
+        shape, fortran_order, dtype = read(file_pointer)
+        offset = file_pointer.tell()
+        if fortran_order or dtype != array.dtype or shape[1:] != array.shape[1:]:
+            raise ValueError(path)
+        header = io.BytesIO()
+        write(
+            header,
+            {
+                "descr": numpy.lib.format.dtype_to_descr(dtype),
+                "fortran_order": False,
+                "shape": (shape[0] + len(array), *shape[1:]),
+            },
+        )
+        if len(header.getvalue()) == offset:
+            # Past the rows the header counts, in case a write was interrupted
+            file_pointer.seek(offset + dtype.itemsize * int(numpy.prod(shape)))
+            file_pointer.truncate()
+            file_pointer.write(numpy.ascontiguousarray(array).tobytes())
+            file_pointer.flush()
+            file_pointer.seek(0)
+            file_pointer.write(header.getvalue())
+            return
+    save(path, numpy.concatenate([numpy.load(path, mmap_mode="r"), array]))
+
+
+def save(path: Path, array: numpy.ndarray) -> None:
+    temp_path = path.with_suffix(".tmp.npy")
+    numpy.save(temp_path, array)
+    os.replace(temp_path, path)
+
+
+def normalize(vectors: numpy.ndarray, metric_type: MetricType) -> numpy.ndarray:
+    vectors = numpy.asarray(vectors, dtype=numpy.float64)
+    if metric_type != "COSINE":
+        return vectors
+    norms = numpy.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / numpy.where(norms > 0, norms, 1.0)
+
+
+def score(
+    queries: numpy.ndarray, vectors: numpy.ndarray, metric_type: MetricType
+) -> numpy.ndarray:
+    """
+    Score every query against every vector, lower scores being nearer.
+
+    L2 scores are squared distances, as Milvus reports them. IP and COSINE
+    scores are negated similarities.
+    """
+    vectors = numpy.asarray(vectors, dtype=numpy.float64)
+    if metric_type == "L2":
+        return numpy.maximum(
+            (queries**2).sum(axis=1)[:, None]
+            - 2 * queries @ vectors.T
+            + (vectors**2).sum(axis=1)[None, :],
+            0.0,
+        )
+    return -(normalize(queries, metric_type) @ normalize(vectors, metric_type).T)
+
+
+def search_exact(
+    queries: numpy.ndarray,
+    vectors: numpy.ndarray,
+    metric_type: MetricType,
+    limit: int,
+    *,
+    rows: numpy.ndarray | None = None,
+    count: int | None = None,
+) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """
+    Find each query's ``limit`` nearest rows, among ``rows`` or the first
+    ``count`` rows, in chunks to bound memory.
+
+    Returns the sorted scores and row indices of each query's nearest rows.
+    """
+    total = len(rows) if rows is not None else (count or len(vectors))
+    best_scores = numpy.empty((len(queries), 0))
+    best_rows = numpy.empty((len(queries), 0), dtype=numpy.intp)
+    for start in range(0, total, LocalVectorStore.CHUNK_SIZE):
+        stop = min(start + LocalVectorStore.CHUNK_SIZE, total)
+        if rows is None:
+            chunk_rows = numpy.arange(start, stop)
+            chunk = vectors[start:stop]
+        else:
+            chunk_rows = rows[start:stop]
+            chunk = vectors[chunk_rows]
+        best_scores = numpy.hstack([best_scores, score(queries, chunk, metric_type)])
+        best_rows = numpy.hstack(
+            [best_rows, numpy.broadcast_to(chunk_rows, (len(queries), len(chunk_rows)))]
+        )
+        if best_scores.shape[1] > limit:
+            nearest = numpy.argpartition(best_scores, limit - 1, axis=1)[:, :limit]
+            best_scores = numpy.take_along_axis(best_scores, nearest, axis=1)
+            best_rows = numpy.take_along_axis(best_rows, nearest, axis=1)
+    order = numpy.argsort(best_scores, axis=1, kind="stable")
+    return (
+        numpy.take_along_axis(best_scores, order, axis=1),
+        numpy.take_along_axis(best_rows, order, axis=1),
+    )
+
+
+def assign(vectors: numpy.ndarray, centroids: numpy.ndarray) -> numpy.ndarray:
+    """
+    Assign each vector to its nearest centroid, in chunks to bound memory.
+    """
+    return numpy.concatenate(
+        [
+            score(
+                numpy.asarray(vectors[i : i + LocalVectorStore.CHUNK_SIZE]),
+                centroids,
+                "L2",
+            ).argmin(axis=1)
+            for i in range(0, len(vectors), LocalVectorStore.CHUNK_SIZE)
+        ]
+    )
+
+
+def kmeans(
+    vectors: numpy.ndarray, k: int, iterations: int = 10, seed: int = 0
+) -> numpy.ndarray:
+    """
+    Cluster a sample of ``vectors`` into ``k`` centroids, via Lloyd's
+    algorithm.
+    """
+    generator = numpy.random.default_rng(seed)
+    sample = vectors[
+        numpy.sort(
+            generator.choice(len(vectors), min(len(vectors), k * 256), replace=False)
+        )
+    ]
+    centroids = sample[generator.choice(len(sample), k, replace=False)]
+    for _ in range(iterations):
+        assignments = assign(sample, centroids)
+        counts = numpy.bincount(assignments, minlength=k)
+        sums = numpy.zeros_like(centroids)
+        numpy.add.at(sums, assignments, sample)
+        # Empty clusters keep their previous centroid
+        centroids = numpy.where(
+            counts[:, None] > 0, sums / numpy.maximum(counts, 1)[:, None], centroids
+        )
+    return centroids
+
+
+# (backend, path, store) of the config the store was created from
+_vector_store: tuple[str, Path, VectorStore] | None = None
+
+
+def get_vector_store() -> VectorStore:
+    """
+    Get the configured vector store, created on first use and recreated only
+    when the configured backend or path is replaced.
+    """
+    global _vector_store
+    backend, path = config.vector_store.backend, config.vector_store.path
+    if _vector_store is None or _vector_store[:2] != (backend, path):
+        store: VectorStore = (
+            LocalVectorStore(path) if backend == "local" else MilvusVectorStore()
+        )
+        _vector_store = (backend, path, store)
+    return _vector_store[2]
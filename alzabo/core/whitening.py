@@ -0,0 +1,221 @@
+"""
+Running whitening statistics, merged incrementally as analyses are ingested.
+"""
+
+import json
+from typing import Iterable, Sequence, TypedDict, cast
+
+import numpy
+import redis
+from redis.client import Pipeline
+from sklearn.preprocessing import StandardScaler
+
+from ..config import config
+
+
+class WhiteningStatistics(TypedDict):
+    # Per-column, as non-finite values are skipped column by column
+    count: list[int]
+    mean: list[float]
+    m2: list[float]
+
+
+def get_statistics_key() -> str:
+    return (
+        config.analysis.scsynth_collection_prefix.replace("_", "-")
+        + ":whitening-statistics"
+    )
+
+
+def get_digests_key() -> str:
+    return (
+        config.analysis.scsynth_collection_prefix.replace("_", "-")
+        + ":whitening-digests"
+    )
+
+
+def get_fitted_digests_key() -> str:
+    return (
+        config.analysis.scsynth_collection_prefix.replace("_", "-")
+        + ":whitener-digests"
+    )
+
+
+def get_pending_key() -> str:
+    return (
+        config.analysis.scsynth_collection_prefix.replace("_", "-")
+        + ":whitening-pending"
+    )
+
+
+def compute_statistics(array: numpy.ndarray) -> WhiteningStatistics:
+    """
+    Compute the per-column count, mean and sum of squared deviations of an
+    analysis.
+
+    Non-finite values are skipped per column, as ``StandardScaler`` does, so a
+    single bad frame can't poison the running statistics.
+    """
+    array = numpy.asarray(array, dtype=numpy.float64)
+    is_finite = numpy.isfinite(array)
+    count = is_finite.sum(axis=0)
+    mean = numpy.where(is_finite, array, 0.0).sum(axis=0) / numpy.maximum(count, 1)
+    return {
+        "count": count.tolist(),
+        "mean": mean.tolist(),
+        "m2": numpy.where(is_finite, (array - mean) ** 2, 0.0).sum(axis=0).tolist(),
+    }
+
+
+def merge_statistics(
+    a: WhiteningStatistics, b: WhiteningStatistics
+) -> WhiteningStatistics:
+    """
+    Merge two sets of statistics exactly, via Chan et al.'s parallel
+    generalization of Welford's algorithm.
+    """
+    count_a, count_b = numpy.array(a["count"]), numpy.array(b["count"])
+    count = count_a + count_b
+    # Columns either side has no values for take the other side's as-is
+    weight = numpy.divide(count_b, count, out=numpy.zeros(len(count)), where=count > 0)
+    mean_a, mean_b = numpy.array(a["mean"]), numpy.array(b["mean"])
+    delta = mean_b - mean_a
+    mean = mean_a + delta * weight
+    m2 = numpy.array(a["m2"]) + numpy.array(b["m2"]) + delta**2 * count_a * weight
+    return {"count": count.tolist(), "mean": mean.tolist(), "m2": m2.tolist()}
+
+
+def statistics_to_scaler(statistics: WhiteningStatistics) -> StandardScaler:
+    """
+    Build a fitted scaler equivalent to fitting on every merged analysis.
+    """
+    count = numpy.array(statistics["count"])
+    var = numpy.array(statistics["m2"]) / numpy.maximum(count, 1)
+    scale = numpy.sqrt(var)
+    # As StandardScaler does, leave constant columns unscaled
+    scale[scale < 10 * numpy.finfo(scale.dtype).eps] = 1.0
+    scaler = StandardScaler()
+    scaler.mean_ = numpy.array(statistics["mean"])
+    scaler.n_features_in_ = len(scaler.mean_)
+    # As StandardScaler does, only count per column if the counts differ
+    scaler.n_samples_seen_ = int(count[0]) if (count == count[0]).all() else count
+    scaler.scale_ = scale
+    scaler.var_ = var
+    return scaler
+
+
+def scaler_to_statistics(scaler: StandardScaler) -> WhiteningStatistics:
+    mean = numpy.asarray(scaler.mean_)
+    count = numpy.broadcast_to(numpy.asarray(scaler.n_samples_seen_), mean.shape)
+    return {
+        "count": count.tolist(),
+        "mean": mean.tolist(),
+        "m2": (numpy.asarray(scaler.var_) * count).tolist(),
+    }
+
+
+def get_statistics(*, redis: redis.Redis) -> WhiteningStatistics | None:
+    if (data := redis.get(get_statistics_key())) is None:
+        return None
+    return cast(WhiteningStatistics, json.loads(cast(str, data)))
+
+
+def set_statistics(
+    *, redis: redis.Redis, statistics: WhiteningStatistics, digests: Iterable[str]
+) -> None:
+    """
+    Replace the global statistics with ``statistics``, fitted on exactly
+    ``digests``.
+    """
+    digests = list(digests)
+    with redis.pipeline() as pipeline:
+        pipeline.set(get_statistics_key(), json.dumps(statistics))
+        pipeline.delete(get_digests_key())
+        if digests:
+            pipeline.sadd(get_digests_key(), *digests)
+        pipeline.execute()
+
+
+def get_fitted_digests(*, redis: redis.Redis) -> list[str]:
+    """
+    Get the digests the current whitener was fitted on, if known.
+    """
+    return sorted(
+        digest.decode()
+        for digest in cast(set[bytes], redis.smembers(get_fitted_digests_key()))
+    )
+
+
+def set_fitted_digests(*, redis: redis.Redis, digests: Iterable[str]) -> None:
+    digests = list(digests)
+    with redis.pipeline() as pipeline:
+        pipeline.delete(get_fitted_digests_key())
+        if digests:
+            pipeline.sadd(get_fitted_digests_key(), *digests)
+        pipeline.execute()
+
+
+def covers_digests(*, redis: redis.Redis, digests: Sequence[str]) -> bool:
+    """
+    Check if every digest has been merged into the global statistics.
+    """
+    merged = cast(set[bytes], redis.smembers(get_digests_key()))
+    return {digest.encode() for digest in digests} <= merged
+
+
+def merge_statistics_into_redis(
+    *,
+    redis: redis.Redis,
+    statistics: WhiteningStatistics,
+    digest: str,
+    seed: WhiteningStatistics | None = None,
+    seed_digests: Iterable[str] = (),
+) -> WhiteningStatistics:
+    """
+    Atomically merge a digest's ``statistics`` into the global statistics held
+    in Redis, once per digest.
+
+    Missing global statistics are seeded with ``seed``, typically those of the
+    current whitener, rather than started from a single digest. The seed
+    already counts ``seed_digests``, typically those the whitener was fitted
+    on, so they aren't merged again. Concurrent merges are retried via WATCH /
+    MULTI.
+    """
+    key, digests_key = get_statistics_key(), get_digests_key()
+    seed_digests = set(seed_digests)
+    merged = statistics
+
+    def merge(pipeline: Pipeline) -> None:
+        nonlocal merged
+        data = cast(str | None, pipeline.get(key))
+        seeded = set() if data is not None or seed is None else seed_digests
+        current = json.loads(data) if data is not None else seed
+        is_merged = digest in seeded or bool(pipeline.sismember(digests_key, digest))
+        if is_merged and current is not None:
+            merged = current
+            # Unless the seed is yet to be stored, there's nothing to write
+            if data is not None:
+                return
+        elif current is not None:
+            merged = merge_statistics(current, statistics)
+        else:
+            merged = statistics
+        pipeline.multi()
+        pipeline.set(key, json.dumps(merged))
+        pipeline.sadd(digests_key, digest, *seeded)
+
+    redis.transaction(merge, key, digests_key)
+    return merged
+
+
+def get_drift(statistics: WhiteningStatistics, scaler: StandardScaler) -> float:
+    """
+    Measure how far the running statistics have drifted from a whitener.
+
+    The largest per-column shift in mean, in units of the whitener's scale, or
+    log-ratio of scales.
+    """
+    running = statistics_to_scaler(statistics)
+    mean_drift = numpy.abs(running.mean_ - scaler.mean_) / scaler.scale_
+    scale_drift = numpy.abs(numpy.log(running.scale_ / scaler.scale_))
+    return float(max(mean_drift.max(), scale_drift.max()))
@@ -72,6 +72,11 @@ def on_setup_logging(*args, **kwargs):
 
 @worker_process_init.connect
 def on_worker_process_init(**kwargs) -> None:
-    from ..core import milvus
+    from ..core import ast, scsynth, vector_store
 
-    milvus.connect()
+    vector_store.get_vector_store().connect(
+        [
+            ast.get_ast_spec(),
+            *(plan.spec for plan in scsynth.get_index_plans().values()),
+        ]
+    )
@@ -10,7 +10,7 @@ from celery.utils.log import get_task_logger
 
 from ..config import config
 from ..constants import AST_ENTRIES_FILENAME, AUDIO_FILENAME
-from ..core import ast
+from ..core import ast, flushing
 from ..core.s3 import create_s3_client
 from ..core.utils import make_data_key, timer
 
@@ -78,8 +78,6 @@ def insert_ast_entries(
 ) -> tuple[str, str]:
     job_id, digest = job_id_and_digest
     logger.info(f"Inserting {digest} ...")
-    # create partition
-    ast.create_ast_partition(digest)
     # loop over entry jsons and insert
     client = create_s3_client()
     with timer(logger, f"Inserted {digest} in " + "{time:.03f} seconds"):
@@ -94,6 +92,11 @@ def insert_ast_entries(
                 )
                 data = json.loads(entries_path.read_text())
                 ast.insert_ast_entries(
-                    digest=digest, entries=data["entries"], partition_name=digest
+                    digest=digest, entries=data["entries"], hop_ms=hop, length_ms=length
+                )
+                flushing.mark_dirty(
+                    redis=self.redis,
+                    names=[ast.get_ast_spec().name],
+                    rows=len(data["entries"]),
                 )
     return job_id, digest
@@ -1,11 +1,55 @@
 from celery import shared_task
+from celery.utils.log import get_task_logger
 
 from ..config import config
-from ..core import ast, scsynth
+from ..core import ast, cache, flushing, scsynth, vector_store
+
+logger = get_task_logger(__name__)
+
+
+def get_specs() -> list[vector_store.CollectionSpec]:
+    return [
+        ast.get_ast_spec(),
+        *(index_plan.spec for index_plan in scsynth.get_index_plans().values()),
+    ]
 
 
 @shared_task(bind=True)
-def flush_milvus(self, *args, **kwargs) -> None:
-    ast.get_ast_collection().flush()
-    for index_config in config.analysis.scsynth_indices:
-        scsynth.get_scsynth_collection(index_config["alias"]).flush()
+def flush_milvus(
+    self, *args, force: bool = False, scheduled: bool = False, **kwargs
+) -> None:
+    """
+    Flush the collections due a flush, coalescing flushes requested while
+    another ran within ``config.milvus.flush_interval``.
+
+    Collections left dirty are flushed by a single deferred flush. Flushing
+    with ``force`` flushes every collection, for callers waiting for their
+    entries to be visible.
+    """
+    if scheduled:
+        flushing.release_scheduled_flush(redis=self.redis)
+    specs = {spec.name: spec for spec in get_specs()}
+    claimed, delay = flushing.claim_flushes(
+        redis=self.redis,
+        names=list(specs),
+        interval=config.milvus.flush_interval,
+        max_rows=config.milvus.flush_rows,
+        force=force,
+    )
+    store = vector_store.get_vector_store()
+    unflushed = dict(claimed)
+    try:
+        for name in claimed:
+            logger.info(f"Flushing {name} ...")
+            store.flush(specs[name])
+            del unflushed[name]
+    except Exception:
+        # Keep the collections not flushed dirty, for the next flush to retry
+        flushing.unclaim_flushes(redis=self.redis, claimed=unflushed)
+        raise
+    finally:
+        if len(unflushed) < len(claimed):
+            # Newly flushed entries invalidate every cached query result
+            cache.bump_generation(redis=self.redis)
+    if delay is not None and flushing.schedule_flush(redis=self.redis, delay=delay):
+        flush_milvus.apply_async(kwargs=dict(scheduled=True), countdown=delay)
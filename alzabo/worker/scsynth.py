@@ -1,57 +1,137 @@
 import asyncio
-import json
 from itertools import product
 from pathlib import Path
 from tempfile import TemporaryDirectory
-from typing import Sequence
+from typing import Iterable, Sequence
+from uuid import uuid4
 
 import numpy
 from botocore.exceptions import ClientError
-from celery import shared_task
+from celery import chord, group, shared_task
 from celery.utils.log import get_task_logger
-from sklearn.preprocessing import StandardScaler
+from mypy_boto3_s3.client import S3Client
+from redis import Redis
 
 from ..config import config
 from ..constants import (
     AUDIO_FILENAME,
     SCSYNTH_ANALYSIS_RAW_FILENAME,
-    SCSYNTH_ANALYSIS_WHITENED_FILENAME,
+    SCSYNTH_ANALYSIS_RAW_LEGACY_FILENAME,
+    SCSYNTH_ANALYSIS_SIZE,
     SCSYNTH_ENTRIES_FILENAME,
+    SCSYNTH_ENTRIES_LEGACY_FILENAME,
 )
-from ..core import scsynth
+from ..core import flushing, scsynth, whitening
 from ..core.s3 import create_s3_client, list_digests
 from ..core.utils import make_data_key, timer
+from .milvus import flush_milvus
 
 logger = get_task_logger(__name__)
 
+LEGACY_FILENAMES = {SCSYNTH_ANALYSIS_RAW_FILENAME: SCSYNTH_ANALYSIS_RAW_LEGACY_FILENAME}
+
+
+def download_artifact(
+    client: S3Client, digest: str, filename: str, legacy_filename: str, directory: Path
+) -> Path:
+    """
+    Download an artifact, falling back to its legacy JSON artifact.
+    """
+    path = directory / filename
+    for filename_ in (filename, legacy_filename):
+        try:
+            client.download_file(
+                Bucket=config.s3.data_bucket,
+                Filename=str(path),
+                Key=f"{make_data_key(digest)}/{filename_}",
+            )
+            return path
+        except ClientError as e:
+            if e.response["Error"]["Code"] not in ("404", "NoSuchKey"):
+                raise
+    raise ValueError(f"No {filename} for {digest}")
+
+
+def download_analysis(
+    client: S3Client, digest: str, filename: str, directory: Path, mmap: bool = False
+) -> numpy.ndarray:
+    """
+    Download and load an analysis, falling back to its legacy JSON artifact.
+    """
+    return scsynth.load_analysis(
+        download_artifact(
+            client, digest, filename, LEGACY_FILENAMES[filename], directory
+        ),
+        mmap=mmap,
+    )
+
+
+def download_entries(
+    client: S3Client, digest: str, hop: int, length: int, directory: Path
+) -> numpy.ndarray:
+    """
+    Download and load partitioned entries, falling back to their legacy JSON
+    artifact.
+    """
+    return scsynth.load_entries(
+        download_artifact(
+            client,
+            digest,
+            SCSYNTH_ENTRIES_FILENAME.format(hop=hop, length=length),
+            SCSYNTH_ENTRIES_LEGACY_FILENAME.format(hop=hop, length=length),
+            directory,
+        )
+    )
+
+
+def has_artifact(
+    client: S3Client, digest: str, filename: str, legacy_filename: str
+) -> bool:
+    """
+    Check if an artifact, or its legacy JSON artifact, exists.
+    """
+    for filename_ in (filename, legacy_filename):
+        try:
+            client.head_object(
+                Bucket=config.s3.data_bucket, Key=f"{make_data_key(digest)}/{filename_}"
+            )
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] != "404":
+                raise
+    return False
+
+
+def has_analysis(client: S3Client, digest: str, filename: str) -> bool:
+    """
+    Check if an analysis, or its legacy JSON artifact, exists.
+    """
+    return has_artifact(client, digest, filename, LEGACY_FILENAMES[filename])
+
+
+def has_analyses(client: S3Client, digest: str) -> bool:
+    """
+    Check if the raw analysis exists, whitened features being derived from it.
+    """
+    return has_analysis(client, digest, SCSYNTH_ANALYSIS_RAW_FILENAME)
+
 
 @shared_task(bind=True)
 def analyze_via_scsynth(self, job_id_and_digest: tuple[str, str]) -> tuple[str, str]:
     """
     Analyze an audio file via NRT scsynth and upload to S3.
 
-    Generate and upload a whitened version as well, based on the current
-    whitening parameters cached in Redis.
+    Only the raw analysis is uploaded, as whitened features are derived from
+    raw aggregates and the current whitener.
     """
     job_id, digest = job_id_and_digest
     logger.info(f"Analyzing {digest} ...")
     with timer(logger, f"Analyzed {digest} in " + "{time:.03f} seconds"):
         client = create_s3_client()
-        data_key = make_data_key(digest)
-        try:
-            # Return early if both analyses already exist
-            client.head_object(
-                Bucket=config.s3.data_bucket,
-                Key=f"{data_key}/{SCSYNTH_ANALYSIS_RAW_FILENAME}",
-            )
-            client.head_object(
-                Bucket=config.s3.data_bucket,
-                Key=f"{data_key}/{SCSYNTH_ANALYSIS_WHITENED_FILENAME}",
-            )
+        # Return early if the analyses already exist
+        if has_analyses(client, digest):
             logger.info(f"Already analyzed {digest}!")
             return job_id, digest
-        except ClientError:
-            pass
         with TemporaryDirectory() as temp_directory:
             source_path = Path(temp_directory) / AUDIO_FILENAME
             client.download_file(
@@ -59,22 +139,113 @@ def analyze_via_scsynth(self, job_id_and_digest: tuple[str, str]) -> tuple[str,
                 Bucket=config.s3.data_bucket,
                 Key=f"{make_data_key(digest)}/{AUDIO_FILENAME}",
             )
-            raw_analysis_array = asyncio.run(scsynth.analyze(source_path))
-            whitened_analysis_array = scsynth.whiten(
-                array=raw_analysis_array, redis=self.redis
+            raw_analysis_array = asyncio.run(
+                scsynth.analyze_chunked(
+                    source_path,
+                    chunk_seconds=config.analysis.scsynth_chunk_seconds,
+                    concurrency=config.analysis.scsynth_concurrency,
+                )
             )
-            for filename, array in [
-                (SCSYNTH_ANALYSIS_RAW_FILENAME, raw_analysis_array),
-                (SCSYNTH_ANALYSIS_WHITENED_FILENAME, whitened_analysis_array),
-            ]:
-                path = Path(temp_directory) / filename
-                path.write_text(json.dumps(array.tolist(), indent=2, sort_keys=True))
-                client.upload_file(
-                    Filename=str(path),
+            upload_analyses(
+                client, digest, raw_analysis_array, self.redis, Path(temp_directory)
+            )
+    return job_id, digest
+
+
+@shared_task(bind=True)
+def analyze_many_via_scsynth(
+    self, job_ids_and_digests: Sequence[tuple[str, str]]
+) -> list[tuple[str, str]]:
+    """
+    Analyze many audio files via a single NRT scsynth render and upload to S3.
+
+    Digests whose analyses already exist are skipped.
+    """
+    logger.info(f"Analyzing {len(job_ids_and_digests)} digests ...")
+    with timer(
+        logger,
+        f"Analyzed {len(job_ids_and_digests)} digests in " + "{time:.03f} seconds",
+    ):
+        client = create_s3_client()
+        digests = [
+            digest
+            for digest in dict.fromkeys(digest for _, digest in job_ids_and_digests)
+            if not has_analyses(client, digest)
+        ]
+        if not digests:
+            return [(job_id, digest) for job_id, digest in job_ids_and_digests]
+        with TemporaryDirectory() as temp_directory:
+            source_paths: list[Path] = []
+            for digest in digests:
+                source_path = Path(temp_directory) / f"{digest}.wav"
+                client.download_file(
+                    Filename=str(source_path),
                     Bucket=config.s3.data_bucket,
-                    Key=f"{make_data_key(digest)}/{filename}",
+                    Key=f"{make_data_key(digest)}/{AUDIO_FILENAME}",
                 )
-    return job_id, digest
+                source_paths.append(source_path)
+            raw_analysis_arrays = asyncio.run(scsynth.analyze_many(source_paths))
+            for digest, raw_analysis_array in zip(digests, raw_analysis_arrays):
+                upload_analyses(
+                    client, digest, raw_analysis_array, self.redis, Path(temp_directory)
+                )
+    return [(job_id, digest) for job_id, digest in job_ids_and_digests]
+
+
+def upload_analyses(
+    client: S3Client,
+    digest: str,
+    raw_analysis_array: numpy.ndarray,
+    redis: Redis,
+    directory: Path,
+) -> None:
+    """
+    Upload a raw analysis, merging it into the running whitening statistics.
+    """
+    update_whitening_statistics(digest, raw_analysis_array, redis)
+    path = directory / SCSYNTH_ANALYSIS_RAW_FILENAME
+    scsynth.save_analysis(
+        path, raw_analysis_array, compressed=config.analysis.scsynth_analysis_compressed
+    )
+    client.upload_file(
+        Filename=str(path),
+        Bucket=config.s3.data_bucket,
+        Key=f"{make_data_key(digest)}/{SCSYNTH_ANALYSIS_RAW_FILENAME}",
+    )
+
+
+def update_whitening_statistics(
+    digest: str, raw_analysis_array: numpy.ndarray, redis: Redis
+) -> None:
+    """
+    Merge a raw analysis into the running whitening statistics, and schedule
+    a re-whitening once they drift too far from the current whitener.
+
+    Missing statistics are seeded from the current whitener, so the first
+    analysis merged doesn't stand in for the whole corpus, but only if the
+    digests it was fitted on are known, so none are counted twice.
+    """
+    seed, seed_digests = None, []
+    if whitening.get_statistics(redis=redis) is None and (
+        seed_digests := whitening.get_fitted_digests(redis=redis)
+    ):
+        seed = whitening.scaler_to_statistics(scsynth.get_whitener(redis=redis))
+    statistics = whitening.merge_statistics_into_redis(
+        redis=redis,
+        statistics=whitening.compute_statistics(raw_analysis_array),
+        digest=digest,
+        seed=seed,
+        seed_digests=seed_digests,
+    )
+    if (threshold := config.analysis.whitening_drift_threshold) is None:
+        return
+    drift = whitening.get_drift(statistics, scsynth.get_whitener(redis=redis))
+    if drift <= threshold:
+        return
+    # Only schedule one re-whitening at a time
+    if redis.set(whitening.get_pending_key(), 1, nx=True, ex=60 * 60 * 24):
+        logger.info(f"Whitening drifted by {drift:.03f}, re-whitening ...")
+        whiten.delay()
 
 
 @shared_task(bind=True)
@@ -85,7 +256,7 @@ def partition_scsynth_analysis(
     lengths: Sequence[int] | None = None,
 ) -> tuple[str, str]:
     """
-    Partition an scsynth analysis into multiple entries JSON files.
+    Partition an scsynth analysis into multiple entries NPY files.
     """
     job_id, digest = job_id_and_digest
     logger.info(f"Partitioning {digest} ...")
@@ -93,58 +264,43 @@ def partition_scsynth_analysis(
     hops_ = hops or config.analysis.hops
     lengths_ = lengths or config.analysis.lengths
     with timer(logger, f"Partitioned {digest} in " + "{time:.03f} seconds"):
+        missing: list[tuple[int, int]] = []
+        for hop, length in product(hops_, lengths_):
+            if has_artifact(
+                client,
+                digest,
+                SCSYNTH_ENTRIES_FILENAME.format(hop=hop, length=length),
+                SCSYNTH_ENTRIES_LEGACY_FILENAME.format(hop=hop, length=length),
+            ):
+                logger.info(f"Already partitioned {digest} with {hop=} / {length=}!")
+            else:
+                missing.append((hop, length))
+        if not missing:
+            return job_id, digest
         with TemporaryDirectory() as temp_directory:
-            raw_analysis_path = Path(temp_directory) / SCSYNTH_ANALYSIS_RAW_FILENAME
-            whitened_analysis_path = (
-                Path(temp_directory) / SCSYNTH_ANALYSIS_WHITENED_FILENAME
-            )
-            client.download_file(
-                Bucket=config.s3.data_bucket,
-                Filename=str(raw_analysis_path),
-                Key=f"{make_data_key(digest)}/{SCSYNTH_ANALYSIS_RAW_FILENAME}",
-            )
-            client.download_file(
-                Bucket=config.s3.data_bucket,
-                Filename=str(whitened_analysis_path),
-                Key=f"{make_data_key(digest)}/{SCSYNTH_ANALYSIS_WHITENED_FILENAME}",
+            raw_analysis = download_analysis(
+                client,
+                digest,
+                SCSYNTH_ANALYSIS_RAW_FILENAME,
+                Path(temp_directory),
+                mmap=True,
             )
-            raw_analysis = numpy.array(json.loads(raw_analysis_path.read_text()))
-            whitened_analysis = numpy.array(
-                json.loads(whitened_analysis_path.read_text())
-            )
-            for hop, length in product(hops_, lengths_):
-                logger.info(f"Partitioning {digest} with {hop=} / {length=} ...")
+            # Partition every missing resolution in one pass over the analysis,
+            # aggregating the raw analysis only, as queries do
+            analysis_sums = scsynth.AnalysisSums(raw_analysis)
+            for (hop, length), entries in analysis_sums.partition_many_arrays(
+                resolutions=missing
+            ).items():
+                logger.info(f"Partitioned {digest} with {hop=} / {length=}")
                 entries_filename = SCSYNTH_ENTRIES_FILENAME.format(
                     hop=hop, length=length
                 )
-                entries_key = f"{make_data_key(digest)}/{entries_filename}"
-                try:
-                    client.head_object(Bucket=config.s3.data_bucket, Key=entries_key)
-                    logger.info(
-                        f"Already partitioned {digest} with {hop=} / {length=}!"
-                    )
-                    continue
-                except ClientError as e:
-                    if e.response["Error"]["Code"] != "404":
-                        raise
-                entries = scsynth.partition(
-                    hop_ms=hop,
-                    length_ms=length,
-                    raw_analysis=raw_analysis,
-                    whitened_analysis=whitened_analysis,
-                )
                 entries_path = Path(temp_directory) / entries_filename
-                entries_path.write_text(
-                    json.dumps(
-                        dict(digest=digest, entries=entries, hop=hop, length=length),
-                        indent=2,
-                        sort_keys=True,
-                    )
-                )
+                scsynth.save_entries(entries_path, entries)
                 client.upload_file(
                     Bucket=config.s3.data_bucket,
                     Filename=str(entries_path),
-                    Key=entries_key,
+                    Key=f"{make_data_key(digest)}/{entries_filename}",
                 )
     return job_id, digest
 
@@ -154,64 +310,137 @@ def insert_scsynth_entries(
     self, job_id_and_digest: tuple[str, str], whitened: bool = False
 ) -> tuple[str, str]:
     """
-    Insert entries for ``digest`` into Milvus as a partition.
+    Insert entries for ``digest`` into every scsynth collection, which are
+    partitioned by digest.
 
-    Drop any pre-existing partition to prevent duplicates.
+    Entries are partitioned from raw analyses, so derive their whitened
+    features from the current whitener.
     """
     job_id, digest = job_id_and_digest
     logger.info(f"Inserting {digest} ...")
-    # loop over entry jsons and insert
+    # loop over entry files and insert
     client = create_s3_client()
+    scaler = scsynth.get_whitener(redis=self.redis)
     with timer(logger, f"Inserted {digest} in " + "{time:.03f} seconds"):
         with TemporaryDirectory() as temp_directory:
             for hop, length in product(config.analysis.hops, config.analysis.lengths):
-                entries_filename = (
-                    SCSYNTH_ENTRIES_FILENAME if whitened else SCSYNTH_ENTRIES_FILENAME
-                ).format(hop=hop, length=length)
-                entries_path = Path(temp_directory) / entries_filename
-                client.download_file(
-                    Bucket=config.s3.data_bucket,
-                    Filename=str(entries_path),
-                    Key=f"{make_data_key(digest)}/{entries_filename}",
+                entries = download_entries(
+                    client, digest, hop, length, Path(temp_directory)
                 )
-                data = json.loads(entries_path.read_text())
+                entries = scsynth.derive_whitened_entries(entries, scaler)
                 scsynth.insert_scsynth_entries(
-                    digest=digest, entries=data["entries"], partition_name=digest
+                    digest=digest, entries=entries, hop_ms=hop, length_ms=length
+                )
+                flushing.mark_dirty(
+                    redis=self.redis,
+                    names=[
+                        index_plan.spec.name
+                        for index_plan in scsynth.get_index_plans().values()
+                    ],
+                    rows=len(entries),
                 )
     return job_id, digest
 
 
+def shard_digests(digests: Iterable[str], shard_size: int) -> list[list[str]]:
+    digests = list(digests)
+    return [
+        digests[i : i + shard_size] for i in range(0, len(digests), max(shard_size, 1))
+    ]
+
+
+def transform_whitening(
+    statistics: whitening.WhiteningStatistics, shards: list[list[str]]
+) -> None:
+    """
+    Store the whitener, then re-insert every shard's entries, re-deriving
+    their whitened features from it.
+    """
+    finish_whitening.delay(statistics, shards)
+
+
 @shared_task(bind=True)
 def whiten(self) -> None:
+    """
+    Re-whiten every digest's entries, fanned out across workers in shards of
+    digests.
+
+    Fit from the running statistics when they cover every digest. Otherwise
+    fit each shard in parallel, merge the shards' statistics, and re-seed the
+    running statistics before storing the whitener.
+    """
     logger.info("Whitening ...")
+    digests = list(list_digests(create_s3_client()))
+    shards = shard_digests(digests, config.analysis.whitening_shard_size)
+    if (
+        statistics := whitening.get_statistics(redis=self.redis)
+    ) and whitening.covers_digests(redis=self.redis, digests=digests):
+        transform_whitening(statistics, shards)
+    else:
+        chord(
+            group(fit_whitening_shard.si(shard) for shard in shards),
+            reduce_whitening_statistics.s(shards),
+        ).delay()
+
+
+@shared_task(bind=True)
+def fit_whitening_shard(self, digests: list[str]) -> whitening.WhiteningStatistics:
     s3_client = create_s3_client()
-    scaler = StandardScaler()
-    for digest in list_digests(s3_client):
-        logger.info(f"Fitting {digest} ...")
-        data = json.loads(
-            s3_client.get_object(
-                Bucket=config.s3.data_bucket,
-                Key=make_data_key(digest) + "/" + SCSYNTH_ANALYSIS_RAW_FILENAME,
-            )["Body"].read()
-        )
-        scaler.partial_fit(data)
-    logger.info("... fitting done: {scaler.get_params()}")
-    for digest in list_digests(s3_client):
-        logger.info(f"Transforming {digest} ...")
-        data = json.loads(
-            s3_client.get_object(
-                Bucket=config.s3.data_bucket,
-                Key=make_data_key(digest) + "/" + SCSYNTH_ANALYSIS_RAW_FILENAME,
-            )["Body"].read()
-        )
-        transformed_data = scaler.transform(data).tolist()
-        with TemporaryDirectory() as temp_path:
-            path = Path(temp_path) / "data.json"
-            path.write_text(json.dumps(transformed_data))
-            s3_client.upload_file(
-                Bucket=config.s3.data_bucket,
-                Filename=str(path),
-                Key=make_data_key(digest) + "/" + SCSYNTH_ANALYSIS_WHITENED_FILENAME,
+    statistics = whitening.compute_statistics(numpy.empty((0, SCSYNTH_ANALYSIS_SIZE)))
+    with TemporaryDirectory() as temp_directory:
+        for digest in digests:
+            logger.info(f"Fitting {digest} ...")
+            statistics = whitening.merge_statistics(
+                statistics,
+                whitening.compute_statistics(
+                    download_analysis(
+                        s3_client,
+                        digest,
+                        SCSYNTH_ANALYSIS_RAW_FILENAME,
+                        Path(temp_directory),
+                    )
+                ),
             )
-    logger.info("... transforming done!")
-    scsynth.serialize_whitener(redis=self.redis, scaler=scaler)
+    return statistics
+
+
+@shared_task(bind=True)
+def reduce_whitening_statistics(
+    self, shard_statistics: list[whitening.WhiteningStatistics], shards: list[list[str]]
+) -> None:
+    statistics = whitening.compute_statistics(numpy.empty((0, SCSYNTH_ANALYSIS_SIZE)))
+    for statistics_ in shard_statistics:
+        statistics = whitening.merge_statistics(statistics, statistics_)
+    logger.info(f"... fitting done: {max(statistics['count'])} samples")
+    whitening.set_statistics(
+        redis=self.redis,
+        statistics=statistics,
+        digests=[digest for shard in shards for digest in shard],
+    )
+    transform_whitening(statistics, shards)
+
+
+@shared_task(bind=True)
+def finish_whitening(
+    self, statistics: whitening.WhiteningStatistics, shards: list[list[str]]
+) -> None:
+    scsynth.serialize_whitener(
+        redis=self.redis, scaler=whitening.statistics_to_scaler(statistics)
+    )
+    whitening.set_fitted_digests(
+        redis=self.redis, digests=[digest for shard in shards for digest in shard]
+    )
+    self.redis.delete(whitening.get_pending_key())
+    logger.info("... whitener stored, re-inserting entries ...")
+    chord(
+        group(reinsert_scsynth_shard.si(shard) for shard in shards), flush_milvus.si()
+    ).delay()
+
+
+@shared_task(bind=True)
+def reinsert_scsynth_shard(self, digests: list[str]) -> None:
+    """
+    Re-insert a shard's entries, replacing their now stale whitened features.
+    """
+    for digest in digests:
+        insert_scsynth_entries([str(uuid4()), digest])
@@ -5,12 +5,14 @@ from .ast import analyze_via_ast, insert_ast_entries
 from .audio import transcode_and_hash_audio, upload_audio
 from .milvus import flush_milvus
 from .scsynth import (
+    analyze_many_via_scsynth,
     analyze_via_scsynth,
     insert_scsynth_entries,
     partition_scsynth_analysis,
 )
 
 __all__ = [
+    "analyze_many_via_scsynth",
     "analyze_via_ast",
     "analyze_via_scsynth",
     "flush_milvus",
@@ -23,13 +25,25 @@ __all__ = [
 ]
 
 
-def get_audio_processing_chain(job_id: str, url: str) -> chain:
-    ast_chain = analyze_via_ast.s() | insert_ast_entries.s() | flush_milvus.s()
+def get_audio_processing_chain(
+    job_id: str, url: str, *, wait_for_flush: bool = False
+) -> chain:
+    """
+    Build the chain processing the audio at ``url``, ending in a flush.
+
+    Flushes are coalesced, unless ``wait_for_flush``, in which case the chain
+    completes only once its entries have been flushed.
+    """
+    ast_chain = (
+        analyze_via_ast.s()
+        | insert_ast_entries.s()
+        | flush_milvus.s(force=wait_for_flush)
+    )
     scsynth_chain = (
         analyze_via_scsynth.s()
         | partition_scsynth_analysis.s()
         | insert_scsynth_entries.s()
-        | flush_milvus.s()
+        | flush_milvus.s(force=wait_for_flush)
     )
     analysis_group = group(scsynth_chain)
     if config.ast.enabled:
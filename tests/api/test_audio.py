@@ -25,15 +25,17 @@ async def test_batch(api_client, mocker, recordings_path, s3_client):
     uuids = [uuid.uuid4() for _ in range(len(urls))]
     mocker.patch("alzabo.api.audio.uuid4", side_effect=uuids)
     mock_task = mocker.patch("alzabo.worker.tasks.get_audio_processing_chain")
-    response = await api_client.post("/audio/batch", json=dict(urls=urls))
+    response = await api_client.post(
+        "/audio/batch", json=dict(urls=urls, wait_for_flush=True)
+    )
     assert response.status == 200
     assert await response.json() == {"jobs": [str(x) for x in uuids]}
     assert mock_task.mock_calls == [
-        mock.call(str(uuids[0]), urls[0]),
+        mock.call(str(uuids[0]), urls[0], wait_for_flush=True),
         mock.call()(),
-        mock.call(str(uuids[1]), urls[1]),
+        mock.call(str(uuids[1]), urls[1], wait_for_flush=True),
         mock.call()(),
-        mock.call(str(uuids[2]), urls[2]),
+        mock.call(str(uuids[2]), urls[2], wait_for_flush=True),
         mock.call()(),
     ]
 
@@ -99,7 +101,11 @@ async def test_upload(api_client, filename, mocker, recordings_path, s3_client):
     response = await api_client.post("/audio/upload", data=data)
     assert response.status == 200
     assert mock_task.mock_calls == [
-        mock.call(str(uuids[0]), f"s3://{config.s3.uploads_bucket}/{uuids[1]}"),
+        mock.call(
+            str(uuids[0]),
+            f"s3://{config.s3.uploads_bucket}/{uuids[1]}",
+            wait_for_flush=False,
+        ),
         mock.call()(),
     ]
     s3_client.head_object(Bucket=config.s3.uploads_bucket, Key=str(uuids[1]))
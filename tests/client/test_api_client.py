@@ -72,6 +72,41 @@ async def test_query_ast(
     )
 
 
+@pytest.mark.asyncio
+async def test_query_ast_batch(
+    api_client: APIClient, data: None, recordings_path: Path
+) -> None:
+    upload_response = await api_client.query_ast_upload(
+        path=recordings_path / "ibn-arabi-44100-1s.wav"
+    )
+    batch_response = await api_client.query_ast_batch(
+        queries=[
+            {"vector": upload_response["vector"]},
+            {"partitions": ["no-such-partition"], "vector": upload_response["vector"]},
+            {"vector": upload_response["vector"]},
+        ]
+    )
+    assert len(batch_response["entries"]) == 3
+    assert batch_response["entries"][0] == upload_response["entries"]
+    assert batch_response["entries"][2] == upload_response["entries"]
+
+
+@pytest.mark.asyncio
+async def test_query_ast_lengths(
+    api_client: APIClient, data: None, recordings_path: Path
+) -> None:
+    upload_response = await api_client.query_ast_upload(
+        path=recordings_path / "ibn-arabi-44100-1s.wav", lengths=[1250]
+    )
+    assert upload_response["entries"] and all(
+        entry["frame_count"] == 60000 for entry in upload_response["entries"]
+    )
+    query_response = await api_client.query_ast(
+        lengths=[1250], vector=upload_response["vector"]
+    )
+    assert query_response["entries"] == upload_response["entries"]
+
+
 @pytest.mark.asyncio
 async def test_query_ast_upload(
     api_client: APIClient, data: None, recordings_path: Path
@@ -688,6 +723,34 @@ async def test_query_scsynth(
     assert query_response["entries"] and (
         query_response["entries"] == upload_response["entries"]
     )
+    assert query_response["timing"]["query_cache_misses"] == 1.0
+    # Repeated queries are answered from the query cache
+    query_response = await api_client.query_scsynth(vector=upload_response["vector"])
+    assert query_response["entries"] == upload_response["entries"]
+    assert query_response["timing"]["query_cache_hits"] == 1.0
+    assert query_response["timing"]["query_cache_misses"] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_query_scsynth_batch(
+    api_client: APIClient, data: None, recordings_path: Path
+) -> None:
+    upload_response = await api_client.query_scsynth_upload(
+        path=recordings_path / "ibn-arabi-44100-1s.wav"
+    )
+    batch_response = await api_client.query_scsynth_batch(
+        queries=[
+            {"vector": upload_response["vector"], "voiced": True},
+            {"vector": upload_response["vector"], "voiced": False},
+            {"vector": upload_response["vector"]},
+        ]
+    )
+    assert len(batch_response["entries"]) == 3
+    assert batch_response["entries"][0] == upload_response["entries"]
+    assert all(
+        entry not in upload_response["entries"]
+        for entry in batch_response["entries"][1]
+    )
 
 
 @pytest.mark.asyncio
@@ -76,6 +76,7 @@ def alzabo_config(monkeypatch) -> None:
     """
     monkeypatch.setattr(config.analysis, "ast_collection_prefix", "test_ast")
     monkeypatch.setattr(config.analysis, "scsynth_collection_prefix", "test_scsynth")
+    monkeypatch.setattr(config.analysis, "whitening_drift_threshold", None)
     monkeypatch.setattr(config.api, "auth_enabled", False)
     monkeypatch.setattr(config.open_telemetry, "enabled", False)
     monkeypatch.setattr(config.s3, "data_bucket", "test-data")
@@ -111,7 +112,7 @@ def data(
             "dd88610b66f3f053243f8f315345381fc70bca20d48ba32e27a7841d7676f969",
         ]
     )
-    alzabo.worker.tasks.flush_milvus()
+    alzabo.worker.tasks.flush_milvus(force=True)
 
 
 @pytest.fixture(scope="session")
@@ -122,9 +123,8 @@ def milvus() -> None:
 @pytest.fixture
 def milvus_ast_collection(milvus) -> Collection:
     utility.drop_collection(alzabo.core.ast.get_ast_collection_name())
-    collection = alzabo.core.ast.create_ast_collection()
-    collection.load()
-    return collection
+    alzabo.core.ast.create_ast_collection()
+    return alzabo.core.ast.get_ast_collection()
 
 
 @pytest.fixture
@@ -134,11 +134,10 @@ def milvus_scsynth_collections(milvus) -> dict[str | None, Collection]:
         utility.drop_collection(
             alzabo.core.scsynth.get_scsynth_collection_name(index_config["alias"])
         )
-        collection = alzabo.core.scsynth.create_scsynth_collection(
+        alzabo.core.scsynth.create_scsynth_collection(index_config["alias"])
+        collections[index_config["alias"]] = alzabo.core.scsynth.get_scsynth_collection(
             index_config["alias"]
         )
-        collection.load()
-        collections[index_config["alias"]] = collection
     return collections
 
 
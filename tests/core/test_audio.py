@@ -0,0 +1,46 @@
+from pathlib import Path
+
+import numpy
+import pytest
+import soundfile
+
+from alzabo.core.audio import decode_audio_async
+
+
+@pytest.mark.asyncio
+async def test_decode_audio_async_wav(recordings_path: Path) -> None:
+    """
+    Mono WAVs at the target sample rate skip transcoding.
+    """
+    path = recordings_path / (
+        "af5ec6ae3e17614ebf7c2575dc8870cfbb32f12e5b7edabbdda2b02b8b9b7e5f.wav"
+    )
+    expected, _ = soundfile.read(path, dtype="float32")
+    actual = await decode_audio_async(path.read_bytes())
+    assert actual.dtype == numpy.float32
+    assert (actual == expected).all()
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "filename, sample_rate, duration",
+    [
+        ("ibn-arabi-44100-1s.wav", 48000, 1.0),
+        ("nabokov-22050.aiff", 48000, 13.2),
+        ("vandermeer-24000.mp3", 16000, 16.0),
+    ],
+)
+async def test_decode_audio_async_transcoded(
+    duration: float, filename: str, recordings_path: Path, sample_rate: int
+) -> None:
+    path = recordings_path / filename
+    actual = await decode_audio_async(path.read_bytes(), sample_rate=sample_rate)
+    assert actual.dtype == numpy.float32
+    assert actual.ndim == 1
+    assert len(actual) / sample_rate == pytest.approx(duration, abs=0.1)
+
+
+@pytest.mark.asyncio
+async def test_decode_audio_async_invalid() -> None:
+    with pytest.raises(ValueError):
+        await decode_audio_async(b"not audio")
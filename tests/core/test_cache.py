@@ -0,0 +1,124 @@
+import concurrent.futures
+from typing import Iterator, cast
+
+import pytest
+import redis
+
+from alzabo.config import config
+from alzabo.core.cache import (
+    CACHE_INDEX_KEY,
+    QueryCache,
+    bump_generation,
+    get_cache_key,
+    get_cached,
+    get_generation,
+    quantize_vector,
+    query_many,
+    set_cached,
+)
+
+
+@pytest.fixture
+def redis_client() -> Iterator[redis.Redis]:
+    client = redis.from_url(str(config.redis.url))
+    keys = client.zrange(CACHE_INDEX_KEY, 0, -1)
+    client.delete(CACHE_INDEX_KEY, *keys)
+    yield client
+    keys = client.zrange(CACHE_INDEX_KEY, 0, -1)
+    client.delete(CACHE_INDEX_KEY, *keys)
+
+
+def test_get_cache_key() -> None:
+    key = get_cache_key("scsynth", b"audio", engine="scsynth")
+    assert key.startswith("upload-cache:scsynth:")
+    assert key == get_cache_key("scsynth", b"audio", engine="scsynth")
+    assert key != get_cache_key("scsynth", b"audio", engine="numpy")
+    assert key != get_cache_key("scsynth", b"other audio", engine="scsynth")
+    assert key != get_cache_key("ast", b"audio", engine="scsynth")
+
+
+def test_get_and_set_cached(redis_client: redis.Redis) -> None:
+    keys = [get_cache_key("ast", str(i).encode()) for i in range(4)]
+    assert get_cached(redis=redis_client, key=keys[0], ttl=60) is None
+    for i, key in enumerate(keys[:3]):
+        set_cached(redis=redis_client, key=key, value=[i, 0.5], ttl=60, max_size=3)
+    assert get_cached(redis=redis_client, key=keys[0], ttl=60) == [0, 0.5]
+    # The least recently used entry is evicted
+    set_cached(redis=redis_client, key=keys[3], value=[3, 0.5], ttl=60, max_size=3)
+    assert get_cached(redis=redis_client, key=keys[1], ttl=60) is None
+    assert [get_cached(redis=redis_client, key=key, ttl=60) for key in keys] == [
+        [0, 0.5],
+        None,
+        [2, 0.5],
+        [3, 0.5],
+    ]
+    assert cast(int, redis_client.ttl(keys[3])) <= 60
+    # Hits refresh the TTL as well as the recency
+    redis_client.expire(keys[0], 5)
+    get_cached(redis=redis_client, key=keys[0], ttl=60)
+    assert cast(int, redis_client.ttl(keys[0])) > 5
+
+
+def test_generation(redis_client: redis.Redis) -> None:
+    generation = get_generation(redis=redis_client)
+    assert bump_generation(redis=redis_client) == generation + 1
+    assert get_generation(redis=redis_client) == generation + 1
+
+
+def test_quantize_vector() -> None:
+    assert quantize_vector([0.5, 1.0], 1e-4) == quantize_vector([0.50001, 1.0], 1e-4)
+    assert quantize_vector([0.5, 1.0], 1e-4) != quantize_vector([0.5001, 1.0], 1e-4)
+
+
+def test_query_cache() -> None:
+    queried: list[list[str]] = []
+
+    def query(keys: list[str]):
+        def query_(indices: list[int]):
+            queried.append([keys[i] for i in indices])
+            return [[{"digest": keys[i]}] for i in indices]
+
+        return query_
+
+    query_cache = QueryCache(max_size=3)
+    keys = ["a", "b", "c"]
+    results, hits = query_cache.query(generation=0, keys=keys, query=query(keys))
+    assert results == [[{"digest": "a"}], [{"digest": "b"}], [{"digest": "c"}]]
+    assert hits == 0
+    # Only misses are queried, and the least recently used entry is evicted
+    keys = ["c", "d", "a"]
+    results, hits = query_cache.query(generation=0, keys=keys, query=query(keys))
+    assert results == [[{"digest": "c"}], [{"digest": "d"}], [{"digest": "a"}]]
+    assert hits == 2
+    assert list(query_cache.results) == ["c", "a", "d"]
+    # A new generation drops every cached result
+    keys = ["a"]
+    _, hits = query_cache.query(generation=1, keys=keys, query=query(keys))
+    assert hits == 0
+    assert queried == [["a", "b", "c"], ["d"], ["a"]]
+
+
+@pytest.mark.asyncio
+async def test_query_many(redis_client: redis.Redis) -> None:
+    queried: list[list[int]] = []
+
+    def query(indices: list[int]):
+        queried.append(indices)
+        return [[{"digest": str(i)}] for i in indices]
+
+    query_cache = QueryCache(max_size=3)
+    with concurrent.futures.ThreadPoolExecutor() as executor:
+        for query_cache_ in (None, query_cache, query_cache):
+            results, timing = await query_many(
+                executor=executor,
+                keys=["a", "b"],
+                logger=None,
+                query=query,
+                query_cache=query_cache_,
+                redis=redis_client,
+            )
+            assert results == [[{"digest": "0"}], [{"digest": "1"}]]
+    assert timing["query_cache_hits"] == 2.0
+    assert timing["query_cache_misses"] == 0.0
+    assert timing["milvus"] >= 0.0
+    assert queried == [[0, 1], [0, 1]]
@@ -0,0 +1,84 @@
+from pathlib import Path
+
+import numpy
+import pytest
+
+from alzabo.constants import SCSYNTH_ANALYSIS_SIZE
+from alzabo.core import features
+from alzabo.core.scsynth import analyze
+
+
+def test_analyze_silence() -> None:
+    analysis = features.analyze(numpy.zeros(48000))
+    assert analysis.shape == (93, SCSYNTH_ANALYSIS_SIZE)
+    assert (analysis[:, :2] == features.SILENCE_DECIBELS).all()
+    assert (analysis[:, 2] == 69.0).all()
+    assert (analysis[:, 3:6] == 0.0).all()
+    assert (analysis[:, 6] == features.SILENCE_FLATNESS).all()
+    assert (analysis[:, 8:50] == 0.25).all()
+    assert (analysis[:, 50:62] == 0.0).all()
+
+
+@pytest.mark.parametrize("frequency", [110.0, 220.0, 440.0, 880.0])
+def test_analyze_sine(frequency: float) -> None:
+    samples = 0.5 * numpy.sin(2 * numpy.pi * frequency * numpy.arange(48000) / 48000)
+    analysis = features.analyze(samples)
+    midi = 69 + 12 * numpy.log2(frequency / 440)
+    assert analysis[40:, 1] == pytest.approx(-9.03, abs=0.1)
+    assert analysis[8:, 2] == pytest.approx(midi, abs=0.1)
+    assert (analysis[8:, 3] == 1.0).all()
+    assert analysis[:, 50:62].sum(axis=1) == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("frequency", [440.0, 659.25, 880.0, 1760.0])
+def test_analyze_chroma(frequency: float) -> None:
+    samples = 0.5 * numpy.sin(2 * numpy.pi * frequency * numpy.arange(48000) / 48000)
+    analysis = features.analyze(samples)
+    midi = 69 + 12 * numpy.log2(frequency / 440)
+    assert (analysis[8:, 50:62].argmax(axis=1) == round(midi) % 12).all()
+
+
+def test_match_onsets() -> None:
+    expected = numpy.array([4, 16, 31, 44])
+    assert features.match_onsets(expected, expected, 0) == (1.0, 1.0)
+    # Each expected onset matches at most once
+    assert features.match_onsets(expected, numpy.array([3, 5, 29]), 2) == (2 / 3, 2 / 4)
+    assert features.match_onsets(expected, numpy.array([], dtype=int), 2) == (0.0, 0.0)
+    assert features.match_onsets(
+        numpy.array([], dtype=int), numpy.array([], dtype=int), 2
+    ) == (1.0, 1.0)
+
+
+def test_analyze_onsets() -> None:
+    samples = numpy.zeros(48000 * 2)
+    generator = numpy.random.default_rng(0)
+    for start in range(0, len(samples), 12000):
+        samples[start : start + 2000] = generator.normal(0, 0.3, 2000)
+    onsets = numpy.flatnonzero(features.analyze(samples)[:, 4])
+    assert onsets == pytest.approx(numpy.arange(0, len(samples), 12000) / 512, abs=2)
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize(
+    "filename", ["af5ec6ae3e17614ebf7c2575dc8870cfbb32f12e5b7edabbdda2b02b8b9b7e5f.wav"]
+)
+async def test_calibrate(filename: str, recordings_path: Path) -> None:
+    """
+    Bound the NumPy engine's deviation from scsynth on the test recordings.
+    """
+    audio_path = recordings_path / filename
+    calibration = features.calibrate(
+        await analyze(audio_path), features.analyze_path(audio_path)
+    )
+    assert calibration["peak"] < 3.0
+    assert calibration["rms"] < 2.0
+    assert calibration["f0"] < 4.0
+    assert calibration["is_voiced"] > 0.8
+    # Onsets within two frames, so a detector that never fires scores zero
+    assert calibration["onsets"] > 0.5
+    assert calibration["onsets:recall"] > 0.55
+    assert calibration["centroid"] < 1.0
+    assert calibration["flatness"] < 0.1
+    assert calibration["rolloff"] < 1.0
+    assert calibration["mfcc"] < 0.2
+    assert calibration["chroma"] < 0.1
@@ -0,0 +1,79 @@
+import time
+from typing import Iterator, cast
+
+import pytest
+import redis
+
+from alzabo.config import config
+from alzabo.core.flushing import (
+    DIRTY_KEY,
+    FLUSHED_KEY,
+    SCHEDULED_KEY,
+    claim_flushes,
+    mark_dirty,
+    release_scheduled_flush,
+    schedule_flush,
+    unclaim_flushes,
+)
+
+
+@pytest.fixture
+def redis_client() -> Iterator[redis.Redis]:
+    client = redis.from_url(str(config.redis.url))
+    client.delete(DIRTY_KEY, FLUSHED_KEY, SCHEDULED_KEY)
+    yield client
+    client.delete(DIRTY_KEY, FLUSHED_KEY, SCHEDULED_KEY)
+
+
+def test_claim_flushes(redis_client: redis.Redis) -> None:
+    names = ["a", "b", "c"]
+    # nothing dirty, nothing to flush
+    assert claim_flushes(
+        redis=redis_client, names=names, interval=60, max_rows=100
+    ) == ({}, None)
+    mark_dirty(redis=redis_client, names=["a", "b"], rows=10)
+    # never flushed, so due immediately
+    assert claim_flushes(
+        redis=redis_client, names=names, interval=60, max_rows=100
+    ) == ({"a": 10, "b": 10}, None)
+    # flushed just now, so coalesced until the interval elapses
+    mark_dirty(redis=redis_client, names=["a", "b"], rows=10)
+    claimed, delay = claim_flushes(
+        redis=redis_client, names=names, interval=60, max_rows=100
+    )
+    assert claimed == {} and delay is not None and 59 < delay <= 60
+    # unless enough rows have accumulated
+    mark_dirty(redis=redis_client, names=["b"], rows=90)
+    claimed, delay = claim_flushes(
+        redis=redis_client, names=names, interval=60, max_rows=100
+    )
+    assert claimed == {"b": 100} and delay is not None and 59 < delay <= 60
+    # or after the interval
+    time.sleep(0.1)
+    assert claim_flushes(
+        redis=redis_client, names=names, interval=0.1, max_rows=100
+    ) == ({"a": 10}, None)
+    # forcing flushes everything
+    assert claim_flushes(
+        redis=redis_client, names=names, interval=60, max_rows=100, force=True
+    ) == ({"a": 0, "b": 0, "c": 0}, None)
+    # failed flushes are returned, and due immediately
+    mark_dirty(redis=redis_client, names=["a"], rows=10)
+    claimed, _ = claim_flushes(
+        redis=redis_client, names=names, interval=0, max_rows=100
+    )
+    assert claimed == {"a": 10}
+    unclaim_flushes(redis=redis_client, claimed=claimed)
+    assert claim_flushes(
+        redis=redis_client, names=names, interval=60, max_rows=100
+    ) == ({"a": 10}, None)
+
+
+def test_schedule_flush(redis_client: redis.Redis) -> None:
+    assert schedule_flush(redis=redis_client, delay=60)
+    assert not schedule_flush(redis=redis_client, delay=60)
+    # the reservation holds past the flush's due time, until it's released
+    assert cast(int, redis_client.pttl(SCHEDULED_KEY)) > 60_000
+    assert not schedule_flush(redis=redis_client, delay=0)
+    release_scheduled_flush(redis=redis_client)
+    assert schedule_flush(redis=redis_client, delay=60)
@@ -4,20 +4,17 @@ from pathlib import Path
 import pytest
 from pymilvus import Collection
 
-from alzabo.core import scsynth
+from alzabo.core import milvus, scsynth
 
 
 @pytest.mark.parametrize(
-    "entries_filename, expected_count",
-    [
-        ("scsynth-entries-500-1250.json", 166),
-        ("scsynth-entries-500-2500.json", 163),
-        ("scsynth-entries-500-500.json", 167),
-    ],
+    "hop_ms, length_ms, expected_count",
+    [(500, 1250, 166), (500, 2500, 163), (500, 500, 167)],
 )
 def test_insert_scsynth_entries(
     data_path: Path,
-    entries_filename: str,
+    hop_ms: int,
+    length_ms: int,
     expected_count: int,
     milvus_scsynth_collections: dict[str | None, Collection],
 ) -> None:
@@ -28,15 +25,18 @@ def test_insert_scsynth_entries(
     )
     assert len(results) == 0
     # insert entries
-    entries_path = data_path / digest[:2] / digest / entries_filename
+    entries_path = (
+        data_path / digest[:2] / digest / f"scsynth-entries-{hop_ms}-{length_ms}.json"
+    )
     entries = json.loads(entries_path.read_text())["entries"]
-    scsynth.insert_scsynth_entries(digest, entries)
+    scsynth.insert_scsynth_entries(digest, entries, hop_ms=hop_ms, length_ms=length_ms)
     collection = scsynth.get_scsynth_collection()
     collection.flush()
     results = milvus_scsynth_collections[None].query(
-        expr=f'digest == "{digest}"', output_fields=["id"]
+        expr=f'digest == "{digest}"', output_fields=["hop_ms", "length_ms"]
     )
     assert len(results) == expected_count
+    assert all((x["hop_ms"], x["length_ms"]) == (hop_ms, length_ms) for x in results)
 
 
 def test_query_scsynth_entries(
@@ -48,7 +48,10 @@ def test_query_scsynth_entries(
         "scsynth-entries-*.json"
     ):
         entries = json.loads(entries_path.read_text())["entries"]
-        scsynth.insert_scsynth_entries(digest, entries)
+        hop_ms, length_ms = map(int, entries_path.stem.split("-")[-2:])
+        scsynth.insert_scsynth_entries(
+            digest, entries, hop_ms=hop_ms, length_ms=length_ms
+        )
     collection = scsynth.get_scsynth_collection()
     collection.flush()
     # verify count after inserting
@@ -66,3 +69,49 @@ def test_query_scsynth_entries(
         == "dd88610b66f3f053243f8f315345381fc70bca20d48ba32e27a7841d7676f969"
         for x in query_result
     )
+
+
+def test_get_index_params() -> None:
+    assert milvus.get_index_params("IVF_FLAT", "L2") == {
+        "index_type": "IVF_FLAT",
+        "metric_type": "L2",
+        "params": {"nlist": 1024},
+    }
+    assert milvus.get_index_params("HNSW", "IP", {"M": 32}) == {
+        "index_type": "HNSW",
+        "metric_type": "IP",
+        "params": {"M": 32, "efConstruction": 256},
+    }
+
+
+@pytest.mark.parametrize(
+    "index_type, params, overrides, limit, expected",
+    [
+        ("IVF_FLAT", None, None, 10, {"nprobe": 1}),
+        ("IVF_SQ8", {"nprobe": 16}, None, 10, {"nprobe": 16}),
+        ("IVF_SQ8", {"nprobe": 16}, {"nprobe": 64}, 10, {"nprobe": 64}),
+        ("HNSW", None, None, 10, {"ef": 64}),
+        ("HNSW", None, {"ef": 16}, 100, {"ef": 100}),
+        ("DISKANN", None, None, 10, {"search_list": 100}),
+        ("FLAT", None, None, 10, {}),
+    ],
+)
+def test_get_search_params(index_type, params, overrides, limit, expected) -> None:
+    assert milvus.get_search_params(index_type, "L2", params, overrides, limit) == {
+        "metric_type": "L2",
+        "params": expected,
+    }
+
+
+def test_collection_registry(
+    milvus_scsynth_collections: dict[str | None, Collection]
+) -> None:
+    name = scsynth.get_scsynth_collection_name(None)
+    collection = milvus.get_collection(name)
+    assert milvus.get_collection(name) is collection
+    assert scsynth.get_scsynth_collection() is collection
+    # Forgotten handles are re-registered on next use
+    milvus.forget_collection(name)
+    assert milvus.get_collection(name) is not collection
+    with pytest.raises(ValueError):
+        milvus.get_collection("no_such_collection")
@@ -1,16 +1,47 @@
+import json
 import logging
+import math
+from hashlib import md5
 from pathlib import Path
+from typing import cast
 
+import numpy
 import pytest
+import redis
+import soundfile
+from sklearn.preprocessing import StandardScaler
 from supriya import SynthDef
 from uqbar.strings import normalize
 
-from alzabo.constants import SCSYNTH_ANALYSIS_SIZE
+from alzabo.config import config
+from alzabo.constants import SCSYNTH_ANALYSIS_SIZE, ScsynthFeatures
 from alzabo.core.scsynth import (
+    AGGREGATE_DTYPE,
+    AGGREGATE_LAYOUT,
+    AGGREGATE_SIZE,
+    AnalysisSums,
     aggregate,
+    aggregate_array_to_vectors,
+    aggregate_to_vector,
+    aggregates_to_array,
     analyze,
+    analyze_chunked,
+    analyze_many,
+    array_to_aggregates,
     build_offline_analysis_synthdef,
     build_online_analysis_synthdef,
+    derive_whitened_aggregate,
+    derive_whitened_entries,
+    get_index_plan,
+    get_index_plans,
+    get_whitener,
+    load_analysis,
+    load_entries,
+    partition,
+    partition_many,
+    save_analysis,
+    save_entries,
+    serialize_whitener,
 )
 
 
@@ -326,6 +357,46 @@ async def test_analyze(caplog, recordings_path: Path) -> None:
         assert frame.min() < 0
 
 
+@pytest.mark.asyncio
+async def test_analyze_chunked(recordings_path: Path) -> None:
+    """
+    Chunked analyses stitch back into the same layout as a single render.
+    """
+    audio_path = (
+        recordings_path
+        / "af5ec6ae3e17614ebf7c2575dc8870cfbb32f12e5b7edabbdda2b02b8b9b7e5f.wav"
+    )
+    expected = await analyze(audio_path)
+    actual = await analyze_chunked(audio_path, chunk_seconds=1.0, concurrency=2)
+    assert actual.shape == expected.shape
+    # Peak and RMS agree across chunk boundaries thanks to the preroll
+    assert numpy.allclose(actual[:, :2], expected[:, :2], atol=1.0)
+
+
+@pytest.mark.asyncio
+async def test_analyze_many(recordings_path: Path, tmp_path: Path) -> None:
+    """
+    Batched analyses line up with analyzing each file alone, in every feature.
+    """
+    samples, _ = soundfile.read(
+        recordings_path
+        / "af5ec6ae3e17614ebf7c2575dc8870cfbb32f12e5b7edabbdda2b02b8b9b7e5f.wav",
+        dtype="int16",
+    )
+    # Files of differing content and length, so misaligned demuxing shows
+    audio_paths = [tmp_path / f"{i}.wav" for i in range(3)]
+    for audio_path, samples_ in zip(
+        audio_paths, [samples, samples[: 48000 * 3][::-1], samples[-100000:] // 2]
+    ):
+        soundfile.write(audio_path, samples_, 48000, subtype="PCM_16")
+    actual = await analyze_many(audio_paths)
+    assert len(actual) == len(audio_paths)
+    for audio_path, analysis in zip(audio_paths, actual):
+        expected = await analyze(audio_path)
+        assert analysis.shape == expected.shape
+        numpy.testing.assert_allclose(analysis, expected, rtol=1e-5, atol=1e-4)
+
+
 def test_build_offline_analysis_synthdef() -> None:
     synthdef = build_offline_analysis_synthdef()
     assert isinstance(synthdef, SynthDef)
@@ -855,3 +926,293 @@ def test_build_online_analysis_synthdef_supernova() -> None:
                     source[49]: MFCC.kr[41]
         """
     )
+
+
+@pytest.fixture
+def raw_analysis(data_path: Path) -> numpy.ndarray:
+    digest = "af5ec6ae3e17614ebf7c2575dc8870cfbb32f12e5b7edabbdda2b02b8b9b7e5f"
+    return load_analysis(
+        data_path / digest[:2] / digest / "scsynth-analysis-raw.json"
+    ).astype(numpy.float64)
+
+
+@pytest.mark.parametrize(
+    "hop_ms, length_ms", [(500, 500), (500, 1250), (250, 2500), (100, 100)]
+)
+def test_partition(hop_ms: int, length_ms: int, raw_analysis: numpy.ndarray) -> None:
+    """
+    Prefix-sum partitioning agrees with aggregating each window individually,
+    and, as queries do, ignores the whitened analysis.
+
+    Prefix sums accumulate rounding differently than summing each window, so
+    aggregates agree within a tolerance rather than exactly.
+    """
+    whitened_analysis = (raw_analysis - raw_analysis.mean(axis=0)) / (
+        raw_analysis.std(axis=0) + 1
+    )
+    actual = partition(
+        hop_ms=hop_ms,
+        length_ms=length_ms,
+        raw_analysis=raw_analysis,
+        whitened_analysis=whitened_analysis,
+    )
+    indices_per_hop = math.ceil(hop_ms / (512 / 48))
+    indices_per_entry = math.ceil(length_ms / (512 / 48))
+    expected = [
+        (
+            start * 512,
+            indices_per_entry * 512,
+            aggregate(raw_analysis[start : start + indices_per_entry]),
+        )
+        for start in range(
+            0, raw_analysis.shape[0] - indices_per_entry + 1, indices_per_hop
+        )
+    ]
+    assert len(actual) == len(expected)
+    for (actual_start, actual_count, actual_aggregate), (
+        expected_start,
+        expected_count,
+        expected_aggregate,
+    ) in zip(actual, expected):
+        assert actual_start == expected_start
+        assert actual_count == expected_count
+        assert actual_aggregate.keys() == expected_aggregate.keys()
+        for key, value in expected_aggregate.items():
+            assert cast(dict, actual_aggregate)[key] == pytest.approx(
+                value, rel=1e-6, abs=1e-9
+            )
+
+
+def test_partition_many(raw_analysis: numpy.ndarray) -> None:
+    """
+    Multi-resolution partitioning matches partitioning each resolution alone.
+    """
+    actual = partition_many(
+        hops=[250, 500], lengths=[500, 1250, 2500], raw_analysis=raw_analysis
+    )
+    assert list(actual) == [
+        (250, 500),
+        (250, 1250),
+        (250, 2500),
+        (500, 500),
+        (500, 1250),
+        (500, 2500),
+    ]
+    for (hop_ms, length_ms), entries in actual.items():
+        assert entries == partition(
+            hop_ms=hop_ms, length_ms=length_ms, raw_analysis=raw_analysis
+        )
+
+
+@pytest.mark.parametrize(
+    "compressed, mmap", [(False, False), (False, True), (True, False)]
+)
+def test_save_and_load_analysis(
+    compressed: bool, data_path: Path, mmap: bool, tmp_path: Path
+) -> None:
+    digest = "af5ec6ae3e17614ebf7c2575dc8870cfbb32f12e5b7edabbdda2b02b8b9b7e5f"
+    legacy_path = data_path / digest[:2] / digest / "scsynth-analysis-raw.json"
+    expected = load_analysis(legacy_path)
+    assert expected.shape == (468, SCSYNTH_ANALYSIS_SIZE)
+    path = tmp_path / "scsynth-analysis-raw.npy"
+    save_analysis(path, expected, compressed=compressed)
+    assert path.stat().st_size < legacy_path.stat().st_size / 4
+    actual = load_analysis(path, mmap=mmap)
+    assert actual.dtype == numpy.float32
+    assert isinstance(actual, numpy.memmap) == mmap
+    # scsynth writes float32 analyses, so nothing is lost
+    assert (actual == expected).all()
+
+
+def test_aggregate_layout() -> None:
+    assert AGGREGATE_SIZE == 135
+    assert AGGREGATE_LAYOUT[ScsynthFeatures.IS_VOICED] == slice(0, 1)
+    assert AGGREGATE_LAYOUT[ScsynthFeatures.RAW_CHROMA] == slice(3, 15)
+    assert AGGREGATE_LAYOUT[ScsynthFeatures.RAW_MFCC] == slice(19, 61)
+    assert ScsynthFeatures.RAW_MFCC_13 not in AGGREGATE_LAYOUT
+    assert (
+        sum(slice_.stop - slice_.start for slice_ in AGGREGATE_LAYOUT.values())
+        == AGGREGATE_SIZE
+    )
+
+
+def test_aggregate_arrays(data_path: Path, tmp_path: Path) -> None:
+    """
+    Record arrays roundtrip aggregates and gather the same vectors.
+    """
+    digest = "af5ec6ae3e17614ebf7c2575dc8870cfbb32f12e5b7edabbdda2b02b8b9b7e5f"
+    legacy_path = data_path / digest[:2] / digest / "scsynth-entries-500-500.json"
+    entries = json.loads(legacy_path.read_text())["entries"]
+    array = aggregates_to_array(entries)
+    assert array.dtype == AGGREGATE_DTYPE
+    assert (load_entries(legacy_path) == array).all()
+    for (start, count, actual), (expected_start, expected_count, expected) in zip(
+        array_to_aggregates(array), entries
+    ):
+        assert (start, count) == (expected_start, expected_count)
+        for key, value in expected.items():
+            assert cast(dict, actual)[key] == pytest.approx(value, rel=1e-6)
+    for index_config in config.analysis.scsynth_indices:
+        vectors = aggregate_array_to_vectors(array, index_config["alias"])
+        assert vectors.tolist() == [
+            numpy.asarray(
+                aggregate_to_vector(aggregate_, index_config["alias"]),
+                dtype=numpy.float32,
+            ).tolist()
+            for _, _, aggregate_ in entries
+        ]
+    path = tmp_path / "scsynth-entries-500-500.npy"
+    save_entries(path, array)
+    assert (load_entries(path) == array).all()
+
+
+def test_partition_many_arrays(raw_analysis: numpy.ndarray) -> None:
+    analysis_sums = AnalysisSums(raw_analysis)
+    arrays = analysis_sums.partition_many_arrays(resolutions=[(500, 1250)])
+    assert arrays[500, 1250].dtype == AGGREGATE_DTYPE
+    expected = aggregates_to_array(analysis_sums.partition(hop_ms=500, length_ms=1250))
+    assert (arrays[500, 1250] == expected).all()
+    # Analyses shorter than a window have no entries
+    arrays = AnalysisSums(raw_analysis[:10]).partition_many_arrays(
+        resolutions=[(500, 1250)]
+    )
+    assert arrays[500, 1250].dtype == AGGREGATE_DTYPE
+    assert len(arrays[500, 1250]) == 0
+
+
+def test_derive_whitened_entries(raw_analysis: numpy.ndarray) -> None:
+    scaler = StandardScaler().fit(raw_analysis)
+    whitened_analysis = scaler.transform(raw_analysis)
+    resolutions = [(500, 500), (500, 2500)]
+    expected = AnalysisSums(raw_analysis, whitened_analysis).partition_many_arrays(
+        resolutions=resolutions, dtype=numpy.float64
+    )
+    actual = AnalysisSums(raw_analysis).partition_many_arrays(
+        resolutions=resolutions, dtype=numpy.float64
+    )
+    for resolution in resolutions:
+        derived = derive_whitened_entries(actual[resolution], scaler)
+        assert derived["features"] == pytest.approx(
+            expected[resolution]["features"], abs=1e-9
+        )
+    for start, stop in [(0, 100), (200, 468)]:
+        derived = aggregates_to_array(
+            [
+                (
+                    start,
+                    stop - start,
+                    derive_whitened_aggregate(
+                        aggregate(raw_analysis[start:stop]), scaler
+                    ),
+                )
+            ],
+            dtype=numpy.float64,
+        )
+        expected_ = aggregates_to_array(
+            [
+                (
+                    start,
+                    stop - start,
+                    aggregate(raw_analysis[start:stop], whitened_analysis[start:stop]),
+                )
+            ],
+            dtype=numpy.float64,
+        )
+        assert derived["features"] == pytest.approx(expected_["features"], abs=1e-9)
+
+
+def test_derive_whitened_entries_differ_from_raw(raw_analysis: numpy.ndarray) -> None:
+    """
+    Partitioned entries are raw, their whitened columns only differing from
+    the raw columns once derived from a fitted whitener.
+    """
+    entries = AnalysisSums(raw_analysis).partition_many_arrays(
+        resolutions=[(500, 500)], dtype=numpy.float64
+    )[500, 500]
+    derived = derive_whitened_entries(entries, StandardScaler().fit(raw_analysis))
+    for raw_feature, whitened_feature in [
+        (ScsynthFeatures.RAW_MFCC, ScsynthFeatures.WHITENED_MFCC),
+        (ScsynthFeatures.RAW_RMS_MEAN, ScsynthFeatures.WHITENED_RMS_MEAN),
+    ]:
+        raw = entries["features"][:, AGGREGATE_LAYOUT[raw_feature]]
+        assert (entries["features"][:, AGGREGATE_LAYOUT[whitened_feature]] == raw).all()
+        assert (derived["features"][:, AGGREGATE_LAYOUT[raw_feature]] == raw).all()
+        whitened = derived["features"][:, AGGREGATE_LAYOUT[whitened_feature]]
+        assert not numpy.allclose(whitened, raw)
+        # Whitened means are centered across the corpus
+        assert abs(whitened.mean()) < abs(raw.mean())
+
+
+def test_index_plans(monkeypatch) -> None:
+    plans = get_index_plans()
+    assert list(plans) == [
+        index_config["alias"] for index_config in config.analysis.scsynth_indices
+    ]
+    assert get_index_plans() is plans
+    plan = get_index_plan(None)
+    assert plan.dimension == 16
+    assert plan.features == (
+        ScsynthFeatures.RAW_F0_MEAN,
+        ScsynthFeatures.RAW_MFCC_13,
+        ScsynthFeatures.RAW_ONSETS,
+        ScsynthFeatures.RAW_RMS_MEAN,
+    )
+    assert (
+        plan.collection_name
+        == "test_scsynth_" + md5(b"r:f0:mean_r:mfcc:13_r:onsets_r:rms:mean").hexdigest()
+    )
+    assert plan.index_type == "IVF_FLAT"
+    assert plan.metric_type == "L2"
+    with pytest.raises(ValueError):
+        get_index_plan("no-such-index")
+    # Replacing the configured indices recompiles the plans
+    monkeypatch.setattr(
+        config.analysis,
+        "scsynth_indices",
+        [dict(alias="chroma", features=[ScsynthFeatures.RAW_CHROMA], pitched=False)],
+    )
+    assert list(get_index_plans()) == ["chroma"]
+    assert get_index_plan("chroma").dimension == 12
+    monkeypatch.setattr(
+        config.analysis,
+        "scsynth_indices",
+        [
+            dict(
+                alias="hnsw",
+                features=[ScsynthFeatures.RAW_CHROMA],
+                index_params={"M": 8},
+                index_type="HNSW",
+                metric_type="IP",
+                pitched=False,
+                search_params={"ef": 32},
+            )
+        ],
+    )
+    plan = get_index_plan("hnsw")
+    assert plan.index_type == "HNSW"
+    assert plan.index_params == {"M": 8}
+    assert plan.metric_type == "IP"
+    assert plan.search_params == {"ef": 32}
+
+
+def test_get_whitener() -> None:
+    redis_client = redis.from_url(str(config.redis.url))
+    key = "test-scsynth:whitening"
+    redis_client.delete(key, key + ":version")
+    whitener = get_whitener(redis=redis_client)
+    assert (whitener.mean_ == 0.0).all()
+    assert (whitener.scale_ == 1.0).all()
+    # Unchanged versions reuse the cached whitener
+    assert get_whitener(redis=redis_client) is whitener
+    serialize_whitener(
+        redis=redis_client,
+        scaler=StandardScaler().fit(
+            numpy.random.default_rng(0).normal(5.0, 2.0, (100, SCSYNTH_ANALYSIS_SIZE))
+        ),
+    )
+    assert redis_client.get(key + ":version") == b"1"
+    new_whitener = get_whitener(redis=redis_client)
+    assert new_whitener is not whitener
+    assert new_whitener.mean_ == pytest.approx(5.0, abs=1.0)
+    assert get_whitener(redis=redis_client) is new_whitener
+    redis_client.delete(key, key + ":version")
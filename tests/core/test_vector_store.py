@@ -0,0 +1,365 @@
+import dataclasses
+import json
+from pathlib import Path
+
+import numpy
+import pytest
+
+from alzabo.config import config
+from alzabo.core import scsynth
+from alzabo.core.vector_store import (
+    CollectionSpec,
+    Filter,
+    LocalVectorStore,
+    MilvusVectorStore,
+    VectorStore,
+    append,
+    get_entry_ids,
+    get_filter_expr,
+)
+
+
+@pytest.fixture
+def local_store(tmp_path: Path) -> LocalVectorStore:
+    return LocalVectorStore(tmp_path)
+
+
+def insert(
+    store: LocalVectorStore,
+    spec: CollectionSpec,
+    digest: str,
+    vectors: numpy.ndarray,
+    length_ms: int = 500,
+    start_frame: int = 0,
+) -> None:
+    store.insert(
+        spec,
+        digest=digest,
+        start_frames=start_frame + numpy.arange(len(vectors)) * 100,
+        frame_counts=numpy.full(len(vectors), 100),
+        hop_ms=500,
+        length_ms=length_ms,
+        vectors=vectors,
+        scalars={"is_voiced": numpy.arange(len(vectors)) % 2 == 0},
+    )
+
+
+@pytest.mark.parametrize("metric_type", ["COSINE", "IP", "L2"])
+def test_local_vector_store_exact(local_store: LocalVectorStore, metric_type) -> None:
+    spec = CollectionSpec(
+        name="test",
+        dimension=8,
+        scalar_fields=(("is_voiced", "bool"),),
+        index_type="FLAT",
+        metric_type=metric_type,
+    )
+    local_store.create_collection(spec)
+    assert local_store.has_collection(spec)
+    generator = numpy.random.default_rng(0)
+    vectors = {digest: generator.normal(size=(50, 8)) for digest in "abc"}
+    for digest, vectors_ in vectors.items():
+        insert(local_store, spec, digest, vectors_)
+    queries = generator.normal(size=(4, 8))
+    # every partition, against brute force
+    all_vectors = numpy.concatenate(list(vectors.values()))
+    if metric_type == "L2":
+        expected = ((all_vectors[None] - queries[:, None]) ** 2).sum(axis=-1)
+    else:
+        if metric_type == "COSINE":
+            all_vectors = all_vectors / numpy.linalg.norm(all_vectors, axis=1)[:, None]
+            queries_ = queries / numpy.linalg.norm(queries, axis=1)[:, None]
+        else:
+            queries_ = queries
+        expected = -(queries_ @ all_vectors.T)
+    results = local_store.search(spec, queries, limit=5)
+    for result, expected_ in zip(results, expected):
+        nearest = numpy.argsort(expected_)[:5]
+        assert [(x["digest"], x["start_frame"]) for x in result] == [
+            ("abc"[i // 50], i % 50 * 100) for i in nearest
+        ]
+    # filtered by partition and voicing
+    results = local_store.search(
+        spec,
+        queries,
+        filters=[{"is_voiced": True, "digests": ["b", "z"]}] * len(queries),
+        limit=5,
+    )
+    for result in results:
+        assert len(result) == 5
+        assert all(x["digest"] == "b" for x in result)
+        assert all(x["start_frame"] % 200 == 0 for x in result)
+
+
+def test_local_vector_store_ivf(local_store: LocalVectorStore) -> None:
+    spec = CollectionSpec(
+        name="test",
+        dimension=8,
+        scalar_fields=(("is_voiced", "bool"),),
+        index_params={"nlist": 16},
+    )
+    local_store.create_collection(spec)
+    generator = numpy.random.default_rng(0)
+    vectors = generator.normal(size=(1000, 8))
+    insert(local_store, spec, "a", vectors)
+    local_store.flush(spec)
+    path = local_store.get_generation_path(local_store.path / "test" / "a")
+    assert path is not None and (path / "index.npz").exists()
+    # rows inserted since the flush are still found
+    insert(local_store, spec, "a", vectors[:10] + 1000, start_frame=100000)
+    queries = numpy.concatenate([vectors[:10], vectors[:10] + 1000])
+    results = local_store.search(spec, queries, limit=1, search_params={"nprobe": 16})
+    assert [x[0]["start_frame"] for x in results] == list(range(0, 1000, 100)) + list(
+        range(100000, 101000, 100)
+    )
+    assert all(x[0]["distance"] == 0.0 for x in results)
+    # probing fewer clusters trades recall for speed, but never misses itself
+    results = local_store.search(spec, vectors[:10], limit=10)
+    assert all(result[0]["start_frame"] == i * 100 for i, result in enumerate(results))
+
+
+def test_local_vector_store_lengths(local_store: LocalVectorStore) -> None:
+    spec = CollectionSpec(
+        name="test", dimension=8, scalar_fields=(("is_voiced", "bool"),)
+    )
+    local_store.create_collection(spec)
+    generator = numpy.random.default_rng(0)
+    vectors = generator.normal(size=(20, 8))
+    insert(local_store, spec, "a", vectors, length_ms=500)
+    insert(local_store, spec, "b", vectors, length_ms=1000)
+    results = local_store.search(
+        spec,
+        vectors[:4],
+        filters=[{"lengths": [1000]}, {"lengths": [500]}, {"lengths": [250]}, {}],
+        limit=1,
+    )
+    assert [x["digest"] for x in results[0]] == ["b"]
+    assert [x["digest"] for x in results[1]] == ["a"]
+    assert results[2] == []
+    assert results[3][0]["start_frame"] == 300
+
+
+@pytest.mark.parametrize(
+    "filter_, expected",
+    [
+        ({}, ""),
+        ({"is_voiced": None, "digests": None}, ""),
+        ({"is_voiced": False}, "is_voiced == false"),
+        ({"digests": ["a", "b"]}, 'digest in ["a", "b"]'),
+        ({"lengths": [500, 1000]}, "length_ms in [500, 1000]"),
+        (
+            {"is_voiced": True, "digests": ["a"]},
+            'is_voiced == true and digest in ["a"]',
+        ),
+        (
+            {"is_voiced": True, "digests": ["a"], "lengths": [250]},
+            'is_voiced == true and digest in ["a"] and length_ms in [250]',
+        ),
+    ],
+)
+def test_get_filter_expr(filter_: Filter, expected: str) -> None:
+    assert get_filter_expr(filter_) == expected
+
+
+def test_get_entry_ids() -> None:
+    ids = get_entry_ids(
+        "abc", numpy.array([0, 100, 0]), numpy.array([100, 100, 200]), 500, 1250
+    )
+    assert ids.dtype == numpy.int64
+    assert (ids >= 0).all()
+    assert len(set(ids.tolist())) == 3
+    # deterministic, and distinct across digests, hops and lengths
+    assert (
+        ids.tolist()
+        == get_entry_ids("abc", [0, 100, 0], [100, 100, 200], 500, 1250).tolist()
+    )
+    for digest, hop_ms, length_ms in [
+        ("abd", 500, 1250),
+        ("abc", 250, 1250),
+        ("abc", 500, 2500),
+    ]:
+        assert not set(ids.tolist()) & set(
+            get_entry_ids(
+                digest, [0, 100, 0], [100, 100, 200], hop_ms, length_ms
+            ).tolist()
+        )
+    assert len(get_entry_ids("abc", [], [], 500, 1250)) == 0
+
+
+def test_local_vector_store_insert_hops(local_store: LocalVectorStore) -> None:
+    """
+    Windows sharing a start frame and frame count at different hops are kept
+    apart, rather than replacing one another.
+    """
+    spec = CollectionSpec(name="test", dimension=8)
+    local_store.create_collection(spec)
+    generator = numpy.random.default_rng(0)
+    vectors = generator.normal(size=(10, 8))
+    for hop_ms in (250, 500):
+        local_store.insert(
+            spec,
+            digest="a",
+            start_frames=numpy.arange(10) * 100,
+            frame_counts=numpy.full(10, 100),
+            hop_ms=hop_ms,
+            length_ms=1250,
+            vectors=vectors + hop_ms,
+        )
+    path = local_store.get_generation_path(local_store.path / "test" / "a")
+    assert path is not None
+    entries = numpy.load(path / "entries.npy")
+    assert len(entries) == 20
+    assert sorted(set(entries["hop_ms"].tolist())) == [250, 500]
+    for hop_ms in (250, 500):
+        results = local_store.search(spec, vectors[:1] + hop_ms, limit=1)
+        assert results[0][0]["distance"] == 0.0
+
+
+def test_local_vector_store_upsert(local_store: LocalVectorStore) -> None:
+    spec = CollectionSpec(
+        name="test",
+        dimension=8,
+        scalar_fields=(("is_voiced", "bool"),),
+        index_params={"nlist": 4},
+    )
+    local_store.create_collection(spec)
+    generator = numpy.random.default_rng(0)
+    vectors = generator.normal(size=(200, 8))
+    insert(local_store, spec, "a", vectors)
+    local_store.flush(spec)
+    # re-inserting replaces rather than duplicates
+    insert(local_store, spec, "a", vectors[:100] + 1000)
+    # in a new generation, leaving the previous one intact for readers
+    partition_path = local_store.path / "test" / "a"
+    path = local_store.get_generation_path(partition_path)
+    assert path == partition_path / "1"
+    entries = numpy.load(path / "entries.npy")
+    assert len(entries) == 200
+    assert len(set(entries["id"].tolist())) == 200
+    assert len(numpy.load(path / "vectors.npy")) == 200
+    assert not (path / "index.npz").exists()
+    assert len(numpy.load(partition_path / "0" / "vectors.npy")) == 200
+    results = local_store.search(spec, vectors[:10] + 1000, limit=1)
+    assert [result[0]["start_frame"] for result in results] == list(range(0, 1000, 100))
+    assert all(result[0]["distance"] == 0.0 for result in results)
+    # only the current and previous generations are kept
+    insert(local_store, spec, "a", vectors[:10])
+    assert sorted(path.name for path in partition_path.iterdir() if path.is_dir()) == [
+        "1",
+        "2",
+    ]
+
+
+def test_milvus_vector_store_get_columns() -> None:
+    spec = CollectionSpec(
+        name="test", dimension=4, scalar_fields=(("is_voiced", "bool"),)
+    )
+    columns = MilvusVectorStore().get_columns(
+        spec,
+        digest="abc",
+        start_frames=numpy.array([0, 100]),
+        frame_counts=numpy.array([100, 100]),
+        hop_ms=500,
+        length_ms=1250,
+        vectors=numpy.ones((2, 4)),
+        scalars={"is_voiced": numpy.array([1.0, 0.0])},
+    )
+    assert list(columns) == [
+        "id",
+        "digest",
+        "start_frame",
+        "frame_count",
+        "hop_ms",
+        "length_ms",
+        "is_voiced",
+        "vector",
+    ]
+    assert columns["id"].dtype == numpy.int64
+    assert (
+        columns["id"].tolist()
+        == get_entry_ids("abc", [0, 100], [100, 100], 500, 1250).tolist()
+    )
+    assert columns["digest"].tolist() == ["abc", "abc"]
+    assert columns["length_ms"].tolist() == [1250, 1250]
+    assert columns["is_voiced"].tolist() == [True, False]
+    assert columns["vector"].dtype == numpy.float32
+
+
+def test_insert_scsynth_entries(monkeypatch, tmp_path: Path) -> None:
+    monkeypatch.setattr(config.vector_store, "backend", "local")
+    monkeypatch.setattr(config.vector_store, "path", tmp_path)
+    generator = numpy.random.default_rng(0)
+    entries = numpy.zeros(100, dtype=scsynth.AGGREGATE_DTYPE)
+    entries["start_frame"] = numpy.arange(100) * 100
+    entries["frame_count"] = 100
+    entries["features"] = generator.normal(size=entries["features"].shape)
+    index_plans = list(scsynth.get_index_plans().values())
+    for index_plan in index_plans:
+        scsynth.create_scsynth_collection(index_plan.alias)
+    scsynth.insert_scsynth_entries("abc", entries, hop_ms=500, length_ms=500)
+    # every index's collection holds every entry
+    for index_plan in index_plans:
+        results = scsynth.query_scsynth_collection_many(
+            index_plan.vectors(entries[:10]),
+            index_alias=index_plan.alias,
+            limit=1,
+            search_params={"nprobe": 1024},
+        )
+        assert [result[0]["start_frame"] for result in results] == list(
+            range(0, 1000, 100)
+        )
+
+
+def test_vector_store_is_abstract() -> None:
+    with pytest.raises(TypeError):
+        VectorStore()  # type: ignore[abstract]
+
+
+def test_append(tmp_path: Path) -> None:
+    path = tmp_path / "vectors.npy"
+    generator = numpy.random.default_rng(0)
+    arrays = [generator.normal(size=(count, 4)) for count in (9, 1, 90, 900)]
+    append(path, arrays[0])
+    inode = path.stat().st_ino
+    previous = numpy.load(path, mmap_mode="r")
+    for array in arrays[1:]:
+        append(path, array)
+    # in place, leaving previous memory-maps intact
+    assert path.stat().st_ino == inode
+    assert (previous == arrays[0]).all()
+    assert (numpy.load(path) == numpy.concatenate(arrays)).all()
+    # rows past the header's count, of an interrupted append, are overwritten
+    with path.open("ab") as file_pointer:
+        file_pointer.write(b"\0" * 12)
+    append(path, arrays[1])
+    assert (numpy.load(path) == numpy.concatenate([*arrays, arrays[1]])).all()
+    with pytest.raises(ValueError):
+        append(path, arrays[0].astype(numpy.float32))
+
+
+def test_local_vector_store_load(local_store: LocalVectorStore, monkeypatch) -> None:
+    monkeypatch.setattr(LocalVectorStore, "MAX_LOADED", 2)
+    spec = CollectionSpec(name="test", dimension=8)
+    local_store.create_collection(spec)
+    generator = numpy.random.default_rng(0)
+    for digest in ("a", "b"):
+        insert(local_store, spec, digest, generator.normal(size=(10, 8)))
+    local_store.search(spec, generator.normal(size=(1, 8)))
+    assert len(local_store.arrays) == 2
+    # appends are picked up
+    insert(local_store, spec, "b", generator.normal(size=(10, 8)), start_frame=1000)
+    path = local_store.get_generation_path(local_store.path / "test" / "b")
+    assert path is not None
+    vectors = local_store.load(path / "vectors.npy")
+    assert vectors is not None and len(vectors) == 20
+    local_store.drop_collection(spec)
+    assert not local_store.arrays
+
+
+def test_local_vector_store_needs_migration(local_store: LocalVectorStore) -> None:
+    spec = CollectionSpec(name="test", dimension=8)
+    local_store.create_collection(spec)
+    assert not local_store.needs_migration(spec)
+    # collections created before the hop and length fields
+    path = local_store.path / "test" / "collection.json"
+    path.write_text(json.dumps(dataclasses.asdict(spec)))
+    assert local_store.needs_migration(spec)
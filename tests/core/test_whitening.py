@@ -0,0 +1,196 @@
+from typing import Iterator
+
+import numpy
+import pytest
+import redis
+from sklearn.preprocessing import StandardScaler
+
+from alzabo.config import config
+from alzabo.core import whitening
+
+
+@pytest.fixture
+def redis_client(alzabo_config) -> Iterator[redis.Redis]:
+    client = redis.from_url(str(config.redis.url))
+    keys = [
+        whitening.get_digests_key(),
+        whitening.get_fitted_digests_key(),
+        whitening.get_statistics_key(),
+    ]
+    client.delete(*keys)
+    yield client
+    client.delete(*keys)
+
+
+@pytest.fixture
+def arrays() -> list[numpy.ndarray]:
+    generator = numpy.random.default_rng(0)
+    return [
+        generator.normal(i, i + 1, (length, 62))
+        for i, length in enumerate([1, 17, 468, 1000])
+    ]
+
+
+def test_merge_statistics(arrays: list[numpy.ndarray]) -> None:
+    statistics = whitening.compute_statistics(arrays[0][:0])
+    scaler = StandardScaler()
+    for array in arrays:
+        statistics = whitening.merge_statistics(
+            statistics, whitening.compute_statistics(array)
+        )
+        scaler.partial_fit(array)
+    concatenated = numpy.concatenate(arrays)
+    assert statistics["count"] == [len(concatenated)] * 62
+    assert statistics["mean"] == pytest.approx(concatenated.mean(axis=0).tolist())
+    merged_scaler = whitening.statistics_to_scaler(statistics)
+    assert merged_scaler.mean_ == pytest.approx(scaler.mean_)
+    assert merged_scaler.scale_ == pytest.approx(scaler.scale_)
+    assert whitening.get_drift(statistics, scaler) == pytest.approx(0.0, abs=1e-9)
+    assert whitening.scaler_to_statistics(scaler)["m2"] == pytest.approx(
+        statistics["m2"]
+    )
+
+
+def test_get_drift(arrays: list[numpy.ndarray]) -> None:
+    scaler = StandardScaler().fit(arrays[2])
+    statistics = whitening.compute_statistics(arrays[2])
+    assert whitening.get_drift(statistics, scaler) == pytest.approx(0.0, abs=1e-9)
+    statistics = whitening.merge_statistics(
+        statistics, whitening.compute_statistics(arrays[3])
+    )
+    assert whitening.get_drift(statistics, scaler) > 0.25
+
+
+def test_merge_statistics_into_redis(
+    arrays: list[numpy.ndarray], redis_client: redis.Redis
+) -> None:
+    assert whitening.get_statistics(redis=redis_client) is None
+    for i, array in enumerate(arrays):
+        merged = whitening.merge_statistics_into_redis(
+            redis=redis_client,
+            statistics=whitening.compute_statistics(array),
+            digest=str(i),
+        )
+    assert whitening.get_statistics(redis=redis_client) == merged
+    assert merged["count"] == [sum(len(array) for array in arrays)] * 62
+    assert merged["mean"] == pytest.approx(
+        numpy.concatenate(arrays).mean(axis=0).tolist()
+    )
+    # Merging a digest again, as a retried task would, changes nothing
+    assert (
+        whitening.merge_statistics_into_redis(
+            redis=redis_client,
+            statistics=whitening.compute_statistics(arrays[-1]),
+            digest=str(len(arrays) - 1),
+        )
+        == merged
+    )
+    assert whitening.get_statistics(redis=redis_client) == merged
+    assert whitening.covers_digests(redis=redis_client, digests=["0", "3"])
+    assert not whitening.covers_digests(redis=redis_client, digests=["0", "4"])
+
+
+def test_merge_statistics_into_redis_seed(
+    arrays: list[numpy.ndarray], redis_client: redis.Redis
+) -> None:
+    """
+    Missing statistics are seeded, rather than replaced by the first digest's,
+    without counting the digests the seed was fitted on twice.
+    """
+    seed = whitening.scaler_to_statistics(StandardScaler().fit(arrays[3]))
+    merged = whitening.merge_statistics_into_redis(
+        redis=redis_client,
+        statistics=whitening.compute_statistics(arrays[1]),
+        digest="a",
+        seed=seed,
+        seed_digests=["d"],
+    )
+    assert merged["count"] == [len(arrays[3]) + len(arrays[1])] * 62
+    assert merged["mean"] == pytest.approx(
+        numpy.concatenate([arrays[3], arrays[1]]).mean(axis=0).tolist()
+    )
+    assert whitening.covers_digests(redis=redis_client, digests=["a", "d"])
+    # Seeds only apply to missing statistics
+    merged = whitening.merge_statistics_into_redis(
+        redis=redis_client,
+        statistics=whitening.compute_statistics(arrays[2]),
+        digest="b",
+        seed=seed,
+    )
+    assert merged["count"] == [len(arrays[3]) + len(arrays[1]) + len(arrays[2])] * 62
+    # The seed's own digests are already counted
+    assert (
+        whitening.merge_statistics_into_redis(
+            redis=redis_client,
+            statistics=whitening.compute_statistics(arrays[3]),
+            digest="d",
+        )
+        == merged
+    )
+
+
+def test_merge_statistics_into_redis_seed_digest(
+    arrays: list[numpy.ndarray], redis_client: redis.Redis
+) -> None:
+    """
+    Merging one of the seed's own digests first only stores the seed.
+    """
+    seed = whitening.scaler_to_statistics(StandardScaler().fit(arrays[3]))
+    merged = whitening.merge_statistics_into_redis(
+        redis=redis_client,
+        statistics=whitening.compute_statistics(arrays[3]),
+        digest="d",
+        seed=seed,
+        seed_digests=["d"],
+    )
+    assert merged == seed
+    assert whitening.get_statistics(redis=redis_client) == seed
+    assert whitening.covers_digests(redis=redis_client, digests=["d"])
+
+
+def test_compute_statistics_non_finite(arrays: list[numpy.ndarray]) -> None:
+    """
+    Non-finite values are skipped per column, as StandardScaler does.
+    """
+    array = arrays[2].copy()
+    array[0, 3] = numpy.nan
+    array[1, 5] = numpy.inf
+    array[2, 5] = -numpy.inf
+    statistics = whitening.merge_statistics(
+        whitening.compute_statistics(array), whitening.compute_statistics(arrays[3])
+    )
+    assert numpy.isfinite(statistics["mean"]).all()
+    assert numpy.isfinite(statistics["m2"]).all()
+    assert statistics["count"][3] == len(array) + len(arrays[3]) - 1
+    assert statistics["count"][5] == len(array) + len(arrays[3]) - 2
+    concatenated = numpy.concatenate([array, arrays[3]])
+    concatenated[~numpy.isfinite(concatenated)] = numpy.nan
+    scaler = StandardScaler().fit(concatenated)
+    merged_scaler = whitening.statistics_to_scaler(statistics)
+    assert merged_scaler.mean_ == pytest.approx(scaler.mean_)
+    assert merged_scaler.scale_ == pytest.approx(scaler.scale_)
+    assert (merged_scaler.n_samples_seen_ == scaler.n_samples_seen_).all()
+    assert whitening.scaler_to_statistics(merged_scaler)["count"] == statistics["count"]
+
+
+def test_fitted_digests(redis_client: redis.Redis) -> None:
+    assert whitening.get_fitted_digests(redis=redis_client) == []
+    whitening.set_fitted_digests(redis=redis_client, digests=["b", "a"])
+    assert whitening.get_fitted_digests(redis=redis_client) == ["a", "b"]
+    whitening.set_fitted_digests(redis=redis_client, digests=[])
+    assert whitening.get_fitted_digests(redis=redis_client) == []
+
+
+def test_set_statistics(arrays: list[numpy.ndarray], redis_client: redis.Redis) -> None:
+    whitening.merge_statistics_into_redis(
+        redis=redis_client,
+        statistics=whitening.compute_statistics(arrays[0]),
+        digest="stale",
+    )
+    statistics = whitening.compute_statistics(arrays[2])
+    whitening.set_statistics(
+        redis=redis_client, statistics=statistics, digests=["a", "b"]
+    )
+    assert whitening.get_statistics(redis=redis_client) == statistics
+    assert whitening.covers_digests(redis=redis_client, digests=["a", "b"])
+    assert not whitening.covers_digests(redis=redis_client, digests=["stale"])
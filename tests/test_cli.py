@@ -4,6 +4,7 @@ import wave
 from pathlib import Path
 from unittest import mock
 
+import click
 import pytest
 from click.testing import CliRunner
 from pytest_mock import MockerFixture
@@ -35,9 +36,9 @@ async def test__audio_batch(api_server: str, mocker: MockerFixture) -> None:
     mock_task = mocker.patch("alzabo.worker.tasks.get_audio_processing_chain")
     await cli._audio_batch(urls=["s3://foo/bar/baz", "s3://quux/wux"])
     assert mock_task.mock_calls == [
-        mock.call(str(uuids[0]), "s3://foo/bar/baz"),
+        mock.call(str(uuids[0]), "s3://foo/bar/baz", wait_for_flush=False),
         mock.call()(),
-        mock.call(str(uuids[1]), "s3://quux/wux"),
+        mock.call(str(uuids[1]), "s3://quux/wux", wait_for_flush=False),
         mock.call()(),
     ]
 
@@ -84,9 +85,9 @@ async def test__audio_upload(
     uuids = [uuid.uuid4() for _ in range(2)]
     mocker.patch("alzabo.api.audio.uuid4", side_effect=uuids)
     mock_task = mocker.patch("alzabo.worker.tasks.get_audio_processing_chain")
-    await cli._audio_upload(paths, max_concurrency=1)
+    await cli._audio_upload(paths, max_concurrency=1, wait_for_flush=True)
     assert mock_task.mock_calls == [
-        mock.call(str(uuids[0]), f"s3://test-uploads/{uuids[1]}"),
+        mock.call(str(uuids[0]), f"s3://test-uploads/{uuids[1]}", wait_for_flush=True),
         mock.call()(),
     ]
 
@@ -121,14 +122,55 @@ def test_query_ast(mocker: MockerFixture, runner: CliRunner) -> None:
 @pytest.mark.asyncio
 async def test__query_ast(api_server: str, data: None, recording_path: Path) -> None:
     upload_data = json.loads(
-        await cli._query_ast_upload(limit=10, path=recording_path, partition=[])
+        await cli._query_ast_upload(
+            length=[], limit=10, path=recording_path, partition=[]
+        )
     )
     query_data = json.loads(
-        await cli._query_ast(limit=10, partition=[], vector=upload_data["vector"])
+        await cli._query_ast(
+            length=[], limit=10, partition=[], vector=upload_data["vector"]
+        )
     )
     assert query_data["entries"] == upload_data["entries"]
 
 
+def test_load_scsynth_queries(tmp_path: Path) -> None:
+    path = tmp_path / "queries.json"
+    path.write_text(json.dumps([[0.5, 1.5], {"vector": [2.5], "voiced": True}]))
+    assert cli.load_scsynth_queries(path) == [
+        {"vector": [0.5, 1.5]},
+        {"vector": [2.5], "voiced": True},
+    ]
+    path.write_text(json.dumps([{"lengths": [1]}]))
+    with pytest.raises(click.BadParameter):
+        cli.load_scsynth_queries(path)
+
+
+def test_query_ast_batch(
+    mocker: MockerFixture, runner: CliRunner, tmp_path: Path
+) -> None:
+    mocker.patch("alzabo.cli._query_ast_batch")
+    path = tmp_path / "queries.json"
+    path.write_text("[]")
+    result = runner.invoke(cli_entrypoint, ["query-ast-batch", str(path)])
+    assert result.exit_code == 0, result.output
+
+
+@pytest.mark.asyncio
+async def test__query_ast_batch(
+    api_server: str, data: None, recording_path: Path, tmp_path: Path
+) -> None:
+    upload_data = json.loads(
+        await cli._query_ast_upload(
+            length=[], limit=10, path=recording_path, partition=[]
+        )
+    )
+    path = tmp_path / "queries.json"
+    path.write_text(json.dumps([upload_data["vector"], upload_data["vector"]]))
+    batch_data = json.loads(await cli._query_ast_batch(limit=10, path=path))
+    assert batch_data["entries"] == [upload_data["entries"], upload_data["entries"]]
+
+
 def test_query_ast_upload(
     mocker: MockerFixture, recording_path: Path, runner: CliRunner
 ) -> None:
@@ -142,7 +184,9 @@ async def test__query_ast_upload(
     api_server: str, data: None, recording_path: Path
 ) -> None:
     upload_data = json.loads(
-        await cli._query_ast_upload(limit=10, path=recording_path, partition=[])
+        await cli._query_ast_upload(
+            length=[], limit=10, path=recording_path, partition=[]
+        )
     )
     assert upload_data["entries"]
     assert len(upload_data["vector"]) == 527
@@ -160,17 +204,44 @@ async def test__query_scsynth(
 ) -> None:
     upload_data = json.loads(
         await cli._query_scsynth_upload(
-            index=None, limit=10, path=recording_path, partition=[]
+            index=None, length=[], limit=10, path=recording_path, partition=[]
         )
     )
     query_data = json.loads(
         await cli._query_scsynth(
-            index=None, limit=10, partition=[], vector=upload_data["vector"]
+            index=None, length=[], limit=10, partition=[], vector=upload_data["vector"]
         )
     )
     assert query_data["entries"] == upload_data["entries"]
 
 
+def test_query_scsynth_batch(
+    mocker: MockerFixture, runner: CliRunner, tmp_path: Path
+) -> None:
+    mocker.patch("alzabo.cli._query_scsynth_batch")
+    path = tmp_path / "queries.json"
+    path.write_text("[]")
+    result = runner.invoke(cli_entrypoint, ["query-scsynth-batch", str(path)])
+    assert result.exit_code == 0, result.output
+
+
+@pytest.mark.asyncio
+async def test__query_scsynth_batch(
+    api_server: str, data: None, recording_path: Path, tmp_path: Path
+) -> None:
+    upload_data = json.loads(
+        await cli._query_scsynth_upload(
+            index=None, length=[], limit=10, path=recording_path, partition=[]
+        )
+    )
+    path = tmp_path / "queries.json"
+    path.write_text(json.dumps([{"vector": upload_data["vector"], "voiced": True}]))
+    batch_data = json.loads(
+        await cli._query_scsynth_batch(index=None, limit=10, path=path)
+    )
+    assert batch_data["entries"] == [upload_data["entries"]]
+
+
 def test_query_scsynth_upload(
     mocker: MockerFixture, recording_path: Path, runner: CliRunner
 ) -> None:
@@ -187,7 +258,7 @@ async def test__query_scsynth_upload(
 ) -> None:
     upload_data = json.loads(
         await cli._query_scsynth_upload(
-            index=None, limit=10, path=recording_path, partition=[]
+            index=None, length=[], limit=10, path=recording_path, partition=[]
         )
     )
     assert upload_data["analysis"] == {
@@ -50,7 +50,7 @@ def test_insert_ast_entries(data, job_id, milvus_ast_collection):
         expected_digest,
     )
     # verify the post-conditions (must flush milvus to make data available!)
-    milvus.flush_milvus.delay().get(timeout=60)
+    milvus.flush_milvus.delay(force=True).get(timeout=60)
     actual = milvus_ast_collection.query(
         expr=f'digest == "{expected_digest}"',
         output_fields=["id", "start_frame", "frame_count"],
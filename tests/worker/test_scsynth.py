@@ -1,7 +1,7 @@
-import json
 from pathlib import Path
 
 import pytest
+import redis
 from botocore.exceptions import ClientError
 from mypy_boto3_s3.client import S3Client
 from pymilvus import Collection
@@ -12,6 +12,8 @@ from alzabo.constants import (
     SCSYNTH_ANALYSIS_RAW_FILENAME,
     SCSYNTH_ENTRIES_FILENAME,
 )
+from alzabo.core import whitening
+from alzabo.core.scsynth import AGGREGATE_DTYPE, load_analysis, load_entries
 from alzabo.worker import audio, milvus, scsynth
 
 
@@ -43,7 +45,7 @@ def test_analyze_via_scsynth(
         Filename=str(tmp_path / SCSYNTH_ANALYSIS_RAW_FILENAME),
         Key=key,
     )
-    analysis = json.loads((tmp_path / SCSYNTH_ANALYSIS_RAW_FILENAME).read_text())
+    analysis = load_analysis(tmp_path / SCSYNTH_ANALYSIS_RAW_FILENAME).tolist()
     assert len(analysis) == 7875
     assert analysis[0] == [
         -764.6162109375,
@@ -175,6 +177,24 @@ def test_analyze_via_scsynth(
     ]
 
 
+def test_analyze_many_via_scsynth(
+    job_id: str, recordings_path: Path, s3_client: S3Client
+) -> None:
+    expected_digest = "af5ec6ae3e17614ebf7c2575dc8870cfbb32f12e5b7edabbdda2b02b8b9b7e5f"
+    s3_client.upload_file(
+        Bucket=config.s3.data_bucket,
+        Filename=str(recordings_path / f"{expected_digest}.wav"),
+        Key=f"{expected_digest[:2]}/{expected_digest}/{AUDIO_FILENAME}",
+    )
+    key = f"{expected_digest[:2]}/{expected_digest}/{SCSYNTH_ANALYSIS_RAW_FILENAME}"
+    with pytest.raises(ClientError):
+        s3_client.head_object(Bucket=config.s3.data_bucket, Key=key)
+    assert scsynth.analyze_many_via_scsynth.delay([[job_id, expected_digest]]).get(
+        timeout=60
+    ) == [(job_id, expected_digest)]
+    s3_client.head_object(Bucket=config.s3.data_bucket, Key=key)
+
+
 def test_insert_scsynth_entries(
     job_id: str,
     recordings_path: Path,
@@ -196,7 +216,7 @@ def test_insert_scsynth_entries(
         timeout=60
     ) == (job_id, expected_digest)
     # verify the post-conditions (must flush milvus to make data available!)
-    milvus.flush_milvus.delay().get(timeout=60)
+    milvus.flush_milvus.delay(force=True).get(timeout=60)
     actual = milvus_scsynth_collections[None].query(
         expr=f'digest == "{expected_digest}"',
         output_fields=["id", "start_frame", "frame_count", "f0", "rms"],
@@ -404,13 +424,30 @@ def test_partition_scsynth_analysis(
                 Filename=str(entries_path),
                 Key=entries_key,
             )
-            data = json.loads(entries_path.read_text())
-            print(json.dumps(data, indent=4, sort_keys=True))
-            assert data["hop"] == hop
-            assert data["length"] == length
-            assert data["digest"] == expected_digest
-            assert len(data["entries"])
+            entries = load_entries(entries_path)
+            assert entries.dtype == AGGREGATE_DTYPE
+            assert len(entries)
 
 
-def test_whiten(data: None) -> None:
+def test_shard_digests() -> None:
+    assert scsynth.shard_digests([], 3) == []
+    assert scsynth.shard_digests(iter("abcd"), 3) == [["a", "b", "c"], ["d"]]
+    assert scsynth.shard_digests(list("abcdefg"), 3) == [
+        ["a", "b", "c"],
+        ["d", "e", "f"],
+        ["g"],
+    ]
+
+
+@pytest.mark.parametrize("shard_size", [1, 100])
+def test_whiten(data: None, monkeypatch, shard_size: int) -> None:
+    monkeypatch.setattr(config.analysis, "whitening_shard_size", shard_size)
+    redis_client = redis.from_url(str(config.redis.url))
+    redis_client.delete(whitening.get_statistics_key(), whitening.get_digests_key())
+    scsynth.whiten.delay().get(timeout=1)
+    statistics = whitening.get_statistics(redis=redis_client)
+    assert statistics is not None
+    assert min(statistics["count"]) > 0
+    # Subsequent whitenings fit from the running statistics
     scsynth.whiten.delay().get(timeout=1)
+    assert whitening.get_statistics(redis=redis_client) == statistics
@@ -22,7 +22,7 @@ def test_get_audio_processing_chain(
         == 0
     )
     tasks.get_audio_processing_chain(
-        job_id, f"s3://{source_bucket}/{source_key}"
+        job_id, f"s3://{source_bucket}/{source_key}", wait_for_flush=True
     ).delay().get(timeout=120)
     assert milvus_scsynth_collections[None].num_entities == 22
     assert milvus_ast_collection.num_entities == 24